@@ -0,0 +1,463 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+import django
+from django.db import connections, transaction
+from django.db.models import BigIntegerField, Case, DecimalField, ExpressionWrapper, F, Max, Q, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .business_days import business_days, is_business_day, previous_business_day
+from .models import AccrualCheckpoint, CashupDeposit, CashupOwingDeposit, OwingProfitAccrual, ProfitAccrual
+from .money import POISHA_PER_TAKA, apply_rate, from_poisha, rate_ratio, to_poisha
+from .rates import get_rate_table, rate_on
+from .summary import invalidate_all
+
+
+# Profit rules shared by both books; the rates come from the ProfitRateSchedule
+COMPOUNDING_AFTER = timedelta(days=30)  # Compounding starts once the deposit is 30 days old
+
+# Deposit books credited by the accrual job, with their ledger and rate kinds
+BOOKS = {
+    'cashup': {
+        'model': CashupDeposit,
+        'balance': 'cashup_main_balance',
+        'ledger': ProfitAccrual,
+        'deposit_field': 'cashup_deposit',
+        'daily_rate': 'daily_profit',
+        'compounding_rate': 'compounding_profit',
+    },
+    'cashup_owing': {
+        'model': CashupOwingDeposit,
+        'balance': 'cashup_owing_main_balance',
+        'ledger': OwingProfitAccrual,
+        'deposit_field': 'cashup_owing_deposit',
+        'daily_rate': 'owing_daily_profit',
+        'compounding_rate': 'owing_compounding_profit',
+    },
+}
+
+# Number of deposits credited (and ledger rows inserted) per query
+CHUNK_SIZE = 2000
+
+# Width of the id range committed and checkpointed as one unit
+SHARD_SIZE = 20000
+
+# How far back the daily job looks for accrual days it missed (an outage, a
+# skipped cron run); deposits behind by more than this are left untouched
+# for backfill_profit, so none of their missed days are lost
+CATCH_UP_DAYS = 31
+
+
+def is_accrual_day(accrual_date):
+    """Return True if profit should be credited on the given date."""
+    return is_business_day(accrual_date)
+
+
+def day_start(accrual_date):
+    """Timezone-aware midnight of the accrual date in the project time zone."""
+    return timezone.make_aware(datetime.combine(accrual_date, time.min))
+
+
+def due_deposits(book, accrual_date):
+    """
+    Deposits of a book that have not been credited for the accrual date yet
+    and were created before it; a deposit earns from the accrual day after
+    the one it was made on.
+    """
+    start = day_start(accrual_date)
+    return BOOKS[book]['model'].objects.filter(
+        Q(last_updated__isnull=True) | Q(last_updated__lt=start),
+        Q(created_at__isnull=True) | Q(created_at__lt=start),
+    )
+
+
+def previous_accrual_day(accrual_date):
+    """The last accrual day before `accrual_date`."""
+    return previous_business_day(accrual_date)
+
+
+def current_deposits(book, accrual_date):
+    """
+    Due deposits that are only missing the accrual date: credited for the
+    previous accrual day, or created on or after it (deposits with no
+    creation time count as new). Crediting anyone else for the date would
+    move their `last_updated` past the days they missed.
+    """
+    previous = day_start(previous_accrual_day(accrual_date))
+    return due_deposits(book, accrual_date).filter(
+        Q(last_updated__gte=previous)
+        | Q(last_updated__isnull=True, created_at__gte=previous)
+        | Q(last_updated__isnull=True, created_at__isnull=True)
+    )
+
+
+def credited_amounts(amounts):
+    """Expression for the amount credited to the outer deposit by {deposit_id: amount}, or 0."""
+    return Case(
+        *[When(pk=deposit_id, then=Value(amount)) for deposit_id, amount in amounts.items()],
+        default=Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def day_profit(balance, daily_profit, created_at, accrual_date, daily_rate, compounding_rate):
+    """
+    Daily and compounding profit, in poisha, a deposit earns on one accrual
+    day. `balance` and `daily_profit` are in poisha.
+    """
+    daily_amount = apply_rate(balance, daily_rate)
+    compounding_amount = 0
+    # Compounding is computed on balance + daily profit including today's credit
+    if created_at is not None and created_at <= day_start(accrual_date) + timedelta(days=1) - COMPOUNDING_AFTER:
+        compounding_amount = apply_rate(balance + daily_profit + daily_amount, compounding_rate)
+    return daily_amount, compounding_amount
+
+
+def ledger_rows(book, deposit_id, accrual_date, daily_amount, compounding_amount, daily_profit, compounding_profit):
+    """
+    Ledger rows for the non-zero poisha amounts credited to a deposit on a
+    day. `daily_profit` and `compounding_profit` are the deposit's profit in
+    poisha before the credit.
+    """
+    spec = BOOKS[book]
+    deposit_id_field = spec['deposit_field'] + '_id'
+    credited_at = timezone.now()
+    return [
+        spec['ledger'](**{
+            deposit_id_field: deposit_id, 'accrual_date': accrual_date,
+            'kind': kind, 'amount': from_poisha(amount),
+            'previous_value': from_poisha(previous), 'new_value': from_poisha(previous + amount),
+            'credited_at': credited_at,
+        })
+        for kind, amount, previous in (
+            ('daily_profit', daily_amount, daily_profit),
+            ('compounding_profit', compounding_amount, compounding_profit),
+        )
+        if amount
+    ]
+
+
+def build_accruals(book, rows, accrual_date):
+    """Compute the ledger rows for (id, balance, daily_profit, compounding_profit, created_at) tuples."""
+    spec = BOOKS[book]
+    daily_rate = rate_on(spec['daily_rate'], accrual_date)
+    compounding_rate = rate_on(spec['compounding_rate'], accrual_date)
+    accruals = []
+    for deposit_id, balance, daily_profit, compounding_profit, created_at in rows:
+        daily_profit = to_poisha(daily_profit)
+        amounts = day_profit(to_poisha(balance), daily_profit, created_at, accrual_date, daily_rate, compounding_rate)
+        accruals += ledger_rows(book, deposit_id, accrual_date, *amounts, daily_profit, to_poisha(compounding_profit))
+    return accruals
+
+
+def credit_chunk(book, rows, accrual_date):
+    """
+    Book one chunk of deposits in the ledger and apply it to their balances.
+
+    Only the rows inserted here are added to the balances. A deposit that
+    already has a ledger row for the date and kind was credited for it, so
+    that kind is left as it is.
+    """
+    spec = BOOKS[book]
+    deposit_id_field = spec['deposit_field'] + '_id'
+    ids = [row[0] for row in rows]
+    booked = set(spec['ledger'].objects.filter(
+        **{f'{deposit_id_field}__in': ids}, accrual_date=accrual_date,
+    ).values_list(deposit_id_field, 'kind'))
+    accruals = [
+        accrual for accrual in build_accruals(book, rows, accrual_date)
+        if (getattr(accrual, deposit_id_field), accrual.kind) not in booked
+    ]
+    spec['ledger'].objects.bulk_create(accruals, ignore_conflicts=True)
+
+    amounts = {'daily_profit': {}, 'compounding_profit': {}}
+    for accrual in accruals:
+        amounts[accrual.kind][getattr(accrual, deposit_id_field)] = accrual.amount
+    return due_deposits(book, accrual_date).filter(id__in=ids).update(
+        daily_profit=F('daily_profit') + credited_amounts(amounts['daily_profit']),
+        compounding_profit=F('compounding_profit') + credited_amounts(amounts['compounding_profit']),
+        last_updated=day_start(accrual_date),
+        version=F('version') + 1,
+    )
+
+
+def shard_ranges(book, shard_size=SHARD_SIZE):
+    """
+    Split the id space of a deposit book into (first_id, last_id) ranges.
+
+    Ranges are aligned to multiples of `shard_size`, so the same shards come
+    out on every run for a date even if new deposits were created meanwhile.
+    """
+    max_id = BOOKS[book]['model'].objects.aggregate(max_id=Max('id'))['max_id'] or 0
+    return [(first, first + shard_size - 1) for first in range(1, max_id + 1, shard_size)]
+
+
+def accrue_shard(book, accrual_date, first_id, last_id):
+    """
+    Credit the deposits of a book with ids in [first_id, last_id] for the
+    accrual date.
+
+    The shard commits in its own transaction together with its checkpoint, so
+    a shard is either fully credited and checkpointed or not touched at all.
+    """
+    rows = (
+        current_deposits(book, accrual_date)
+        .filter(id__gte=first_id, id__lte=last_id)
+        .order_by('id')
+        .values_list('id', BOOKS[book]['balance'], 'daily_profit', 'compounding_profit', 'created_at')
+    )
+
+    with transaction.atomic():
+        if AccrualCheckpoint.objects.filter(book=book, accrual_date=accrual_date, first_id=first_id).exists():
+            return 0
+
+        # Walk the shard in id order, one chunk per query, so memory stays bounded
+        credited = 0
+        after_id = first_id - 1
+        while True:
+            chunk = list(rows.filter(id__gt=after_id)[:CHUNK_SIZE])
+            if not chunk:
+                break
+            credited += credit_chunk(book, chunk, accrual_date)
+            after_id = chunk[-1][0]
+
+        AccrualCheckpoint.objects.create(
+            book=book, accrual_date=accrual_date,
+            first_id=first_id, last_id=last_id, credited=credited,
+        )
+    return credited
+
+
+def _accrue_shard(args):
+    # Process pool entry point, takes a single tuple so it works with map()
+    return args[0], accrue_shard(*args)
+
+
+def _init_worker():
+    # Workers started with "spawn" need the app registry loaded
+    django.setup()
+
+
+def accrue_profit(accrual_date=None, workers=1, shard_size=SHARD_SIZE, books=None):
+    """
+    Credit daily and compounding profit for the accrual date to every
+    deposit of the cashup and cashup owing books, first catching up the
+    accrual days of the last CATCH_UP_DAYS the job missed, oldest first.
+
+    Amounts are written to the book's ledger with bulk inserts and the
+    deposits are then updated from the ledger with one UPDATE per chunk. A
+    deposit is credited for a day when its `last_updated` is before the start
+    of the day and it is current up to the previous accrual day;
+    `last_updated` is moved to that start once it is credited, so running
+    the job twice for the same date never credits anyone twice. Deposits
+    further behind keep their `last_updated` until backfill_profit brings
+    them current.
+
+    Each book is split into id shards. Shards that already have a checkpoint
+    for a day are skipped, so the days the job did not miss cost one lookup,
+    and with `workers` > 1 the rest of a day's shards are processed in a
+    process pool.
+
+    Returns the number of deposit days credited per book.
+    """
+    if accrual_date is None:
+        accrual_date = timezone.localdate()
+    books = books or list(BOOKS)
+
+    credited = {book: 0 for book in books}
+    shards = {book: shard_ranges(book, shard_size) for book in books}
+    for day in accrual_days(accrual_date - timedelta(days=CATCH_UP_DAYS), accrual_date):
+        pending = []
+        for book in books:
+            done = set(AccrualCheckpoint.objects.filter(
+                book=book, accrual_date=day,
+            ).values_list('first_id', flat=True))
+            pending += [
+                (book, day, first_id, last_id)
+                for first_id, last_id in shards[book]
+                if first_id not in done
+            ]
+
+        if workers <= 1 or len(pending) <= 1:
+            results = map(_accrue_shard, pending)
+        else:
+            # Forked workers must not share the parent's database connection
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                results = list(pool.map(_accrue_shard, pending))
+
+        for book, count in results:
+            credited[book] += count
+    if any(credited.values()):
+        invalidate_all()
+    return credited
+
+
+def accrual_days(first, last):
+    """Accrual days from `first` to `last`, both inclusive."""
+    return business_days(first, last)
+
+
+def first_missed_day(deposit, since):
+    """First accrual date a deposit has not been credited for, no earlier than `since`."""
+    first = since
+    if deposit.last_updated is not None:
+        first = max(first, timezone.localtime(deposit.last_updated).date() + timedelta(days=1))
+    if deposit.created_at is not None:
+        first = max(first, timezone.localtime(deposit.created_at).date() + timedelta(days=1))
+    return first
+
+
+def backfill_book(book, since, until, dry_run=False):
+    """
+    Credit every accrual day from `since` to `until` that the deposits of a
+    book missed, in a single pass over the book.
+
+    Each deposit is walked through its missed days in memory, so compounding
+    is computed on the daily profit credited on the earlier missed days, the
+    same as if the daily job had run. Every chunk then costs one bulk ledger
+    insert and one bulk update, whatever the length of the gap. With
+    `dry_run` nothing is written.
+
+    Returns the number of deposits brought current and the daily and
+    compounding profit credited to them.
+    """
+    spec = BOOKS[book]
+    days = [
+        (day, rate_on(spec['daily_rate'], day), rate_on(spec['compounding_rate'], day))
+        for day in accrual_days(since, until)
+    ]
+    deposits = due_deposits(book, until).order_by('id').only(
+        'id', 'last_updated', 'created_at', spec['balance'], 'daily_profit', 'compounding_profit',
+    )
+    if not dry_run:
+        deposits = deposits.select_for_update()
+
+    credited = 0
+    daily_total = 0
+    compounding_total = 0
+    after_id = 0
+    while days:
+        with transaction.atomic():
+            chunk = list(deposits.filter(id__gt=after_id)[:CHUNK_SIZE])
+            if not chunk:
+                break
+            after_id = chunk[-1].id
+
+            accruals = []
+            updated = []
+            for deposit in chunk:
+                first = first_missed_day(deposit, since)
+                balance = to_poisha(getattr(deposit, spec['balance']))
+                daily_profit = to_poisha(deposit.daily_profit)
+                compounding_profit = to_poisha(deposit.compounding_profit)
+                last_credited = None
+                for day, daily_rate, compounding_rate in days:
+                    if day < first:
+                        continue
+                    daily_amount, compounding_amount = day_profit(
+                        balance, daily_profit, deposit.created_at, day, daily_rate, compounding_rate,
+                    )
+                    accruals += ledger_rows(
+                        book, deposit.id, day, daily_amount, compounding_amount, daily_profit, compounding_profit,
+                    )
+                    daily_profit += daily_amount
+                    compounding_profit += compounding_amount
+                    daily_total += daily_amount
+                    compounding_total += compounding_amount
+                    last_credited = day
+                if last_credited is None:
+                    continue
+
+                deposit.daily_profit = from_poisha(daily_profit)
+                deposit.compounding_profit = from_poisha(compounding_profit)
+                deposit.last_updated = day_start(last_credited)
+                deposit.version += 1
+                updated.append(deposit)
+
+            credited += len(updated)
+            if not dry_run:
+                spec['ledger'].objects.bulk_create(accruals, batch_size=CHUNK_SIZE, ignore_conflicts=True)
+                spec['model'].objects.bulk_update(
+                    updated, ['daily_profit', 'compounding_profit', 'last_updated', 'version'], batch_size=CHUNK_SIZE,
+                )
+
+    return {
+        'deposits': credited,
+        'daily_profit': from_poisha(daily_total),
+        'compounding_profit': from_poisha(compounding_total),
+    }
+
+
+def backfill_profit(since, until, dry_run=False, books=None):
+    """Run backfill_book for each deposit book, returning its result per book."""
+    results = {book: backfill_book(book, since, until, dry_run) for book in books or BOOKS}
+    if not dry_run:
+        invalidate_all()
+    return results
+
+
+def daily_amount(balance_field, rate):
+    """
+    Expression for apply_rate() of the outer deposit's balance, in poisha:
+    the daily profit the job credits at `rate`, rounded half up the same way.
+    """
+    numerator, denominator = rate_ratio(rate)
+    poisha = Cast(F(balance_field) * POISHA_PER_TAKA, BigIntegerField())
+    # Integer division, as in apply_rate()
+    return (poisha * (2 * numerator) + denominator) / (2 * denominator)
+
+
+def owed_profit(today, balance_field='cashup_main_balance'):
+    """
+    Expression for the daily profit, in poisha, the daily job will credit a
+    deposit with when it runs for `today`.
+
+    A deposit credited for day D has `last_updated` at the start of D and a
+    deposit created on day D earns from the accrual day after it, so either
+    way the owed days are the accrual days after D. The job only catches up
+    deposits that are current up to the start of its CATCH_UP_DAYS window;
+    anyone further behind is left to backfill_profit and owes nothing here.
+
+    The job rounds each day's profit to the poisha, so the owed days are
+    split into runs at one rate and each run adds its number of owed days
+    times the rounded daily amount at its rate.
+    """
+    oldest = previous_accrual_day(today - timedelta(days=CATCH_UP_DAYS))
+    runs = get_rate_table(oldest, today).runs('daily_profit', oldest + timedelta(days=1), today)
+    days = [today - timedelta(days=k) for k in range((today - oldest).days + 1)]
+
+    def owed(run, first):
+        # Days of the run from `first` on
+        return Value(sum(1 for day in run if day >= first))
+
+    total = Value(0)
+    for rate, run in runs:
+        whens = [When(last_updated__isnull=True, created_at__isnull=True, then=owed(run, oldest + timedelta(days=1)))]
+        for day in days:
+            whens.append(When(
+                last_updated__isnull=True, created_at__gte=day_start(day), then=owed(run, day + timedelta(days=1)),
+            ))
+        for day in days:
+            whens.append(When(last_updated__gte=day_start(day), then=owed(run, day + timedelta(days=1))))
+        owed_days = Case(*whens, default=Value(0), output_field=BigIntegerField())
+        total = total + daily_amount(balance_field, rate) * owed_days
+    return ExpressionWrapper(total, output_field=BigIntegerField())
+
+
+def with_accrued_profit(queryset, today=None):
+    """
+    Annotate CashupDeposits with `accrued_daily_profit`: the stored daily
+    profit plus what the accrual job will credit for the days up to today.
+
+    Nothing is written, so GET requests can show up-to-date figures without
+    touching the rows.
+    """
+    if today is None:
+        today = timezone.localdate()
+    owed = ExpressionWrapper(
+        owed_profit(today) * Value(Decimal('0.01')), output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    return queryset.annotate(accrued_daily_profit=F('daily_profit') + owed)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Purchase, Buyer,BuyerOTP,Slider,ProductAdSlider,SponsoredBy,ReferralCode,WithdrawalFromDailyProfit,CashupDepositHistory,WithdrawalFromCashupBalance,CashupOwingProfitHistory,CashupProfitHistory,TransferHistory,WithdrawalFromCompoundingProfit,WithdrawalFromMainBalance,Category ,Item ,CheckoutDetail,CashupOwingDeposit , CashupDeposit , BuyerTransaction
+from .models import Purchase, Buyer,BuyerOTP,ProfitAccrual,OwingProfitAccrual,AccrualCheckpoint,OutboxEvent,IdempotencyKey,LedgerAccount,LedgerTransfer,LedgerPosting,PublicHoliday,ProfitRateSchedule,Slider,ProductAdSlider,SponsoredBy,ReferralCode,Withdrawal,CashupDepositHistory,CashupOwingProfitHistory,CashupProfitHistory,TransferHistory,Category ,Item ,CheckoutDetail,CashupOwingDeposit , CashupDeposit , BuyerTransaction
 from .models import User
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _  # Import for translation support
@@ -22,6 +22,16 @@ class CategoryAdmin(admin.ModelAdmin):
 class BuyerTransactionAdmin(admin.ModelAdmin):
     list_display= ('buyer', 'transaction_id', 'phone_number', 'amount', 'method', 'verified', 'date')
     search_fields=['phone_number']
+    list_filter = ('verified', 'method')
+    actions = ['verify_selected']
+
+    def verify_selected(self, request, queryset):
+        # Verify the selected transactions in bulk instead of one save() each
+        from .verification import verify_transactions
+        verified = verify_transactions(queryset.filter(verified=False).values_list('id', flat=True))
+        self.message_user(request, f"{verified} transactions verified.")
+
+    verify_selected.short_description = "Verify selected transactions"
 class CheckoutDetailsAdmin(admin.ModelAdmin):
     search_fields=['phone_number']
 
@@ -33,6 +43,51 @@ class CashupOwingProfitHistoryAdmin(admin.ModelAdmin):
     list_display = ('cashup_owing_deposit', 'field_name', 'previous_value', 'new_value', 'change_timestamp')  # Columns to show in the list view
     search_fields = ('cashup_owing_deposit__id', 'field_name')  # Fields to search in the admin interface
     list_filter = ('change_timestamp', 'updated_by')  # Filters for the list view
+class ProfitAccrualAdmin(admin.ModelAdmin):
+    list_display = ('cashup_deposit', 'accrual_date', 'kind', 'amount')
+    search_fields = ('cashup_deposit__buyer__phone_number',)
+    list_filter = ('accrual_date', 'kind')
+    raw_id_fields = ('cashup_deposit',)
+class OwingProfitAccrualAdmin(admin.ModelAdmin):
+    list_display = ('cashup_owing_deposit', 'accrual_date', 'kind', 'amount')
+    search_fields = ('cashup_owing_deposit__buyer__phone_number',)
+    list_filter = ('accrual_date', 'kind')
+    raw_id_fields = ('cashup_owing_deposit',)
+class PublicHolidayAdmin(admin.ModelAdmin):
+    list_display = ('date', 'name')
+    ordering = ('-date',)
+class ProfitRateScheduleAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'rate', 'effective_from')
+    list_filter = ('kind',)
+    ordering = ('kind', '-effective_from')
+class AccrualCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('book', 'accrual_date', 'first_id', 'last_id', 'credited', 'completed_at')
+    list_filter = ('book', 'accrual_date')
+class LedgerAccountAdmin(admin.ModelAdmin):
+    list_display = ('buyer', 'bucket', 'balance', 'updated_at')
+    list_filter = ('bucket',)
+    search_fields = ('buyer__phone_number',)
+    raw_id_fields = ('buyer',)
+class LedgerPostingInline(admin.TabularInline):
+    model = LedgerPosting
+    fields = ('account', 'amount')
+    readonly_fields = ('account', 'amount')
+    extra = 0
+    can_delete = False
+class LedgerTransferAdmin(admin.ModelAdmin):
+    # The ledger is append-only, postings are shown read-only
+    list_display = ('id', 'kind', 'memo', 'created_at')
+    list_filter = ('kind',)
+    search_fields = ('memo',)
+    inlines = [LedgerPostingInline]
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('buyer', 'key', 'status_code', 'created_at', 'expires_at')
+    search_fields = ('key', 'buyer__phone_number')
+    raw_id_fields = ('buyer',)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('topic', 'object_id', 'created_at', 'processed_at')
+    list_filter = ('topic', 'processed_at')
+    search_fields = ('object_id',)
 
 
 
@@ -58,13 +113,17 @@ class CashupOwingDepositAdmin(admin.ModelAdmin):
                 if obj.cashup_owing_main_balance is None:
                     obj.cashup_owing_main_balance = 0  # Set default value if None
 
-                # Add the requested balance to the cashup_owing_main_balance
-                obj.cashup_owing_main_balance += obj.requested_cashup_owing_main_balance
+                with transaction.atomic():
+                    # Add the requested balance to the cashup_owing_main_balance
+                    obj.cashup_owing_main_balance += obj.requested_cashup_owing_main_balance
+                    ledger.record('owing_approval', [
+                        (obj.buyer, 'cashup_owing_main_balance', obj.requested_cashup_owing_main_balance),
+                    ], contra='owing')
 
-                # Reset the requested cashup owing balance to 0
-                obj.requested_cashup_owing_main_balance = 0
-                obj.verified = False
-                obj.save()
+                    # Reset the requested cashup owing balance to 0
+                    obj.requested_cashup_owing_main_balance = 0
+                    obj.verified = False
+                    obj.save()
 
                 # After updating, check if the cashup_owing_main_balance is now 0, and reset `verified` to False if needed
                 
@@ -79,135 +138,39 @@ class CashupOwingDepositAdmin(admin.ModelAdmin):
             super().save_model(request, obj, form, change)
 
 from django.db import transaction
-class WithdrawalRequestAdmin(admin.ModelAdmin):
-    # Override the save_model method to handle logic for withdrawal requests
+from . import ledger
+class WithdrawalAdmin(admin.ModelAdmin):
+    list_display = ('buyer', 'source', 'amount', 'status', 'method', 'withdraw_number', 'date')
+    list_filter = ('status', 'source', 'method')
+    search_fields = ('buyer__phone_number', 'withdraw_number')
+    raw_id_fields = ('buyer',)
+    ordering = ('-date',)
+    actions = ['approve_selected', 'reject_selected']
+
     def save_model(self, request, obj, form, change):
-        # If the status is 'Approved', process the withdrawal request
-        if obj.status == 'Approved':
-            # Ensure the buyer has a related CashupDeposit
-            if hasattr(obj.buyer, 'cashup_deposits'):
-                # Get the first related CashupDeposit
-                cashup_deposit = obj.buyer.cashup_deposits.first()
-
-                if cashup_deposit:
-                    # Check if the cashup deposit balance is sufficient
-                    if cashup_deposit.cashup_main_balance >= obj.amount:
-                        # Begin a transaction to ensure atomicity
-                        with transaction.atomic():
-                            # Deduct the amount from the cashup deposit
-                            cashup_deposit.cashup_main_balance -= obj.amount
-                            cashup_deposit.save()
-
-                            # Add the withdrawal amount to the buyer's main_balance
-                            obj.buyer.main_balance += obj.amount
-                            obj.buyer.save()
-
-                            cashup_deposit.withdraw += obj.amount  # Add this line to log the withdrawn amount
-                            cashup_deposit.save()
-
-                            # Optionally, log the transaction or handle any related models
-                            # For example, you can log this in a transaction model or something similar
-                            # You can also update any related fields here if needed.
-
-                            # Ensure the withdrawal request is marked as processed
-                            obj.save()
-
-                    else:
-                        # Instead of raising an error, display a message
-                        messages.warning(request, _('Insufficient funds in cashup deposit. Withdrawal cannot be processed.'))
-                        # Optionally, you could mark the request as "Failed" or "Rejected" here
-                        obj.status = 'Rejected'
-                        obj.save()
-                else:
-                    # If no cashup deposit is found, show a different message
-                    messages.error(request, _('No cashup deposit found for the buyer. Withdrawal cannot be processed.'))
-                    obj.status = 'Rejected'
-                    obj.save()
+        # Setting the status to Approved pays the withdrawal out (withdrawals.approve)
+        super().save_model(request, obj, form, change)
+        if getattr(obj, 'rejection_reason', None):
+            messages.warning(request, _('Withdrawal cannot be processed: %(reason)s') % {'reason': obj.rejection_reason})
 
-from django.db import transaction  # Ensure this import is included
+    def approve_selected(self, request, queryset):
+        approved = rejected = 0
+        for withdrawal in queryset.filter(status='Pending').select_related('buyer').order_by('date'):
+            withdrawal.status = 'Approved'
+            withdrawal.save(update_fields=['status'])
+            if withdrawal.status == 'Approved':
+                approved += 1
+            else:
+                rejected += 1
+        self.message_user(request, f"{approved} withdrawals approved, {rejected} rejected for insufficient funds.")
 
-class WithdrawalFromMainBalanceAdmin(admin.ModelAdmin):
-    # Override the save_model method to handle logic for withdrawal requests
-    def save_model(self, request, obj, form, change):
-        # If the status is 'Approved', process the withdrawal request
-        if obj.status == 'Approved':
-            # Ensure the buyer has a related CashupDeposit
-            if hasattr(obj.buyer, 'cashup_deposits'):
-                # Get the first related CashupDeposit
-                cashup_deposit = obj.buyer.cashup_deposits.first()
-
-                if Buyer:
-                    # Check if the buyer's main balance is sufficient
-                    if obj.buyer.main_balance >= obj.amount:
-                        # Begin a transaction to ensure atomicity
-                        with transaction.atomic():
-                            # Deduct the amount from the buyer's main balance
-                            obj.buyer.main_balance -= obj.amount
-                            obj.buyer.save()
-
-                            # Optionally, log the transaction or handle any related models
-                            # For example, you can log this in a transaction model or something similar
-
-                            # Ensure the withdrawal request is marked as processed
-                            obj.save()
-
-                    else:
-                        # Instead of raising an error, display a message
-                        messages.warning(request, _('Insufficient funds in your balance. Withdrawal cannot be processed.'))
-                        # Optionally, you could mark the request as "Failed" or "Rejected" here
-                        obj.status = 'Rejected'
-                        obj.save()
-                else:
-                    # If no cashup deposit is found, show a different message
-                    messages.error(request, _('No cashup deposit found for the buyer. Withdrawal cannot be processed.'))
-                    obj.status = 'Rejected'
-                    obj.save()
+    approve_selected.short_description = "Approve selected pending withdrawals"
 
+    def reject_selected(self, request, queryset):
+        rejected = queryset.filter(status='Pending').update(status='Rejected')
+        self.message_user(request, f"{rejected} withdrawals rejected.")
 
-class WithdrawalFromCmpoundingProfitAdmin(admin.ModelAdmin):
-    # Override the save_model method to handle logic for withdrawal requests
-    def save_model(self, request, obj, form, change):
-        # If the status is 'Approved', process the withdrawal request
-        if obj.status == 'Approved':
-            # Ensure the buyer has a related CashupDeposit
-            if hasattr(obj.buyer, 'cashup_deposits'):
-                # Get the first related CashupDeposit
-                cashup_deposit = obj.buyer.cashup_deposits.first()
-
-                if cashup_deposit:
-                    # Check if the cashup deposit balance is sufficient
-                    if cashup_deposit.compounding_profit >= obj.amount:
-                        # Begin a transaction to ensure atomicity
-                        with transaction.atomic():
-                            # Deduct the amount from the cashup deposit
-                            cashup_deposit.compounding_profit -= obj.amount
-                            cashup_deposit.save()
-
-                            # Add the withdrawal amount to the buyer's main_balance
-                            obj.buyer.main_balance += obj.amount
-                            obj.buyer.save()
-
-                            cashup_deposit.compounding_withdraw += obj.amount  # Add this line to log the withdrawn amount
-                            cashup_deposit.save()
-
-                            # Optionally, log the transaction or handle any related models
-                            # For example, you can log this in a transaction model or something similar
-                            # You can also update any related fields here if needed.
-
-                            # Ensure the withdrawal request is marked as processed
-                            obj.save()
-
-                    else:
-                        # Instead of raising an error, display a message
-                        messages.warning(request, _('Insufficient funds in cashup deposit compounding profit. Withdrawal cannot be processed.'))
-                        # Optionally, you could mark the request as "Failed" or "Rejected" here
-                        obj.status = 'Rejected'
-                        obj.save()
-                else:
-                    # If no cashup deposit is found, show a different message
-                    messages.error(request, _('No cashup deposit found for the buyer. Withdrawal cannot be processed.'))
-                    obj.status = 'Rejected'
-                    obj.save()
+    reject_selected.short_description = "Reject selected pending withdrawals"
 
 
 
@@ -226,17 +189,23 @@ admin.site.register(Item,ItemAdmin)
 admin.site.register(CashupDeposit,CashupAdmin)
 admin.site.register(BuyerTransaction,BuyerTransactionAdmin)
 admin.site.register(CheckoutDetail,CheckoutDetailsAdmin)
-admin.site.register(WithdrawalFromMainBalance,WithdrawalFromMainBalanceAdmin)
-admin.site.register(WithdrawalFromCashupBalance, WithdrawalRequestAdmin)
+admin.site.register(Withdrawal,WithdrawalAdmin)
 admin.site.register(TransferHistory)
 admin.site.register(CashupProfitHistory,CashupProfitHistoryAdmin)
 admin.site.register(CashupOwingProfitHistory,CashupOwingProfitHistoryAdmin)
+admin.site.register(ProfitAccrual,ProfitAccrualAdmin)
+admin.site.register(OwingProfitAccrual,OwingProfitAccrualAdmin)
+admin.site.register(AccrualCheckpoint,AccrualCheckpointAdmin)
+admin.site.register(OutboxEvent,OutboxEventAdmin)
+admin.site.register(IdempotencyKey,IdempotencyKeyAdmin)
+admin.site.register(LedgerAccount,LedgerAccountAdmin)
+admin.site.register(LedgerTransfer,LedgerTransferAdmin)
+admin.site.register(PublicHoliday,PublicHolidayAdmin)
+admin.site.register(ProfitRateSchedule,ProfitRateScheduleAdmin)
 admin.site.register(BuyerOTP)
 admin.site.register(Slider)
-admin.site.register(WithdrawalFromCompoundingProfit)
 admin.site.register(CashupDepositHistory)
 admin.site.register(ReferralCode)
-admin.site.register(WithdrawalFromDailyProfit)
 admin.site.register(SponsoredBy)
 admin.site.register(CompanyNumber)
 admin.site.register(ProductAdSlider)
@@ -0,0 +1,75 @@
+from decimal import Decimal
+
+from django.db import connections, router
+
+from .summary import invalidate
+
+
+class InsufficientBalance(Exception):
+    """Raised when a debit would take a buyer's main_balance below zero."""
+
+
+def _update_main_balance(buyer, delta, minimum=None):
+    """
+    Add `delta` to the buyer's main_balance in one statement and return the
+    new balance, or None if the row did not match (unknown buyer, or balance
+    below `minimum`).
+
+    The new balance comes back through UPDATE ... RETURNING, so there is no
+    read before the write and no window for a concurrent request to slip in.
+    """
+    from .models import Buyer
+
+    using = router.db_for_write(Buyer, instance=buyer)
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    table = quote_name(Buyer._meta.db_table)
+    column = quote_name(Buyer._meta.get_field('main_balance').column)
+    pk = quote_name(Buyer._meta.pk.column)
+
+    sql = f"UPDATE {table} SET {column} = {column} + %s WHERE {pk} = %s"
+    params = [delta, buyer.pk]
+    if minimum is not None:
+        sql += f" AND {column} >= %s"
+        params.append(minimum)
+    sql += f" RETURNING {column}"
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    invalidate(buyer.pk)
+
+    # Keep the caller's instance in step so a later full save() does not
+    # write a stale balance back
+    buyer.main_balance = Decimal(str(row[0])).quantize(Decimal('0.01'))
+    return buyer.main_balance
+
+
+def credit(buyer, amount):
+    """Add `amount` to the buyer's main_balance and return the new balance."""
+    amount = Decimal(amount)
+    if amount < 0:
+        raise ValueError("Credit amount must not be negative.")
+    balance = _update_main_balance(buyer, amount)
+    if balance is None:
+        raise ValueError(f"Buyer {buyer.pk} does not exist.")
+    return balance
+
+
+def debit(buyer, amount):
+    """
+    Take `amount` from the buyer's main_balance and return the new balance.
+
+    The balance check and the deduction are the same statement, so two
+    concurrent debits can never both spend the same money. Raises
+    InsufficientBalance if the balance is lower than `amount`.
+    """
+    amount = Decimal(amount)
+    if amount < 0:
+        raise ValueError("Debit amount must not be negative.")
+    balance = _update_main_balance(buyer, -amount, minimum=amount)
+    if balance is None:
+        raise InsufficientBalance("Insufficient balance.")
+    return balance
@@ -0,0 +1,172 @@
+import threading
+import time
+from bisect import bisect_left
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+
+# First day the calendar index covers; no deposit predates it
+CALENDAR_START = date(2024, 1, 1)
+
+# How far past today the index reaches when it is built
+CALENDAR_HORIZON = timedelta(days=400)
+
+# Shared cache key of the calendar version, bumped on every holiday change so
+# every process (web workers, accrual pool workers) rebuilds its index
+CALENDAR_VERSION_KEY = 'business-calendar-version'
+
+# Rebuild the index at least this often, in case the version counter is
+# evicted or the cache backend is not shared between processes
+CALENDAR_TTL = timedelta(hours=1)
+
+
+class BusinessCalendar:
+    """
+    Precomputed business-day index over a fixed date range.
+
+    `_counts[i]` holds the number of business days among the first `i` days
+    of the range. The counts only grow at business days, so the business
+    days of any covered range, or the one before a date, are found by
+    bisecting the counts instead of walking the calendar day by day.
+    """
+
+    def __init__(self, first_day, last_day, off_days, holidays, version=None):
+        self.first_day = first_day
+        self.last_day = last_day
+        self.version = version
+        self.built_at = timezone.now()
+
+        counts = [0]
+        day = first_day
+        while day <= last_day:
+            is_business_day = day.weekday() not in off_days and day not in holidays
+            counts.append(counts[-1] + is_business_day)
+            day += timedelta(days=1)
+        self._counts = counts
+
+    def covers(self, first, last):
+        return self.first_day <= first and last <= self.last_day
+
+    def _index(self, day):
+        if not self.first_day <= day <= self.last_day:
+            raise ValueError(f"{day} is outside the business calendar ({self.first_day} to {self.last_day}).")
+        return (day - self.first_day).days
+
+    def is_business_day(self, day):
+        i = self._index(day)
+        return self._counts[i + 1] != self._counts[i]
+
+    def _nth_day(self, n):
+        # The n-th business day of the range (1-based) is the day at which
+        # the running count first reaches n
+        return self.first_day + timedelta(days=bisect_left(self._counts, n) - 1)
+
+    def days(self, first, last):
+        """Business days from `first` to `last`, both inclusive."""
+        if last < first:
+            return []
+        before = self._counts[self._index(first)]
+        through = self._counts[self._index(last) + 1]
+        return [self._nth_day(n) for n in range(before + 1, through + 1)]
+
+    def previous(self, day):
+        """Last business day before `day`, or None if the range has none."""
+        before = self._counts[self._index(day)]
+        return self._nth_day(before) if before else None
+
+
+_calendar = None
+_lock = threading.Lock()
+
+
+def shared_version(key):
+    """Current value of a version counter kept in the shared cache."""
+    # A missing counter starts from the clock rather than 1, so an evicted
+    # counter never comes back to a version some process still holds
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, time.time_ns(), None)
+        value = cache.get(key)
+    return value
+
+
+def bump_version(key):
+    """Bump a shared version counter once the current transaction commits."""
+    def bump():
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+    transaction.on_commit(bump)
+
+
+def build_calendar(first_day, last_day, version=None):
+    from .models import PublicHoliday
+
+    off_days = tuple(getattr(settings, 'ACCRUAL_OFF_DAYS', (4, 5)))
+    holidays = set(PublicHoliday.objects.filter(
+        date__gte=first_day, date__lte=last_day,
+    ).values_list('date', flat=True))
+    return BusinessCalendar(first_day, last_day, off_days, holidays, version)
+
+
+def get_calendar(first=None, last=None):
+    """
+    Return the process's calendar, rebuilding it when a holiday changed in
+    any process since it was built, when it is stale, or when it does not
+    cover the requested dates.
+    """
+    global _calendar
+
+    first = first or timezone.localdate()
+    last = last or first
+    if first < CALENDAR_START:
+        raise ValueError(f"{first} is before the business calendar starts ({CALENDAR_START}).")
+
+    # Read the version before building, so a change committed while the
+    # index is built leaves it behind the counter and it is built again
+    version = shared_version(CALENDAR_VERSION_KEY)
+    calendar = _calendar
+    if (
+        calendar is not None
+        and calendar.version == version
+        and calendar.covers(first, last)
+        and timezone.now() - calendar.built_at < CALENDAR_TTL
+    ):
+        return calendar
+
+    with _lock:
+        last_day = max(last, timezone.localdate() + CALENDAR_HORIZON)
+        _calendar = build_calendar(CALENDAR_START, last_day, version)
+        return _calendar
+
+
+def clear_calendar():
+    """
+    Drop this process's calendar, and every other process's once the
+    current transaction commits, so the next lookup sees holiday changes.
+    """
+    global _calendar
+    _calendar = None
+    bump_version(CALENDAR_VERSION_KEY)
+
+
+def is_business_day(day):
+    return get_calendar(day).is_business_day(day)
+
+
+def business_days(first, last):
+    """Business days from `first` to `last`, both inclusive."""
+    if last < first:
+        return []
+    return get_calendar(first, last).days(first, last)
+
+
+def previous_business_day(day):
+    """Last business day before `day`."""
+    return get_calendar(day).previous(day)
@@ -0,0 +1,147 @@
+from datetime import timedelta
+
+import numpy as np
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .accrual import COMPOUNDING_AFTER
+from .models import CashupDeposit, CashupOwingDeposit
+from .money import from_poisha, round_poisha, to_poisha
+from .rates import get_rate_table
+
+
+# Horizons reported when none are requested
+DEFAULT_HORIZONS = (30, 90, 365)
+
+# Deposit books and the rate kinds that drive them
+BOOKS = {
+    'cashup': {
+        'model': CashupDeposit,
+        'balance': 'cashup_main_balance',
+        'daily_kind': 'daily_profit',
+        'compounding_kind': 'compounding_profit',
+        'what_if_prefix': '',
+    },
+    'cashup_owing': {
+        'model': CashupOwingDeposit,
+        'balance': 'cashup_owing_main_balance',
+        'daily_kind': 'owing_daily_profit',
+        'compounding_kind': 'owing_compounding_profit',
+        'what_if_prefix': 'owing_',
+    },
+}
+
+
+def load_book(book):
+    """
+    Load a deposit book into int64 arrays: balance and stored daily profit in
+    poisha, and the local date each deposit was created (as a date ordinal,
+    -1 if unknown).
+    """
+    spec = BOOKS[book]
+    rows = spec['model'].objects.annotate(
+        created_on=TruncDate('created_at'),
+    ).values_list(spec['balance'], 'daily_profit', 'created_on')
+
+    balances = []
+    daily_profits = []
+    created = []
+    for balance, daily_profit, created_on in rows.iterator(chunk_size=5000):
+        balances.append(to_poisha(balance))
+        daily_profits.append(to_poisha(daily_profit))
+        created.append(created_on.toordinal() if created_on else -1)
+
+    return (
+        np.array(balances, dtype=np.int64),
+        np.array(daily_profits, dtype=np.int64),
+        np.array(created, dtype=np.int64),
+    )
+
+
+def daily_rates(kind, first_day, days, override=None):
+    """Rate of the given kind on each forecast day, 0 on days without accrual."""
+    table = get_rate_table(first_day, first_day + timedelta(days=days - 1))
+    rates = np.zeros(days, dtype=np.float64)
+    for i in range(days):
+        day = first_day + timedelta(days=i)
+        if table.calendar.is_business_day(day):
+            if override is not None:
+                rates[i] = float(override)
+            elif kind is not None:
+                rates[i] = float(table.rate(kind, day))
+    return rates
+
+
+def forecast_book(balances, daily_profits, created, first_day, days, daily_rate, compounding_rate):
+    """
+    Project the daily and compounding profit, in poisha, a book earns over
+    `days` days starting at `first_day`.
+
+    Balances are held constant over the horizon. Daily profit on day d is
+    balance * r_d, and compounding profit on an eligible day d is
+    (balance + daily profit so far) * c_d. Both sums have a closed form over
+    prefix sums of the rates, so every deposit is projected at once:
+
+        daily       = B * S[n]
+        compounding = (B + P) * (A[n] - A[e]) + B * (Q[n] - Q[e])
+
+    where S, A and Q are prefix sums of r_d, c_d and c_d * S_d, and e is the
+    first day the deposit is old enough to compound.
+    """
+    if not len(balances):
+        return 0, 0
+
+    cumulative_daily = np.cumsum(daily_rate)  # S_d, daily profit rate up to and including day d
+    A = np.concatenate(([0.0], np.cumsum(compounding_rate)))
+    Q = np.concatenate(([0.0], np.cumsum(compounding_rate * cumulative_daily)))
+
+    daily = balances * cumulative_daily[-1]
+
+    # First forecast day on which each deposit compounds, `days` if never
+    eligible_from = created + COMPOUNDING_AFTER.days - first_day.toordinal()
+    eligible_from = np.where(created < 0, days, np.clip(eligible_from, 0, days))
+    compounding = (
+        (balances + daily_profits) * (A[-1] - A[eligible_from])
+        + balances * (Q[-1] - Q[eligible_from])
+    )
+    return round_poisha(daily.sum()), round_poisha(compounding.sum())
+
+
+def forecast_liability(horizons=DEFAULT_HORIZONS, what_if=None):
+    """
+    Total profit liability across both deposit books for each horizon, in days
+    from tomorrow.
+
+    `what_if` may override rates for the whole horizon with the keys
+    `daily_rate`, `compounding_rate`, `owing_daily_rate` and
+    `owing_compounding_rate`.
+    """
+    what_if = what_if or {}
+    first_day = timezone.localdate() + timedelta(days=1)
+    longest = max(horizons)
+
+    books = {}
+    for book, spec in BOOKS.items():
+        prefix = spec['what_if_prefix']
+        books[book] = (
+            load_book(book),
+            daily_rates(spec['daily_kind'], first_day, longest, what_if.get(prefix + 'daily_rate')),
+            daily_rates(spec['compounding_kind'], first_day, longest, what_if.get(prefix + 'compounding_rate')),
+        )
+
+    report = []
+    for days in sorted(horizons):
+        entry = {'days': days, 'from': first_day}
+        total = 0
+        for book, (arrays, daily_rate, compounding_rate) in books.items():
+            daily, compounding = forecast_book(
+                *arrays, first_day, days, daily_rate[:days], compounding_rate[:days],
+            )
+            entry[book] = {
+                'daily_profit': from_poisha(daily),
+                'compounding_profit': from_poisha(compounding),
+            }
+            total += daily + compounding
+        entry['total'] = from_poisha(total)
+        report.append(entry)
+    return report
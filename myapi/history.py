@@ -0,0 +1,29 @@
+from collections import defaultdict
+
+from django.db import DEFAULT_DB_ALIAS
+
+
+class HistoryBuffer:
+    """
+    Collects CashupProfitHistory, CashupOwingProfitHistory and
+    CashupDepositHistory rows and writes them with one bulk_create per model.
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+        self.rows = defaultdict(list)
+
+    def add(self, row):
+        fill_defaults = getattr(row, 'fill_defaults', None)
+        if fill_defaults:
+            # bulk_create skips save(), so apply its defaults now
+            fill_defaults()
+        self.rows[type(row)].append(row)
+
+    def flush(self):
+        rows, self.rows = self.rows, defaultdict(list)
+        written = 0
+        for model, objs in rows.items():
+            model.objects.using(self.using).bulk_create(objs)
+            written += len(objs)
+        return written
@@ -0,0 +1,113 @@
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+
+# Request header carrying the client-generated key
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+# Keys longer than this are rejected
+MAX_KEY_LENGTH = 255
+
+# Responses telling the client to try again: 409 when a write conflicted
+# (retry_on_conflict ran out of attempts, or a checkout was already under way)
+RETRYABLE_STATUS_CODES = {status.HTTP_409_CONFLICT}
+
+
+def request_fingerprint(request):
+    """Hash of the method, path and body, to spot a key reused for another request."""
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method} {request.path} {body}".encode()).hexdigest()
+
+
+def key_ttl():
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL', timedelta(hours=24))
+
+
+def _reserve(buyer, key, fingerprint):
+    """
+    Claim (buyer, key) for this request. Returns (record, created): the new
+    record, or the live record a previous request with the key left behind.
+    """
+    from .models import IdempotencyKey
+
+    now = timezone.now()
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    buyer=buyer, key=key, fingerprint=fingerprint, expires_at=now + key_ttl(),
+                )
+            return record, True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(buyer=buyer, key=key).first()
+            if record is not None and record.expires_at > now:
+                return record, False
+            # The old record expired (or was just removed), claim the key again
+            IdempotencyKey.objects.filter(buyer=buyer, key=key, expires_at__lte=now).delete()
+    raise IntegrityError(f"Could not reserve idempotency key {key!r}.")
+
+
+def idempotent(post):
+    """
+    Make an APIView handler safe to retry with an `Idempotency-Key` header.
+
+    The first request with a key runs the handler and stores its response.
+    A retry with the same key and the same body replays that response
+    without running the handler again, until the key expires
+    (IDEMPOTENCY_KEY_TTL, 24 hours by default). A retry that arrives while
+    the first request is still running gets 409, and reusing a key with a
+    different body gets 422. Server errors and conflicts (409) are not
+    stored, so the client can retry them with the same key. Requests
+    without the header run as before.
+    """
+    @functools.wraps(post)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key or not request.user.is_authenticated:
+            return post(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"detail": f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = request_fingerprint(request)
+        record, created = _reserve(request.user, key, fingerprint)
+        if not created:
+            if record.fingerprint != fingerprint:
+                return Response(
+                    {"detail": f"{IDEMPOTENCY_HEADER} was already used for a different request."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if record.status_code is None:
+                return Response(
+                    {"detail": "A request with this idempotency key is still being processed."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            response = Response(record.response_body, status=record.status_code)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = post(self, request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 500 or response.status_code in RETRYABLE_STATUS_CODES:
+            record.delete()
+        else:
+            record.status_code = response.status_code
+            record.response_body = response.data
+            record.save(update_fields=['status_code', 'response_body'])
+        return response
+
+    return wrapper
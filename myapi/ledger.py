@@ -0,0 +1,139 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Q, Value, When
+from django.utils import timezone
+
+from .summary import invalidate
+
+
+# Buyer balance buckets, each mirroring a balance column
+BUYER_BUCKETS = ('main_balance', 'cashup_main_balance', 'cashup_owing_main_balance', 'cashup_owing_dps')
+
+# Buyer-less accounts money comes from or goes to
+SYSTEM_BUCKETS = ('external', 'profit', 'sales', 'owing', 'opening')
+
+
+def get_accounts(keys):
+    """
+    Return {(buyer_id, bucket): LedgerAccount} for the given keys, creating
+    missing accounts at a zero balance. buyer_id is None for system accounts.
+    """
+    from .models import LedgerAccount
+
+    keys = set(keys)
+    if not keys:
+        return {}
+
+    lookup = Q()
+    for buyer_id, bucket in keys:
+        lookup |= Q(buyer_id=buyer_id, bucket=bucket) if buyer_id else Q(buyer__isnull=True, bucket=bucket)
+
+    accounts = {(a.buyer_id, a.bucket): a for a in LedgerAccount.objects.filter(lookup)}
+    missing = keys - set(accounts)
+    if missing:
+        LedgerAccount.objects.bulk_create(
+            [LedgerAccount(buyer_id=buyer_id, bucket=bucket) for buyer_id, bucket in missing],
+            ignore_conflicts=True,
+        )
+        accounts = {(a.buyer_id, a.bucket): a for a in LedgerAccount.objects.filter(lookup)}
+    return accounts
+
+
+def _entries(changes, contra):
+    # Net amount per (buyer_id, bucket), balanced against the contra account
+    entries = defaultdict(Decimal)
+    for buyer, bucket, amount in changes:
+        if bucket not in BUYER_BUCKETS:
+            raise ValueError(f"Unknown buyer bucket {bucket!r}.")
+        entries[(buyer.pk, bucket)] += Decimal(amount)
+
+    net = sum(entries.values(), Decimal('0'))
+    if net:
+        if contra not in SYSTEM_BUCKETS:
+            raise ValueError("Postings of a transfer must sum to zero or name a contra account.")
+        entries[(None, contra)] -= net
+
+    return {key: amount for key, amount in entries.items() if amount}
+
+
+def record(kind, changes, contra=None, memo=''):
+    """
+    Post a transfer to the ledger and update the balances of the buyer
+    accounts it touches, in the caller's transaction.
+
+    `changes` is a list of (buyer, bucket, amount) where a positive amount
+    credits the bucket. If the amounts do not sum to zero, the difference is
+    posted to the `contra` system account (money arriving from `external`,
+    leaving to `sales`, ...), so every transfer balances.
+
+    System account balances are not kept on the account row, since every
+    deposit would update the same row; sum their postings instead.
+    """
+    transfers = record_many(kind, [(changes, memo)], contra=contra)
+    return transfers[0] if transfers else None
+
+
+def record_many(kind, transfers, contra=None):
+    """
+    Post several transfers of one kind at once, e.g. a batch of verified
+    deposits. `transfers` is a list of (changes, memo) as for record(); the
+    transfers, postings and account balances are written with a handful of
+    bulk queries whatever the batch size. Returns the created transfers.
+    """
+    from .models import LedgerAccount, LedgerPosting, LedgerTransfer
+
+    batch = [(_entries(changes, contra), memo) for changes, memo in transfers]
+    batch = [(entries, memo) for entries, memo in batch if entries]
+    if not batch:
+        return []
+
+    with transaction.atomic():
+        accounts = get_accounts(key for entries, memo in batch for key in entries)
+        now = timezone.now()
+        created = LedgerTransfer.objects.bulk_create([
+            LedgerTransfer(kind=kind, memo=memo, created_at=now) for entries, memo in batch
+        ])
+
+        postings = []
+        deltas = defaultdict(Decimal)
+        for transfer, (entries, memo) in zip(created, batch):
+            for key, amount in entries.items():
+                postings.append(LedgerPosting(
+                    transfer=transfer, account=accounts[key], amount=amount, created_at=now,
+                ))
+                if key[0] is not None:
+                    deltas[accounts[key].pk] += amount
+        LedgerPosting.objects.bulk_create(postings, batch_size=1000)
+
+        # One UPDATE for all touched accounts, each moved by its own total
+        deltas = {pk: amount for pk, amount in deltas.items() if amount}
+        if deltas:
+            LedgerAccount.objects.filter(pk__in=deltas).update(
+                balance=F('balance') + Case(
+                    *[When(pk=pk, then=Value(amount)) for pk, amount in deltas.items()],
+                    output_field=DecimalField(max_digits=12, decimal_places=2),
+                ),
+                updated_at=now,
+            )
+        invalidate(*(buyer_id for entries, memo in batch for buyer_id, bucket in entries))
+    return created
+
+
+def balance(buyer, bucket):
+    """Materialized balance of a buyer bucket, 0 if it has no account yet."""
+    from .models import LedgerAccount
+
+    account = LedgerAccount.objects.filter(buyer=buyer, bucket=bucket).values_list('balance', flat=True).first()
+    return account if account is not None else Decimal('0.00')
+
+
+def statement(buyer, bucket=None):
+    """Postings to a buyer's accounts, newest first."""
+    from .models import LedgerPosting
+
+    postings = LedgerPosting.objects.filter(account__buyer=buyer)
+    if bucket:
+        postings = postings.filter(account__bucket=bucket)
+    return postings.select_related('transfer', 'account').order_by('-created_at', '-id')
@@ -0,0 +1,49 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from myapi.accrual import SHARD_SIZE, BOOKS, accrue_profit
+
+
+class Command(BaseCommand):
+    help = (
+        "Credit one day of daily and compounding profit to every cashup and cashup owing deposit, "
+        "catching up the accrual days of the last month the job missed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help="Accrual date as YYYY-MM-DD (defaults to today in the project time zone).",
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help="Number of worker processes crediting shards in parallel.",
+        )
+        parser.add_argument(
+            '--shard-size', type=int, default=SHARD_SIZE,
+            help="Width of the deposit id range committed and checkpointed as one unit.",
+        )
+        parser.add_argument(
+            '--book', choices=list(BOOKS), action='append', dest='books',
+            help="Only credit this deposit book (may be repeated, defaults to all books).",
+        )
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                accrual_date = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError("Invalid --date, expected YYYY-MM-DD.")
+        else:
+            accrual_date = timezone.localdate()
+
+        if options['workers'] < 1 or options['shard_size'] < 1:
+            raise CommandError("--workers and --shard-size must be at least 1.")
+
+        credited = accrue_profit(
+            accrual_date, workers=options['workers'], shard_size=options['shard_size'], books=options['books'],
+        )
+        for book, count in credited.items():
+            self.stdout.write(self.style.SUCCESS(f"Credited {count} days of {book} profit up to {accrual_date}."))
@@ -0,0 +1,62 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from myapi.accrual import BOOKS, backfill_profit
+from myapi.business_days import CALENDAR_START
+
+
+# Default reach of a backfill when --since is not given
+BACKFILL_DAYS = 31
+
+
+class Command(BaseCommand):
+    help = "Credit every accrual day deposits missed (after an outage or a deploy gap) in one pass."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help=f"First day to backfill as YYYY-MM-DD (defaults to {BACKFILL_DAYS} days before --until).",
+        )
+        parser.add_argument(
+            '--until',
+            help="Last day to backfill as YYYY-MM-DD (defaults to today in the project time zone).",
+        )
+        parser.add_argument(
+            '--book', choices=list(BOOKS), action='append', dest='books',
+            help="Only backfill this deposit book (may be repeated, defaults to all books).",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Report what would be credited without writing anything.",
+        )
+
+    def parse_date(self, value, option):
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"Invalid {option}, expected YYYY-MM-DD.")
+
+    def handle(self, *args, **options):
+        until = self.parse_date(options['until'], '--until') if options['until'] else timezone.localdate()
+        if options['since']:
+            since = self.parse_date(options['since'], '--since')
+        else:
+            since = until - timedelta(days=BACKFILL_DAYS)
+
+        if since > until:
+            raise CommandError("--since must not be after --until.")
+        if since < CALENDAR_START:
+            raise CommandError(f"--since must not be before the business calendar starts ({CALENDAR_START}).")
+        if until > timezone.localdate():
+            raise CommandError("Cannot credit profit for days that have not started yet.")
+
+        results = backfill_profit(since, until, dry_run=options['dry_run'], books=options['books'])
+
+        verb = "Would credit" if options['dry_run'] else "Credited"
+        for book, result in results.items():
+            self.stdout.write(self.style.SUCCESS(
+                f"{verb} {book} profit from {since} to {until} to {result['deposits']} deposits: "
+                f"{result['daily_profit']} daily, {result['compounding_profit']} compounding."
+            ))
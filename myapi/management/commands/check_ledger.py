@@ -0,0 +1,48 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+
+from myapi.models import Buyer, CashupDeposit, CashupOwingDeposit, LedgerAccount, LedgerPosting
+
+
+class Command(BaseCommand):
+    help = "Compare the materialized ledger balances with the balance columns and report differences."
+
+    def handle(self, *args, **options):
+        columns = {}
+        for buyer_id, main_balance in Buyer.objects.values_list('id', 'main_balance'):
+            columns[(buyer_id, 'main_balance')] = main_balance
+        for buyer_id, total in CashupDeposit.objects.filter(buyer__isnull=False).values('buyer').annotate(
+            total=Sum('cashup_main_balance'),
+        ).values_list('buyer', 'total'):
+            columns[(buyer_id, 'cashup_main_balance')] = total
+        for buyer_id, owing, dps in CashupOwingDeposit.objects.filter(buyer__isnull=False).values('buyer').annotate(
+            owing=Sum('cashup_owing_main_balance'), dps=Sum('cashup_owing_dps'),
+        ).values_list('buyer', 'owing', 'dps'):
+            columns[(buyer_id, 'cashup_owing_main_balance')] = owing
+            columns[(buyer_id, 'cashup_owing_dps')] = dps
+
+        accounts = {
+            (buyer_id, bucket): balance
+            for buyer_id, bucket, balance in LedgerAccount.objects.filter(
+                buyer__isnull=False,
+            ).values_list('buyer_id', 'bucket', 'balance')
+        }
+
+        mismatches = 0
+        for key in sorted(set(columns) | set(accounts)):
+            column = columns.get(key) or Decimal('0.00')
+            account = accounts.get(key) or Decimal('0.00')
+            if column != account:
+                mismatches += 1
+                self.stdout.write(f"Buyer {key[0]} {key[1]}: column {column}, ledger {account}")
+
+        total = LedgerPosting.objects.aggregate(total=Sum('amount'))['total'] or 0
+        if total:
+            self.stdout.write(self.style.ERROR(f"Postings do not sum to zero: {total}"))
+
+        if mismatches:
+            self.stdout.write(self.style.WARNING(f"{mismatches} balances differ from the ledger."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Ledger balances match the balance columns."))
@@ -0,0 +1,52 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapi.accrual import day_start
+from myapi.outbox import BATCH_SIZE, drain, replay
+
+
+class Command(BaseCommand):
+    help = "Write pending outbox events to the deposit history tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help="Number of events written per transaction.",
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help="Keep polling for new events instead of exiting once the outbox is empty.",
+        )
+        parser.add_argument(
+            '--interval', type=float, default=2.0,
+            help="Seconds to wait between polls with --loop.",
+        )
+        parser.add_argument(
+            '--replay-from',
+            help="Rebuild the history from this date (YYYY-MM-DD) on by replaying the outbox first.",
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        if options['replay_from']:
+            try:
+                since = date.fromisoformat(options['replay_from'])
+            except ValueError:
+                raise CommandError("Invalid --replay-from, expected YYYY-MM-DD.")
+            try:
+                count = replay(day_start(since))
+            except ValueError as error:
+                raise CommandError(str(error))
+            self.stdout.write(f"Replaying {count} events from {since}.")
+
+        while True:
+            processed = drain(options['batch_size'])
+            if processed:
+                self.stdout.write(self.style.SUCCESS(f"Wrote history for {processed} events."))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from myapi.outbox import purge
+
+
+class Command(BaseCommand):
+    help = "Delete outbox events drained longer ago than OUTBOX_RETENTION; their history can no longer be replayed."
+
+    def handle(self, *args, **options):
+        deleted = purge()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} drained outbox events past the retention period."))
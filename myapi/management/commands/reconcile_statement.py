@@ -0,0 +1,69 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapi.reconciliation import CHUNK_SIZE, MATCHED, OUTCOMES, REPORT_FIELDS, STATEMENT_COLUMNS, reconcile
+
+
+class Command(BaseCommand):
+    help = "Match a bKash/Nagad/Rocket statement CSV against pending buyer transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement', help="Path of the provider's statement CSV export.")
+        parser.add_argument(
+            '--provider', choices=list(STATEMENT_COLUMNS), required=True,
+            help="Payment method the statement comes from.",
+        )
+        parser.add_argument(
+            '--report',
+            help="Write the per-row match report to this CSV file ('-' for stdout).",
+        )
+        parser.add_argument(
+            '--verify', action='store_true',
+            help="Verify the matched transactions in bulk.",
+        )
+        parser.add_argument('--id-column', help="Header of the transaction id column, if not the provider default.")
+        parser.add_argument('--amount-column', help="Header of the amount column, if not the provider default.")
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help=f"Statement rows matched per query (default {CHUNK_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+
+        report_file = None
+        writer = None
+        if options['report'] == '-':
+            writer = csv.DictWriter(sys.stdout, fieldnames=REPORT_FIELDS)
+        elif options['report']:
+            report_file = open(options['report'], 'w', newline='', encoding='utf-8')
+            writer = csv.DictWriter(report_file, fieldnames=REPORT_FIELDS)
+        if writer:
+            writer.writeheader()
+
+        try:
+            # utf-8-sig drops the byte order mark some exports start with
+            with open(options['statement'], newline='', encoding='utf-8-sig') as statement:
+                totals = reconcile(
+                    statement, options['provider'],
+                    verify=options['verify'],
+                    report=writer.writerow if writer else None,
+                    chunk_size=options['chunk_size'],
+                    id_column=options['id_column'],
+                    amount_column=options['amount_column'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        finally:
+            if report_file:
+                report_file.close()
+
+        summary = ", ".join(f"{totals[outcome]} {outcome}" for outcome in OUTCOMES)
+        self.stderr.write(self.style.SUCCESS(f"Reconciled {sum(totals[o] for o in OUTCOMES)} rows: {summary}."))
+        if options['verify']:
+            self.stderr.write(self.style.SUCCESS(f"Verified {totals['verified']} transactions."))
+        elif totals[MATCHED]:
+            self.stderr.write(f"Run again with --verify to verify the {totals[MATCHED]} matched transactions.")
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.3 on 2026-10-18 16:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0046_cashupdeposit_last_updated_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfitAccrual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('accrual_date', models.DateField()),
+                ('kind', models.CharField(choices=[('daily_profit', 'Daily Profit'), ('compounding_profit', 'Compounding Profit')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('cashup_deposit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='profit_accruals', to='myapi.cashupdeposit')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cashup_deposit', 'accrual_date', 'kind'), name='unique_profit_accrual')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.3 on 2026-10-18 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0047_profitaccrual'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccrualCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book', models.CharField(choices=[('cashup', 'Cashup Deposit')], max_length=20)),
+                ('accrual_date', models.DateField()),
+                ('first_id', models.BigIntegerField()),
+                ('last_id', models.BigIntegerField()),
+                ('credited', models.PositiveIntegerField(default=0)),
+                ('completed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('book', 'accrual_date', 'first_id'), name='unique_accrual_checkpoint')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.3 on 2026-10-18 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0048_accrualcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublicHoliday',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('name', models.CharField(max_length=100)),
+            ],
+        ),
+    ]
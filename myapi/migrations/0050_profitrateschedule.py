@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-18 16:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0049_publicholiday'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfitRateSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('daily_profit', 'Daily Profit'), ('compounding_profit', 'Compounding Profit'), ('affiliate_profit', 'Affiliate Profit')], max_length=20)),
+                ('rate', models.DecimalField(decimal_places=5, help_text='Fraction, e.g. 0.00200 for 0.2%', max_digits=7)),
+                ('effective_from', models.DateField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'effective_from'), name='unique_profit_rate')],
+            },
+        ),
+    ]
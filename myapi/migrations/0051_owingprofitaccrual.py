@@ -0,0 +1,42 @@
+# Generated by Django 5.1.3 on 2026-10-18 16:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0050_profitrateschedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cashupowingdeposit',
+            name='last_updated',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='accrualcheckpoint',
+            name='book',
+            field=models.CharField(choices=[('cashup', 'Cashup Deposit'), ('cashup_owing', 'Cashup Owing Deposit')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='profitrateschedule',
+            name='kind',
+            field=models.CharField(choices=[('daily_profit', 'Daily Profit'), ('compounding_profit', 'Compounding Profit'), ('affiliate_profit', 'Affiliate Profit'), ('owing_daily_profit', 'Owing Daily Profit'), ('owing_compounding_profit', 'Owing Compounding Profit')], max_length=30),
+        ),
+        migrations.CreateModel(
+            name='OwingProfitAccrual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('accrual_date', models.DateField()),
+                ('kind', models.CharField(choices=[('daily_profit', 'Daily Profit'), ('compounding_profit', 'Compounding Profit')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('cashup_owing_deposit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='profit_accruals', to='myapi.cashupowingdeposit')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cashup_owing_deposit', 'accrual_date', 'kind'), name='unique_owing_profit_accrual')],
+            },
+        ),
+    ]
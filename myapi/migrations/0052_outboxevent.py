@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-18 16:47
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0051_owingprofitaccrual'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cashupdeposithistory',
+            name='changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(choices=[('cashup_deposit', 'Cashup Deposit'), ('cashup_owing_deposit', 'Cashup Owing Deposit')], max_length=30)),
+                ('object_id', models.BigIntegerField()),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['processed_at', 'id'], name='outbox_pending_idx')],
+            },
+        ),
+    ]
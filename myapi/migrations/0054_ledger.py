@@ -0,0 +1,57 @@
+# Generated by Django 5.1.3 on 2026-10-18 16:51
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0053_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerTransfer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('opening', 'Opening Balance'), ('deposit', 'Deposit'), ('transfer', 'Transfer'), ('purchase', 'Purchase'), ('withdrawal', 'Withdrawal'), ('verification', 'Transaction Verification'), ('owing_approval', 'Owing Approval')], max_length=20)),
+                ('memo', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LedgerAccount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.CharField(choices=[('main_balance', 'Main Balance'), ('cashup_main_balance', 'Cashup Main Balance'), ('cashup_owing_main_balance', 'Cashup Owing Main Balance'), ('cashup_owing_dps', 'Cashup Owing DPS'), ('external', 'External (bKash, Nagad, Rocket)'), ('profit', 'Profit Payouts'), ('sales', 'Sales'), ('owing', 'Owing Credit'), ('opening', 'Opening Balances')], max_length=30)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('buyer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_accounts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LedgerPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='postings', to='myapi.ledgeraccount')),
+                ('transfer', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='postings', to='myapi.ledgertransfer')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ledgeraccount',
+            constraint=models.UniqueConstraint(fields=('buyer', 'bucket'), name='unique_ledger_account'),
+        ),
+        migrations.AddConstraint(
+            model_name='ledgeraccount',
+            constraint=models.UniqueConstraint(condition=models.Q(('buyer__isnull', True)), fields=('bucket',), name='unique_system_ledger_account'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerposting',
+            index=models.Index(fields=['account', '-created_at'], name='ledger_posting_account_idx'),
+        ),
+    ]
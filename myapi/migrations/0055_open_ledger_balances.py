@@ -0,0 +1,67 @@
+# Generated by Django 5.1.3 on 2026-10-18 16:51
+
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Sum
+
+
+def open_ledger_balances(apps, schema_editor):
+    # Post every buyer's current balances as one opening transfer, so the
+    # materialized ledger balances start equal to the balance columns
+    Buyer = apps.get_model('myapi', 'Buyer')
+    CashupDeposit = apps.get_model('myapi', 'CashupDeposit')
+    CashupOwingDeposit = apps.get_model('myapi', 'CashupOwingDeposit')
+    LedgerAccount = apps.get_model('myapi', 'LedgerAccount')
+    LedgerPosting = apps.get_model('myapi', 'LedgerPosting')
+    LedgerTransfer = apps.get_model('myapi', 'LedgerTransfer')
+
+    balances = {}
+    for buyer_id, main_balance in Buyer.objects.exclude(main_balance=0).values_list('id', 'main_balance'):
+        balances[(buyer_id, 'main_balance')] = main_balance
+    for buyer_id, total in CashupDeposit.objects.filter(buyer__isnull=False).values('buyer').annotate(
+        total=Sum('cashup_main_balance'),
+    ).values_list('buyer', 'total'):
+        balances[(buyer_id, 'cashup_main_balance')] = total
+    for buyer_id, owing, dps in CashupOwingDeposit.objects.filter(buyer__isnull=False).values('buyer').annotate(
+        owing=Sum('cashup_owing_main_balance'), dps=Sum('cashup_owing_dps'),
+    ).values_list('buyer', 'owing', 'dps'):
+        balances[(buyer_id, 'cashup_owing_main_balance')] = owing
+        balances[(buyer_id, 'cashup_owing_dps')] = dps
+    balances = {key: amount for key, amount in balances.items() if amount}
+    if not balances:
+        return
+
+    transfer = LedgerTransfer.objects.create(kind='opening', memo='Opening balances')
+    opening = LedgerAccount.objects.create(buyer=None, bucket='opening')
+    LedgerAccount.objects.bulk_create(
+        [LedgerAccount(buyer_id=buyer_id, bucket=bucket, balance=amount) for (buyer_id, bucket), amount in balances.items()],
+        batch_size=1000,
+    )
+    accounts = {(a.buyer_id, a.bucket): a.id for a in LedgerAccount.objects.filter(buyer__isnull=False)}
+
+    postings = [
+        LedgerPosting(transfer=transfer, account_id=accounts[key], amount=amount, created_at=transfer.created_at)
+        for key, amount in balances.items()
+    ]
+    postings.append(LedgerPosting(
+        transfer=transfer, account=opening, amount=-sum(balances.values(), Decimal('0')), created_at=transfer.created_at,
+    ))
+    LedgerPosting.objects.bulk_create(postings, batch_size=1000)
+
+
+def remove_ledger(apps, schema_editor):
+    apps.get_model('myapi', 'LedgerPosting').objects.all().delete()
+    apps.get_model('myapi', 'LedgerTransfer').objects.all().delete()
+    apps.get_model('myapi', 'LedgerAccount').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0054_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(open_ledger_balances, remove_ledger),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-18 16:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0055_open_ledger_balances'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cashupdeposit',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cashupowingdeposit',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
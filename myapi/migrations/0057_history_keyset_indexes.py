@@ -0,0 +1,49 @@
+# Generated by Django 5.1.3 on 2026-10-18 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0056_deposit_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='buyertransaction',
+            index=models.Index(fields=['buyer', '-date', '-id'], name='buyer_txn_buyer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transferhistory',
+            index=models.Index(fields=['buyer', '-date', '-id'], name='owing_transfer_buyer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transferhistoryofcashup',
+            index=models.Index(fields=['buyer', '-date', '-id'], name='cashup_transfer_buyer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transferhistoryofcashupowingdps',
+            index=models.Index(fields=['buyer', '-date', '-id'], name='owing_dps_transfer_buyer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawalfromaffiliateprofit',
+            index=models.Index(fields=['buyer', '-date', '-id'], name='wd_affiliate_buyer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawalfromcashupbalance',
+            index=models.Index(fields=['buyer', '-date', '-id'], name='wd_cashup_buyer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawalfromcompoundingprofit',
+            index=models.Index(fields=['buyer', '-date', '-id'], name='wd_compounding_buyer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawalfromdailyprofit',
+            index=models.Index(fields=['buyer', '-date', '-id'], name='wd_daily_buyer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawalfrommainbalance',
+            index=models.Index(fields=['buyer', '-date', '-id'], name='wd_main_buyer_idx'),
+        ),
+    ]
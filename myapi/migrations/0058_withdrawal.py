@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:01
+
+import django.db.models.deletion
+import django.utils.timezone
+import myapi.tracking
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0057_history_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Withdrawal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('main_balance', 'Main Balance'), ('cashup_balance', 'Cashup Balance'), ('daily_profit', 'Daily Profit'), ('compounding_profit', 'Compounding Profit'), ('affiliate_profit', 'Affiliate Profit')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Approved', 'Approved'), ('Rejected', 'Rejected')], default='Pending', max_length=20)),
+                ('method', models.CharField(blank=True, choices=[('Bkash', 'BKash'), ('Nagad', 'Nagad'), ('Rocket', 'Rocket')], max_length=10, null=True)),
+                ('withdraw_number', models.CharField(blank=True, max_length=20, null=True)),
+                ('date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('legacy_id', models.PositiveIntegerField(blank=True, editable=False, null=True)),
+                ('buyer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='withdrawals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['buyer', '-date', '-id'], name='withdrawal_buyer_date_idx'), models.Index(fields=['status', 'date'], name='withdrawal_status_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('source', 'legacy_id'), name='unique_withdrawal_legacy_id')],
+            },
+            bases=(myapi.tracking.TrackedFieldsMixin, models.Model),
+        ),
+    ]
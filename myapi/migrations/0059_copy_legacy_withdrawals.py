@@ -0,0 +1,53 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:01
+
+from django.db import migrations
+
+
+# Legacy withdrawal tables and the Withdrawal source each maps to
+LEGACY_MODELS = (
+    ('WithdrawalFromMainBalance', 'main_balance'),
+    ('WithdrawalFromCashupBalance', 'cashup_balance'),
+    ('WithdrawalFromDailyProfit', 'daily_profit'),
+    ('WithdrawalFromCompoundingProfit', 'compounding_profit'),
+    ('WithdrawalFromAffiliateProfit', 'affiliate_profit'),
+)
+
+
+def copy_legacy_withdrawals(apps, schema_editor):
+    # Copy every legacy row, keeping its status and date; bulk_create does
+    # not send post_save, so approved rows are not paid out a second time
+    Withdrawal = apps.get_model('myapi', 'Withdrawal')
+    for model_name, source in LEGACY_MODELS:
+        model = apps.get_model('myapi', model_name)
+        fields = {field.name for field in model._meta.get_fields()}
+        batch = []
+        for row in model.objects.order_by('id').iterator(chunk_size=2000):
+            batch.append(Withdrawal(
+                buyer_id=row.buyer_id,
+                source=source,
+                amount=row.amount,
+                status=row.status,
+                method=row.method if 'method' in fields else None,
+                withdraw_number=row.withdraw_number if 'withdraw_number' in fields else None,
+                date=row.date,
+                legacy_id=row.id,
+            ))
+            if len(batch) >= 2000:
+                Withdrawal.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        Withdrawal.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def remove_copied_withdrawals(apps, schema_editor):
+    apps.get_model('myapi', 'Withdrawal').objects.filter(legacy_id__isnull=False).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0058_withdrawal'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_legacy_withdrawals, remove_copied_withdrawals),
+    ]
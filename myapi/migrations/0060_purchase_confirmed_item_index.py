@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0059_copy_legacy_withdrawals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(condition=models.Q(('confirmed', True)), fields=['item', 'id'], name='purchase_confirmed_item_idx'),
+        ),
+    ]
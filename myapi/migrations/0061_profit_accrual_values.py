@@ -0,0 +1,43 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0060_purchase_confirmed_item_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='owingprofitaccrual',
+            name='credited_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='owingprofitaccrual',
+            name='new_value',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='owingprofitaccrual',
+            name='previous_value',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='profitaccrual',
+            name='credited_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profitaccrual',
+            name='new_value',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='profitaccrual',
+            name='previous_value',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
@@ -0,0 +1,152 @@
+# Generated by Django 5.1.3 on 2026-10-18 18:12
+
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import migrations
+from django.utils import timezone
+
+
+# Rate the profit was credited at by CashupDeposit.save() before the ledger
+# existed, and the weekdays (UTC) it skipped
+LEGACY_RATE = Decimal('0.002')
+LEGACY_OFF_DAYS = (4, 5)
+
+# Rounding slack when matching a logged increase against the legacy rate
+TOLERANCE = Decimal('0.01')
+
+# The profit and balance changes of one save() were logged within this window
+SAME_SAVE = timedelta(seconds=5)
+
+DEPOSITS_PER_BATCH = 500
+
+
+def balance_at(changes, moment, current):
+    """
+    Balances the deposit may have had when saved at `moment`: the balance
+    just before it and just after any change logged by the same save.
+    `changes` are (changed_at, old_balance, new_balance) in time order.
+    """
+    before = after = None
+    for changed_at, old_balance, new_balance in changes:
+        if changed_at <= moment - SAME_SAVE:
+            before = new_balance
+        elif after is None and changed_at > moment + SAME_SAVE:
+            after = old_balance
+    candidates = {balance for balance in (before, after) if balance is not None}
+    for changed_at, old_balance, new_balance in changes:
+        if abs(changed_at - moment) <= SAME_SAVE:
+            candidates |= {old_balance, new_balance}
+    return candidates or {current}
+
+
+def matches(increase, base):
+    return abs(increase - base * LEGACY_RATE) < TOLERANCE
+
+
+def legacy_accruals(rows, changes, current_balance, last_day):
+    """
+    The logged increases of one deposit that were legacy accruals, as
+    {(day, kind): (amount, previous_value, new_value, credited_at)}: a
+    daily_profit increase at the legacy rate on the balance of the time, on
+    a credited weekday no later than the deposit's last accrual day, and
+    the compounding_profit increase made by the same save. `rows` are
+    (field_name, previous_value, new_value, change_timestamp) in time order.
+    """
+    accruals = {}
+    daily = []
+    for field_name, previous_value, new_value, change_timestamp in rows:
+        if field_name != 'daily_profit':
+            continue
+        day = timezone.localtime(change_timestamp).date()
+        increase = new_value - previous_value
+        if (
+            increase > 0 and day <= last_day and (day, 'daily_profit') not in accruals
+            and change_timestamp.astimezone(dt_timezone.utc).weekday() not in LEGACY_OFF_DAYS
+            and any(matches(increase, balance) for balance in balance_at(changes, change_timestamp, current_balance))
+        ):
+            accruals[(day, 'daily_profit')] = (increase, previous_value, new_value, change_timestamp)
+            daily.append((change_timestamp, new_value))
+
+    for field_name, previous_value, new_value, change_timestamp in rows:
+        if field_name != 'compounding_profit':
+            continue
+        day = timezone.localtime(change_timestamp).date()
+        increase = new_value - previous_value
+        if increase <= 0 or (day, 'compounding_profit') in accruals:
+            continue
+        for credited_at, daily_profit in daily:
+            if abs(credited_at - change_timestamp) > SAME_SAVE:
+                continue
+            balances = balance_at(changes, change_timestamp, current_balance)
+            if any(matches(increase, balance + daily_profit) for balance in balances):
+                accruals[(day, 'compounding_profit')] = (increase, previous_value, new_value, change_timestamp)
+                break
+    return accruals
+
+
+def copy_profit_history(apps, schema_editor):
+    # Profit credited before the accrual ledger existed was only logged as
+    # field changes, mixed with admin edits of the same fields. Only the
+    # increases the old save() made are copied, and only up to each
+    # deposit's last_updated, so the ledger never holds a day the accrual
+    # job has still to credit. Owing deposits earned no profit before the
+    # ledger, so nothing is copied for them.
+    CashupDeposit = apps.get_model('myapi', 'CashupDeposit')
+    CashupProfitHistory = apps.get_model('myapi', 'CashupProfitHistory')
+    CashupDepositHistory = apps.get_model('myapi', 'CashupDepositHistory')
+    ProfitAccrual = apps.get_model('myapi', 'ProfitAccrual')
+
+    deposits = (
+        CashupDeposit.objects.filter(last_updated__isnull=False)
+        .order_by('id')
+        .values_list('id', 'cashup_main_balance', 'last_updated')
+    )
+    after_id = 0
+    while True:
+        batch = list(deposits.filter(id__gt=after_id)[:DEPOSITS_PER_BATCH])
+        if not batch:
+            break
+        after_id = batch[-1][0]
+        ids = [deposit_id for deposit_id, balance, last_updated in batch]
+
+        history = {}
+        for deposit_id, *row in CashupProfitHistory.objects.filter(
+            cashup_deposit_id__in=ids, field_name__in=('daily_profit', 'compounding_profit'),
+        ).order_by('change_timestamp', 'id').values_list(
+            'cashup_deposit_id', 'field_name', 'previous_value', 'new_value', 'change_timestamp',
+        ):
+            history.setdefault(deposit_id, []).append(row)
+        changes = {}
+        for deposit_id, *row in CashupDepositHistory.objects.filter(
+            cashup_deposit_id__in=ids,
+        ).order_by('changed_at', 'id').values_list('cashup_deposit_id', 'changed_at', 'old_balance', 'new_balance'):
+            changes.setdefault(deposit_id, []).append(row)
+
+        rows = []
+        for deposit_id, balance, last_updated in batch:
+            if deposit_id not in history:
+                continue
+            accruals = legacy_accruals(
+                history[deposit_id], changes.get(deposit_id, []), balance, timezone.localtime(last_updated).date(),
+            )
+            rows += [
+                ProfitAccrual(
+                    cashup_deposit_id=deposit_id, accrual_date=day, kind=kind, amount=amount,
+                    previous_value=previous_value, new_value=new_value, credited_at=credited_at,
+                )
+                for (day, kind), (amount, previous_value, new_value, credited_at) in accruals.items()
+            ]
+        ProfitAccrual.objects.bulk_create(rows, batch_size=2000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0061_profit_accrual_values'),
+    ]
+
+    operations = [
+        # The copied rows cannot be told apart from booked ones, so they stay
+        migrations.RunPython(copy_profit_history, migrations.RunPython.noop),
+    ]
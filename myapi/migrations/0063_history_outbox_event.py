@@ -0,0 +1,92 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:37
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+EVENTS_PER_BATCH = 500
+
+
+def link_drained_history(apps, schema_editor):
+    # Point the history rows already drained from the outbox at their events,
+    # so replay() can tell them from the rows written before the outbox. A
+    # row matches an event change on its deposit, field, values and time.
+    OutboxEvent = apps.get_model('myapi', 'OutboxEvent')
+    models_by_kind = {
+        'balance': (apps.get_model('myapi', 'CashupDepositHistory'), 'cashup_deposit_id', 'changed_at'),
+        'profit': (apps.get_model('myapi', 'CashupProfitHistory'), 'cashup_deposit_id', 'change_timestamp'),
+        'owing_profit': (
+            apps.get_model('myapi', 'CashupOwingProfitHistory'), 'cashup_owing_deposit_id', 'change_timestamp',
+        ),
+    }
+
+    def kind_of(topic, field):
+        if topic == 'cashup_owing_deposit':
+            return 'owing_profit'
+        return 'balance' if field == 'cashup_main_balance' else 'profit'
+
+    events = OutboxEvent.objects.filter(processed_at__isnull=False).order_by('id')
+    after_id = 0
+    while True:
+        batch = list(events.filter(id__gt=after_id)[:EVENTS_PER_BATCH])
+        if not batch:
+            break
+        after_id = batch[-1].id
+
+        for kind, (model, deposit_field, time_field) in models_by_kind.items():
+            object_ids = {
+                event.object_id for event in batch
+                if any(kind_of(event.topic, field) == kind for field in event.payload['changes'])
+            }
+            if not object_ids:
+                continue
+            unlinked = {}
+            if kind == 'balance':
+                columns = ('id', deposit_field, time_field, 'old_balance', 'new_balance')
+                rows = model.objects.filter(**{f'{deposit_field}__in': object_ids, 'outbox_event_id__isnull': True})
+                for row_id, deposit_id, moment, previous, new in rows.values_list(*columns):
+                    unlinked.setdefault((deposit_id, 'cashup_main_balance', previous, new, moment), []).append(row_id)
+            else:
+                columns = ('id', deposit_field, time_field, 'field_name', 'previous_value', 'new_value')
+                rows = model.objects.filter(**{f'{deposit_field}__in': object_ids, 'outbox_event_id__isnull': True})
+                for row_id, deposit_id, moment, field, previous, new in rows.values_list(*columns):
+                    unlinked.setdefault((deposit_id, field, previous, new, moment), []).append(row_id)
+
+            linked = []
+            for event in batch:
+                # Profit history timestamps are kept to the minute
+                moment = event.created_at if kind == 'balance' else event.created_at.replace(second=0, microsecond=0)
+                for field, (previous, new) in event.payload['changes'].items():
+                    if kind_of(event.topic, field) != kind:
+                        continue
+                    ids = unlinked.get((event.object_id, field, Decimal(previous), Decimal(new), moment))
+                    if ids:
+                        linked.append(model(id=ids.pop(0), outbox_event_id=event.id))
+            model.objects.bulk_update(linked, ['outbox_event_id'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0062_copy_profit_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cashupdeposithistory',
+            name='outbox_event_id',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='cashupowingprofithistory',
+            name='outbox_event_id',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='cashupprofithistory',
+            name='outbox_event_id',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(link_drained_history, migrations.RunPython.noop),
+    ]
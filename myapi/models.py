@@ -70,7 +70,12 @@ class WithdrawalFromCompoundingProfit(models.Model):
     buyer = models.ForeignKey('Buyer', on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=[("Pending", "Pending"), ("Approved", "Approved"), ("Rejected", "Rejected")], default="Pending")
-    date=models.DateTimeField(default=timezone.now)    
+    date=models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Newest-first history pages of one buyer (KeysetPagination)
+        indexes = [models.Index(fields=['buyer', '-date', '-id'], name='wd_compounding_buyer_idx')]
+
     def __str__(self):
         return f"Withdrawal request by {self.buyer.name} for {self.amount} - {self.status}"
     
@@ -86,7 +91,12 @@ class WithdrawalFromMainBalance(models.Model):
     ]
     method = models.CharField(max_length=10, choices=METHOD_CHOICES, default='Bkash')
     withdraw_number=models.CharField(max_length=20)
-    date=models.DateTimeField(default=timezone.now) 
+    date=models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Newest-first history pages of one buyer (KeysetPagination)
+        indexes = [models.Index(fields=['buyer', '-date', '-id'], name='wd_main_buyer_idx')]
+
     def __str__(self):
         return f"Withdrawal request by {self.buyer.name} for {self.amount} - {self.status}"
 
@@ -96,7 +106,11 @@ class WithdrawalFromCashupBalance(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=[("Pending", "Pending"), ("Approved", "Approved"), ("Rejected", "Rejected")], default="Pending")
     date=models.DateTimeField(default=timezone.now)
-    
+
+    class Meta:
+        # Newest-first history pages of one buyer (KeysetPagination)
+        indexes = [models.Index(fields=['buyer', '-date', '-id'], name='wd_cashup_buyer_idx')]
+
     def __str__(self):
         return f"Withdrawal request by {self.buyer.name} for {self.amount} - {self.status}"
 
@@ -105,7 +119,12 @@ class WithdrawalFromDailyProfit(models.Model):
     buyer = models.ForeignKey('Buyer', on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=[("Pending", "Pending"), ("Approved", "Approved"), ("Rejected", "Rejected")], default="Pending")
-    date=models.DateTimeField(default=timezone.now)    
+    date=models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Newest-first history pages of one buyer (KeysetPagination)
+        indexes = [models.Index(fields=['buyer', '-date', '-id'], name='wd_daily_buyer_idx')]
+
     def __str__(self):
         return f"Withdrawal request by {self.buyer.name} for {self.amount} - {self.status}"
 
@@ -115,11 +134,62 @@ class WithdrawalFromAffiliateProfit(models.Model):
     buyer = models.ForeignKey('Buyer', on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=[("Pending", "Pending"), ("Approved", "Approved"), ("Rejected", "Rejected")], default="Pending")
-    date=models.DateTimeField(default=timezone.now)    
+    date=models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Newest-first history pages of one buyer (KeysetPagination)
+        indexes = [models.Index(fields=['buyer', '-date', '-id'], name='wd_affiliate_buyer_idx')]
+
     def __str__(self):
         return f"Withdrawal request by {self.buyer.name} for {self.amount} - {self.status}"
 
 
+# The five WithdrawalFrom* tables above are kept for their history only;
+# migration 0059 copied them into Withdrawal, which all new requests use.
+from .tracking import TrackedFieldsMixin
+
+class Withdrawal(TrackedFieldsMixin, models.Model):
+    SOURCE_CHOICES = [
+        ('main_balance', 'Main Balance'),
+        ('cashup_balance', 'Cashup Balance'),
+        ('daily_profit', 'Daily Profit'),
+        ('compounding_profit', 'Compounding Profit'),
+        ('affiliate_profit', 'Affiliate Profit'),
+    ]
+    STATUS_CHOICES = [("Pending", "Pending"), ("Approved", "Approved"), ("Rejected", "Rejected")]
+    METHOD_CHOICES = [
+        ('Bkash', 'BKash'),
+        ('Nagad', 'Nagad'),
+        ('Rocket','Rocket')
+    ]
+
+    buyer = models.ForeignKey('Buyer', on_delete=models.CASCADE, related_name='withdrawals')
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)  # Balance the money is withdrawn from
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="Pending")
+    method = models.CharField(max_length=10, choices=METHOD_CHOICES, null=True, blank=True)  # Main balance payouts only
+    withdraw_number = models.CharField(max_length=20, null=True, blank=True)  # Main balance payouts only
+    date = models.DateTimeField(default=timezone.now)
+    legacy_id = models.PositiveIntegerField(null=True, blank=True, editable=False)  # Row id in the WithdrawalFrom* table it came from
+
+    # The approval receiver acts when the status changes to Approved
+    tracked_fields = ('status',)
+
+    class Meta:
+        indexes = [
+            # A buyer's withdrawals, newest first (KeysetPagination)
+            models.Index(fields=['buyer', '-date', '-id'], name='withdrawal_buyer_date_idx'),
+            # Pending queue and status reports
+            models.Index(fields=['status', 'date'], name='withdrawal_status_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'legacy_id'], name='unique_withdrawal_legacy_id'),
+        ]
+
+    def __str__(self):
+        return f"Withdrawal request by {self.buyer.name} for {self.amount} from {self.get_source_display()} - {self.status}"
+
+
 
 # Category Model
 class Category(models.Model):
@@ -177,6 +247,11 @@ class Purchase(models.Model):
     total_membership_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.0, null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now,null=True) 
 
+    class Meta:
+        indexes = [
+            # Confirmed buyers report, read in (item, id) order (ItemKeysetPagination)
+            models.Index(fields=['item', 'id'], condition=models.Q(confirmed=True), name='purchase_confirmed_item_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if self.item:
@@ -198,11 +273,11 @@ class Purchase(models.Model):
             self.discount_total_price = self.total_price
 
         if self.confirmed and self.paid:
-            if self.buyer.main_balance < self.discount_total_price:
+            try:
+                debit(self.buyer, self.discount_total_price)
+            except InsufficientBalance:
                 raise ValueError("Insufficient balance to complete the purchase.")
-            else:
-                self.buyer.main_balance -= self.discount_total_price
-                self.buyer.save()
+            ledger.record('purchase', [(self.buyer, 'main_balance', -self.discount_total_price)], contra='sales')
 
         super().save(*args, **kwargs)
 
@@ -217,9 +292,11 @@ from django.db import models
 from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
+from .tracking import TrackedFieldsMixin
+from .versioning import VersionedMixin, retry_on_conflict
 
 
-class CashupOwingDeposit(models.Model):
+class CashupOwingDeposit(VersionedMixin, TrackedFieldsMixin, models.Model):
     requested_cashup_owing_main_balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     cashup_owing_main_balance = models.DecimalField(max_digits=10, decimal_places=2)
     cashup_owing_dps=models.DecimalField(max_digits=10,decimal_places=2,default=0)
@@ -235,6 +312,14 @@ class CashupOwingDeposit(models.Model):
     monthly_compounding_profit = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     updated_by = models.ForeignKey(Buyer, on_delete=models.SET_NULL, null=True, blank=True)
     verified = models.BooleanField(default=False)
+    last_updated = models.DateTimeField(null=True, blank=True)  # Start of the last day profit was credited
+    version = models.PositiveIntegerField(default=0, editable=False)  # Bumped on every write, see VersionedMixin
+
+    # Fields diffed by the profit history receivers
+    tracked_fields = (
+        'daily_profit', 'compounding_profit', 'monthly_profit', 'product_profit',
+        'daily_compounding_profit', 'monthly_compounding_profit',
+    )
 
     def save(self, *args, **kwargs):
         # Ensure updated_by is the same as the buyer field
@@ -246,7 +331,13 @@ class CashupOwingDeposit(models.Model):
 
     def __str__(self):
         return f"Owing Deposit: {self.cashup_owing_main_balance} by {self.buyer.name if self.buyer else 'Unknown Buyer'}"
-class CashupDeposit(models.Model):
+from .rates import rate_on
+from .balances import InsufficientBalance, credit, debit
+from . import ledger
+from .verification import split_payment
+
+
+class CashupDeposit(VersionedMixin, TrackedFieldsMixin, models.Model):
     cashup_main_balance = models.DecimalField(max_digits=10, decimal_places=2,default=0.00)
     affiliate_profit = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     buyer = models.ForeignKey(Buyer, on_delete=models.SET_NULL, null=True, related_name='cashup_deposits')
@@ -262,16 +353,19 @@ class CashupDeposit(models.Model):
     updated_by = models.ForeignKey(Buyer, on_delete=models.SET_NULL, null=True, blank=True)
     last_updated = models.DateTimeField(null=True, blank=True)  # To track the last time the profit was updated
     monthly_reset_date = models.DateTimeField(null=True, blank=True)  # Tracks
-    
+    version = models.PositiveIntegerField(default=0, editable=False)  # Bumped on every write, see VersionedMixin
+
+    # Fields diffed by the profit and balance history receivers
+    tracked_fields = (
+        'cashup_main_balance', 'daily_profit', 'compounding_profit', 'affiliate_profit', 'monthly_profit',
+        'product_profit', 'daily_compounding_profit', 'monthly_compounding_profit',
+    )
 
     def __str__(self):
         return f"Deposit: {self.cashup_main_balance} by {self.buyer.name if self.buyer else 'Unknown Buyer'}"
 
     def save(self, *args, **kwargs):
 
-        now = timezone.now()
-
-
         if self.buyer and not self.updated_by:
             self.updated_by = self.buyer  # Set updated_by to buyer if not provided
 
@@ -280,11 +374,12 @@ class CashupDeposit(models.Model):
 
             if self.buyer:
                 self.buyer.membership_status = True
-                self.buyer.save()  # Save the buyer's membership status change
+                # Only write the status; main_balance is updated by the balance service
+                self.buyer.save(update_fields=['membership_status'])  # Save the buyer's membership status change
         else:
             if self.buyer:
                 self.buyer.membership_status = False
-                self.buyer.save()
+                self.buyer.save(update_fields=['membership_status'])
 
         # Add affiliate profit to the referrer for the deposit by Buyer A
         if self.buyer:
@@ -295,7 +390,7 @@ class CashupDeposit(models.Model):
                 if referral_code.is_valid and referral_code.is_used and not referral_code.affiliate_profit_awarded:
                     referrer = referral_code.creator  # Buyer B is the referrer
                     if referrer:
-                        affiliate_profit = self.cashup_main_balance * Decimal(0.05)  # 5% of Buyer A's deposit
+                        affiliate_profit = self.cashup_main_balance * rate_on('affiliate_profit')  # 5% of Buyer A's deposit by default
                         existing_deposit = CashupDeposit.objects.filter(buyer=referrer).first()
                         
                         # Create a CashupDeposit for the referrer (Buyer B) with the affiliate profit
@@ -314,17 +409,8 @@ class CashupDeposit(models.Model):
                     referral_code.is_used = True
                     referral_code.affiliate_profit_awarded = True
                     referral_code.save()  # Save the referral code update
-        # Add daily profit (0.2% of cashup_main_balance) but skip Friday and Sunday
-        
-        if self.last_updated is None or now - self.last_updated >= timedelta(hours=24):
-            if now.weekday() not in [4, 5]:  # 4 is Friday, 6 is Sunday
-                # Update daily profit with 0.2% of the cashup balance
-                self.daily_profit += self.cashup_main_balance * Decimal(0.002)  # 0.2% of cashup balance
-                self.last_updated = now
-                total_balance = self.cashup_main_balance + self.daily_profit
-                if now - self.created_at >= timedelta(days=30):
-                    self.compounding_profit += total_balance * Decimal(0.002) 
-
+        # Daily and compounding profit are credited by the scheduled accrual job
+        # (see myapi/accrual.py and `manage.py accrue_profit`), not on save.
 
         # Handle monthly reset and compound profit after one month
         
@@ -354,10 +440,6 @@ class CashupDeposit(models.Model):
         # Save the changes
         super().save(*args, **kwargs)
 
-    # Save the changes
-
-        super().save(*args, **kwargs)
-
 
 
 
@@ -382,6 +464,12 @@ class BuyerTransaction(models.Model):
     verified = models.BooleanField(default=False)
     date=models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        # Newest-first history pages of one buyer (KeysetPagination)
+        indexes = [models.Index(fields=['buyer', '-date', '-id'], name='buyer_txn_buyer_date_idx')]
+
+    # Reloads and re-applies the split if a deposit changed meanwhile
+    @retry_on_conflict
     def save(self, *args, **kwargs):
         if not self.buyer:
             raise ValueError("Buyer does not exist")
@@ -407,38 +495,33 @@ class BuyerTransaction(models.Model):
                     cashup_main_balance=Decimal('0.00')
                 )
             if self.verified:
-                # If cashup_owing_main_balance is positive
-                if cashup_owing_deposit.cashup_owing_main_balance > 0:
-                    # Deduct from cashup_owing_dps first
-                    if self.amount <= cashup_owing_deposit.cashup_owing_dps:
-                        cashup_owing_deposit.cashup_owing_dps -= self.amount  # Deduct from DPS
-                        cashup_deposit.cashup_main_balance += self.amount  # Add the amount to main balance
-                    else:
-                        # Deduct the whole cashup_owing_dps and add it to main balance
-                        cashup_deposit.cashup_main_balance += cashup_owing_deposit.cashup_owing_dps
-                        remaining_amount = self.amount - cashup_owing_deposit.cashup_owing_dps
-
-                        # Now, deduct from cashup_owing_main_balance
-                        if remaining_amount <= cashup_owing_deposit.cashup_owing_main_balance:
-                            cashup_owing_deposit.cashup_owing_main_balance -= remaining_amount
-                            self.buyer.main_balance += remaining_amount  # Add the remaining amount to buyer's main balance
-                        else:
-                            # If remaining amount is greater than cashup_owing_main_balance
-                            self.buyer.main_balance += (remaining_amount - cashup_owing_deposit.cashup_owing_main_balance)
-                            cashup_owing_deposit.cashup_owing_main_balance = Decimal('0.00')
-
-                        # Set cashup_owing_dps to 0 since it's fully used
-                        cashup_owing_deposit.cashup_owing_dps = Decimal('0.00')
-
-                else:
-                    # If cashup_owing_main_balance is not positive, add the amount directly to the buyer's main_balance
-                    self.buyer.main_balance += self.amount
-
+                # Balances before the split, to post the changes to the ledger
+                dps_before = cashup_owing_deposit.cashup_owing_dps
+                owing_before = cashup_owing_deposit.cashup_owing_main_balance
+                cashup_before = cashup_deposit.cashup_main_balance
+
+                # Clear the DPS into the cashup balance, then pay off the owing balance
+                (
+                    cashup_owing_deposit.cashup_owing_main_balance,
+                    cashup_owing_deposit.cashup_owing_dps,
+                    cashup_credit,
+                    main_credit,
+                ) = split_payment(self.amount, owing_before, dps_before)
+                cashup_deposit.cashup_main_balance += cashup_credit
 
                 # Save the updated deposit balances and buyer's main_balance
                 cashup_owing_deposit.save()
                 cashup_deposit.save()
-                self.buyer.save()
+                if main_credit:
+                    credit(self.buyer, main_credit)
+
+                # The paid-in amount enters from outside; the ledger gets the net of each bucket
+                ledger.record('verification', [
+                    (self.buyer, 'cashup_owing_dps', cashup_owing_deposit.cashup_owing_dps - dps_before),
+                    (self.buyer, 'cashup_owing_main_balance', cashup_owing_deposit.cashup_owing_main_balance - owing_before),
+                    (self.buyer, 'cashup_main_balance', cashup_deposit.cashup_main_balance - cashup_before),
+                    (self.buyer, 'main_balance', main_credit),
+                ], contra='external', memo=self.transaction_id)
 
 
 
@@ -463,6 +546,10 @@ class TransferHistory(models.Model):
     verified=models.BooleanField(default=False)
     cashup_owing_deposit = models.ForeignKey('CashupOwingDeposit', on_delete=models.SET_NULL, null=True, blank=True)
 
+    class Meta:
+        # Newest-first history pages of one buyer (KeysetPagination)
+        indexes = [models.Index(fields=['buyer', '-date', '-id'], name='owing_transfer_buyer_idx')]
+
     def __str__(self):
         return f"{self.buyer.username} - {self.amount} on {self.date}"
     def save(self, *args, **kwargs):
@@ -476,7 +563,11 @@ class TransferHistoryofCashup(models.Model):
     buyer = models.ForeignKey(Buyer, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     date = models.DateTimeField(default=timezone.now)
-    
+
+    class Meta:
+        # Newest-first history pages of one buyer (KeysetPagination)
+        indexes = [models.Index(fields=['buyer', '-date', '-id'], name='cashup_transfer_buyer_idx')]
+
     def save(self, *args, **kwargs):
         # Remove microseconds before saving the timestamp
         if self.date:
@@ -492,7 +583,10 @@ class TransferHistoryofCashupOwingDPS(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     date = models.DateTimeField(default=timezone.now)
 
-    
+    class Meta:
+        # Newest-first history pages of one buyer (KeysetPagination)
+        indexes = [models.Index(fields=['buyer', '-date', '-id'], name='owing_dps_transfer_buyer_idx')]
+
     def save(self, *args, **kwargs):
         # Remove microseconds before saving the timestamp
         if self.date:
@@ -526,15 +620,21 @@ class CashupProfitHistory(models.Model):
     new_value = models.DecimalField(max_digits=10, decimal_places=2)
     updated_by = models.ForeignKey(Buyer, on_delete=models.SET_NULL, null=True, blank=True)  # User who made the change
     change_timestamp = models.DateTimeField(default=timezone.now)
+    # Outbox event the row was drained from, None for rows written before the outbox
+    outbox_event_id = models.BigIntegerField(null=True, blank=True, editable=False)
 
     def save(self, *args, **kwargs):
-        # Remove microseconds before saving the timestamp
+        self.fill_defaults()
+        super().save(*args, **kwargs)
+
+    def fill_defaults(self):
+        # Also called by the history buffer, whose bulk_create skips save()
         if self.cashup_deposit and not self.updated_by:
             self.updated_by = self.cashup_deposit.buyer
 
+        # Remove microseconds before saving the timestamp
         if self.change_timestamp:
             self.change_timestamp = self.change_timestamp.replace(second=0,microsecond=0)
-        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Change in {self.field_name} for CashupDeposit {self.cashup_deposit.id} on {self.change_timestamp}"
@@ -547,17 +647,23 @@ class CashupOwingProfitHistory(models.Model):
     new_value = models.DecimalField(max_digits=10, decimal_places=2)
     updated_by = models.ForeignKey(Buyer, on_delete=models.SET_NULL, null=True, blank=True)  # User who made the change
     change_timestamp = models.DateTimeField(default=timezone.now)
+    # Outbox event the row was drained from, None for rows written before the outbox
+    outbox_event_id = models.BigIntegerField(null=True, blank=True, editable=False)
     
     
 
     def save(self, *args, **kwargs):
-        # Remove microseconds before saving the timestamp
+        self.fill_defaults()
+        super().save(*args, **kwargs)
+
+    def fill_defaults(self):
+        # Also called by the history buffer, whose bulk_create skips save()
         if self.cashup_owing_deposit and not self.updated_by:
             self.updated_by = self.cashup_owing_deposit.buyer
 
+        # Remove microseconds before saving the timestamp
         if self.change_timestamp:
             self.change_timestamp = self.change_timestamp.replace(second=0,microsecond=0)
-        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Change in {self.field_name} for CashupDeposit {self.cashup_owing_deposit.id} on {self.change_timestamp}"
@@ -567,13 +673,225 @@ class CashupDepositHistory(models.Model):
     old_balance = models.DecimalField(max_digits=10, decimal_places=2)
     new_balance = models.DecimalField(max_digits=10, decimal_places=2)
     change_amount = models.DecimalField(max_digits=10, decimal_places=2)
-    changed_at = models.DateTimeField(auto_now_add=True)
+    changed_at = models.DateTimeField(default=timezone.now, editable=False)  # Set from the outbox event when drained
     updated_by = models.ForeignKey(Buyer, on_delete=models.SET_NULL, null=True, blank=True)
+    # Outbox event the row was drained from, None for rows written before the outbox
+    outbox_event_id = models.BigIntegerField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return f"CashupDeposit History: {self.old_balance} -> {self.new_balance} at {self.changed_at}"
 
 
+class ProfitAccrual(models.Model):
+    # One row per deposit, accrual day and kind of profit credited by the accrual job
+    KIND_CHOICES = [
+        ('daily_profit', 'Daily Profit'),
+        ('compounding_profit', 'Compounding Profit'),
+    ]
+    cashup_deposit = models.ForeignKey(CashupDeposit, on_delete=models.CASCADE, related_name='profit_accruals')
+    accrual_date = models.DateField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # The deposit's daily_profit/compounding_profit before and after the credit,
+    # and when it was booked, as the profit history endpoints show them
+    previous_value = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    new_value = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    credited_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cashup_deposit', 'accrual_date', 'kind'], name='unique_profit_accrual'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.amount} for CashupDeposit {self.cashup_deposit_id} on {self.accrual_date}"
+
+
+class OwingProfitAccrual(models.Model):
+    # Same as ProfitAccrual, for the cashup owing book
+    cashup_owing_deposit = models.ForeignKey(CashupOwingDeposit, on_delete=models.CASCADE, related_name='profit_accruals')
+    accrual_date = models.DateField()
+    kind = models.CharField(max_length=20, choices=ProfitAccrual.KIND_CHOICES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    previous_value = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    new_value = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    credited_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cashup_owing_deposit', 'accrual_date', 'kind'], name='unique_owing_profit_accrual'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.amount} for CashupOwingDeposit {self.cashup_owing_deposit_id} on {self.accrual_date}"
+
+
+class PublicHoliday(models.Model):
+    # No profit is credited on public holidays, on top of the weekly off-days
+    date = models.DateField(unique=True)
+    name = models.CharField(max_length=100)
+
+    def __str__(self):
+        return f"{self.name} ({self.date})"
+
+
+class ProfitRateSchedule(models.Model):
+    # A rate applies from `effective_from` until the next row of the same kind
+    KIND_CHOICES = [
+        ('daily_profit', 'Daily Profit'),
+        ('compounding_profit', 'Compounding Profit'),
+        ('affiliate_profit', 'Affiliate Profit'),
+        ('owing_daily_profit', 'Owing Daily Profit'),
+        ('owing_compounding_profit', 'Owing Compounding Profit'),
+    ]
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    rate = models.DecimalField(max_digits=7, decimal_places=5, help_text="Fraction, e.g. 0.00200 for 0.2%")
+    effective_from = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'effective_from'], name='unique_profit_rate'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.rate} from {self.effective_from}"
+
+
+class AccrualCheckpoint(models.Model):
+    # Marks an id range of a deposit book as credited for an accrual day, so an
+    # interrupted accrual run can resume with the shards it did not finish
+    BOOK_CHOICES = [
+        ('cashup', 'Cashup Deposit'),
+        ('cashup_owing', 'Cashup Owing Deposit'),
+    ]
+    book = models.CharField(max_length=20, choices=BOOK_CHOICES)
+    accrual_date = models.DateField()
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    credited = models.PositiveIntegerField(default=0)
+    completed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'accrual_date', 'first_id'], name='unique_accrual_checkpoint'),
+        ]
+
+    def __str__(self):
+        return f"{self.book} {self.first_id}-{self.last_id} credited for {self.accrual_date}"
+
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+class OutboxEvent(models.Model):
+    # Balance and profit changes of a deposit, written in the same transaction
+    # as the change and drained into the history tables by `manage.py drain_outbox`
+    TOPIC_CHOICES = [
+        ('cashup_deposit', 'Cashup Deposit'),
+        ('cashup_owing_deposit', 'Cashup Owing Deposit'),
+    ]
+    topic = models.CharField(max_length=30, choices=TOPIC_CHOICES)
+    object_id = models.BigIntegerField()
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['processed_at', 'id'], name='outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} {self.object_id} at {self.created_at}"
+
+
+class IdempotencyKey(models.Model):
+    # First response to a money-moving POST per buyer and Idempotency-Key header,
+    # replayed to retries until it expires (see myapi/idempotency.py)
+    buyer = models.ForeignKey(Buyer, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # sha256 of method, path and body
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # None while the request runs
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['buyer', 'key'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} for {self.buyer_id}"
+
+
+class LedgerAccount(models.Model):
+    # One account per buyer and balance bucket, plus buyer-less system accounts
+    # for money entering or leaving the buyers' buckets. `balance` is kept in
+    # step with the postings (see myapi/ledger.py); system accounts are not
+    # materialized, their balance is the sum of their postings.
+    BUCKET_CHOICES = [
+        ('main_balance', 'Main Balance'),
+        ('cashup_main_balance', 'Cashup Main Balance'),
+        ('cashup_owing_main_balance', 'Cashup Owing Main Balance'),
+        ('cashup_owing_dps', 'Cashup Owing DPS'),
+        ('external', 'External (bKash, Nagad, Rocket)'),
+        ('profit', 'Profit Payouts'),
+        ('sales', 'Sales'),
+        ('owing', 'Owing Credit'),
+        ('opening', 'Opening Balances'),
+    ]
+    buyer = models.ForeignKey(Buyer, on_delete=models.PROTECT, null=True, blank=True, related_name='ledger_accounts')
+    bucket = models.CharField(max_length=30, choices=BUCKET_CHOICES)
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['buyer', 'bucket'], name='unique_ledger_account'),
+            models.UniqueConstraint(fields=['bucket'], condition=models.Q(buyer__isnull=True), name='unique_system_ledger_account'),
+        ]
+
+    def __str__(self):
+        return f"{self.bucket} of {self.buyer_id or 'system'}"
+
+
+class LedgerTransfer(models.Model):
+    # A set of postings that sum to zero, written together and never changed
+    KIND_CHOICES = [
+        ('opening', 'Opening Balance'),
+        ('deposit', 'Deposit'),
+        ('transfer', 'Transfer'),
+        ('purchase', 'Purchase'),
+        ('withdrawal', 'Withdrawal'),
+        ('verification', 'Transaction Verification'),
+        ('owing_approval', 'Owing Approval'),
+    ]
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    memo = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.kind} {self.id} at {self.created_at}"
+
+
+class LedgerPosting(models.Model):
+    transfer = models.ForeignKey(LedgerTransfer, on_delete=models.PROTECT, related_name='postings')
+    account = models.ForeignKey(LedgerAccount, on_delete=models.PROTECT, related_name='postings')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)  # Positive credits the account, negative debits it
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['account', '-created_at'], name='ledger_posting_account_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.amount} to {self.account} in transfer {self.transfer_id}"
+
+
     
 class CheckoutDetail(models.Model):
     purchase=models.ForeignKey(Purchase,on_delete=models.CASCADE)
@@ -664,79 +982,38 @@ def create_buyer(sender, instance, created, **kwargs):
 
 
 
-from django.db.models.signals import pre_save
-
-@receiver(pre_save, sender=CashupDeposit)
-def track_profit_changes(sender, instance, **kwargs):
-    # Fetch the previous state of the object if it's an update
-    if instance.id:
-        try:
-            previous_instance = CashupDeposit.objects.get(id=instance.id)
-        except CashupDeposit.DoesNotExist:
-            previous_instance = None
-    else:
-        previous_instance = None  # New instance, no previous state
+from . import outbox
 
+@receiver(post_save, sender=CashupDeposit)
+def track_profit_changes(sender, instance, created, **kwargs):
     # List of profit-related fields to track
     profit_fields = [
         'daily_profit', 'compounding_profit','affiliate_profit', 'monthly_profit', 'product_profit', 
         'daily_compounding_profit', 'monthly_compounding_profit'
     ]
 
-    # If previous instance exists, check for differences
-    if previous_instance:
-        for field in profit_fields:
-            previous_value = getattr(previous_instance, field, 0)
-            new_value = getattr(instance, field, 0)
-
-            # If the value has changed, log it in the ProfitHistory
-            if previous_value != new_value:
-                CashupProfitHistory.objects.create(
-                    cashup_deposit=instance,
-                    field_name=field,
-                    previous_value=previous_value,
-                    new_value=new_value,
-                    updated_by=instance.updated_by,  # Capture who made the change
-                )
-from django.db.models.signals import pre_save
-from django.dispatch import receiver
-from .models import CashupOwingDeposit, CashupOwingProfitHistory
-
-@receiver(pre_save, sender=CashupOwingDeposit)
-def track_profit_changes(sender, instance, **kwargs):
-    # Fetch the previous state of the object if it's an update
-    if instance.id:
-        try:
-            previous_instance = CashupOwingDeposit.objects.get(id=instance.id)
-        except CashupOwingDeposit.DoesNotExist:
-            previous_instance = None
-    else:
-        previous_instance = None  # New instance, no previous state
+    # Diff against the values the instance was loaded with (no extra query);
+    # new instances have no snapshot and report no changes. The changes go to
+    # the outbox in this transaction and reach CashupProfitHistory and
+    # CashupDepositHistory when the consumer drains it.
+    if not created:
+        changes = instance.changed_fields(profit_fields + ['cashup_main_balance'])
+        if changes:
+            outbox.publish('cashup_deposit', instance, changes, updated_by=instance.updated_by or instance.buyer)
 
+@receiver(post_save, sender=CashupOwingDeposit)
+def track_owing_profit_changes(sender, instance, created, **kwargs):
     # List of profit-related fields to track
     profit_fields = [
-        'daily_profit', 'compounding_profit', 'monthly_profit','affiliate_profit', 'product_profit',
+        'daily_profit', 'compounding_profit', 'monthly_profit', 'product_profit',
         'daily_compounding_profit', 'monthly_compounding_profit'
     ]
 
-    # If previous instance exists, check for differences
-    if previous_instance:
-        for field in profit_fields:
-            previous_value = getattr(previous_instance, field, 0)
-            new_value = getattr(instance, field, 0)
-
-            # If the value has changed, log it in the ProfitHistory
-            if previous_value != new_value:
-                # Ensure updated_by is set
-                updated_by_user = instance.updated_by if instance.updated_by else instance.user
-                
-                CashupOwingProfitHistory.objects.create(
-                    cashup_owing_deposit=instance,
-                    field_name=field,
-                    previous_value=previous_value,
-                    new_value=new_value,
-                    updated_by=updated_by_user,  # Ensure updated_by is set to correct user
-                )
+    # Same as for CashupDeposit, drained into CashupOwingProfitHistory
+    if not created:
+        changes = instance.changed_fields(profit_fields)
+        if changes:
+            outbox.publish('cashup_owing_deposit', instance, changes, updated_by=instance.updated_by or instance.buyer)
 
 @receiver(post_save, sender=CashupOwingDeposit)
 def update_transferhistory_verified(sender, instance, created, **kwargs):
@@ -747,128 +1024,45 @@ def update_transferhistory_verified(sender, instance, created, **kwargs):
 
         # Update the 'verified' field for all related TransferHistory objects
         transfer_history_records.update(verified=True)
-from django.db.models.signals import post_save
-@receiver(post_save, sender=WithdrawalFromCompoundingProfit)
-def update_compounding_profit(sender, instance, created, **kwargs):
-    # Proceed only if the withdrawal request has been approved
-    if instance.status == 'Approved' and not created:
-        # Ensure the buyer has a related CashupDeposit
-        cashup_deposit = instance.buyer.cashup_deposits.first()  # Assuming one cashup deposit per buyer
-        
-        if cashup_deposit:
-            # Ensure there is enough compounding profit to cover the withdrawal amount
-            if cashup_deposit.compounding_profit >= instance.amount:
-                with transaction.atomic():
-                    # Deduct the amount from the compounding_profit
-                    cashup_deposit.compounding_profit -= instance.amount
-                    
-                    # Add the amount to compounding_withdraw
-                    cashup_deposit.compounding_withdraw += instance.amount
-                    
-                    # Save the updated CashupDeposit
-                    cashup_deposit.save()
-
-                    instance.buyer.main_balance += instance.amount
-                    instance.buyer.save()
-                    # Optionally, log the transaction or update withdrawal history here
-
-            else:
-                # If insufficient funds in compounding profit, reject the withdrawal
-                instance.status = 'Rejected'
-                instance.save()
-
-
-@receiver(post_save, sender=WithdrawalFromDailyProfit)
-def update_daily_profit(sender, instance, created, **kwargs):
-    # Proceed only if the withdrawal request has been approved and is updated (not created)
-    if instance.status == 'Approved' and not created:
-        # Ensure the buyer has a related CashupDeposit
-        cashup_deposit = instance.buyer.cashup_deposits.first()  # Assuming one cashup deposit per buyer
-        
-        if cashup_deposit:
-            # Ensure there is enough daily profit to cover the withdrawal amount
-            if cashup_deposit.daily_profit >= instance.amount:
-                with transaction.atomic():
-                    # Deduct the amount from the daily_profit
-                    cashup_deposit.daily_profit -= instance.amount
-                    
-                    # Add the amount to compounding_withdraw (or another relevant field if necessary)
-                    cashup_deposit.compounding_withdraw += instance.amount
-                    
-                    # Save the updated CashupDeposit
-                    cashup_deposit.save()
-
-                    # Add the amount to the buyer's main_balance
-                    instance.buyer.main_balance += instance.amount
-                    instance.buyer.save()
-
-                    # Optionally, log the transaction or update withdrawal history here
-                    # For example, you can create a new transaction record for this withdrawal
-
-            else:
-                # If insufficient funds in daily profit, reject the withdrawal
-                instance.status = 'Rejected'
-                instance.save()
-
-@receiver(post_save, sender=WithdrawalFromAffiliateProfit)
-def update_affiliate_profit(sender, instance, created, **kwargs):
-    # Proceed only if the withdrawal request has been approved and is updated (not created)
-    if instance.status == 'Approved' and not created:
-        # Ensure the buyer has a related CashupDeposit
-        cashup_deposit = instance.buyer.cashup_deposits.first()  # Assuming one cashup deposit per buyer
-        
-        if cashup_deposit:
-            # Ensure there is enough affiliate profit to cover the withdrawal amount
-            if cashup_deposit.affiliate_profit >= instance.amount:
-                with transaction.atomic():
-                    # Deduct the amount from the affiliate_profit
-                    cashup_deposit.affiliate_profit -= instance.amount
-                    
-                    # Add the amount to affiliate_withdraw (or another relevant field if necessary)
-                    cashup_deposit.affiliate_withdraw += instance.amount
-                    
-                    # Save the updated CashupDeposit
-                    cashup_deposit.save()
+@receiver(post_save, sender=Withdrawal)
+def process_withdrawal(sender, instance, **kwargs):
+    # Move the money once, when the withdrawal becomes Approved
+    if instance.status == 'Approved' and instance.loaded_value('status') != 'Approved':
+        from .withdrawals import approve
+        approve(instance)
 
-                    # Add the amount to the buyer's main_balance
-                    instance.buyer.main_balance += instance.amount
-                    instance.buyer.save()
 
-                    # Optionally, log the transaction or update withdrawal history here
-                    # For example, you can create a new transaction record for this withdrawal
 
-            else:
-                # If insufficient funds in affiliate profit, reject the withdrawal
-                instance.status = 'Rejected'
-                instance.save()
-
-
-
-@receiver(post_save, sender=CashupDeposit)
-def create_cashup_deposit_history(sender, instance, created, **kwargs):
-    # Check if this is an update (not creation) and if cashup_main_balance has changed
-    if not created:
-        try:
-            old_instance = CashupDeposit.objects.get(pk=instance.pk)
-            if old_instance.cashup_main_balance != instance.cashup_main_balance:
-
-                
-                updated_by_user = instance.updated_by if instance.updated_by else instance.user
-
-                CashupDepositHistory.objects.create(
-                    cashup_deposit=instance,
-                    old_balance=old_instance.cashup_main_balance,
-                    new_balance=instance.cashup_main_balance,
-                    change_amount=instance.cashup_main_balance - old_instance.cashup_main_balance,
-                    updated_by=updated_by_user
-                )
-        except CashupDeposit.DoesNotExist:
-            pass
+from django.db.models.signals import post_delete
 
+@receiver([post_save, post_delete], sender=PublicHoliday)
+def reset_business_calendar(sender, **kwargs):
+    # Rebuild the business-day index in every process so accrual picks up
+    # the holiday change
+    from .business_days import clear_calendar
+    clear_calendar()
+    invalidate_all()
 
 
+@receiver([post_save, post_delete], sender=ProfitRateSchedule)
+def reset_rate_table(sender, **kwargs):
+    # Rebuild the rate table in every process so accrual picks up the rate
+    # change
+    from .rates import clear_rate_table
+    clear_rate_table()
+    invalidate_all()
 
 
+from .summary import invalidate, invalidate_all
 
+@receiver([post_save, post_delete], sender=Buyer)
+def reset_buyer_summary(sender, instance, **kwargs):
+    # Drop the cached balance summary when the buyer row changes
+    invalidate(instance.pk)
 
 
+@receiver([post_save, post_delete], sender=CashupDeposit)
+@receiver([post_save, post_delete], sender=CashupOwingDeposit)
+def reset_deposit_summary(sender, instance, **kwargs):
+    # Drop the cached balance summary of the deposit's buyer
+    invalidate(instance.buyer_id)
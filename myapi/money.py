@@ -0,0 +1,71 @@
+"""
+Money in integer poisha (1 taka = 100 poisha) for bulk computation.
+
+Balances are stored as DecimalField(max_digits=10, decimal_places=2), which
+converts to and from poisha without loss. Batch accrual, reconciliation and
+forecasting work on plain ints (or int64 NumPy arrays) and only convert back
+to Decimal when writing to a model or a serializer.
+
+Rounding rule: applying a rate rounds the exact result to the nearest poisha,
+with halves rounded away from zero (the same as PostgreSQL numeric rounding
+and Decimal ROUND_HALF_UP).
+"""
+from decimal import Decimal
+
+import numpy as np
+
+
+POISHA_PER_TAKA = 100
+
+# Largest amount a DecimalField(max_digits=10, decimal_places=2) can hold
+MAX_POISHA = 10 ** 10 - 1
+
+
+def to_poisha(amount):
+    """
+    Convert a taka amount (Decimal, int or numeric string) to integer poisha.
+
+    Raises ValueError if the amount has fractions of a poisha, so nothing is
+    ever rounded silently at the boundary.
+    """
+    if amount is None:
+        return 0
+    value = Decimal(amount) * POISHA_PER_TAKA
+    if value != value.to_integral_value():
+        raise ValueError(f"{amount} is not a whole number of poisha.")
+    return int(value)
+
+
+def from_poisha(poisha):
+    """Convert integer poisha back to a 2-place Decimal taka amount."""
+    return (Decimal(int(poisha)) / POISHA_PER_TAKA).quantize(Decimal('0.01'))
+
+
+def rate_ratio(rate):
+    """Exact (numerator, denominator) of a Decimal rate."""
+    return Decimal(rate).as_integer_ratio()
+
+
+def apply_rate(poisha, rate):
+    """`poisha * rate` rounded to the nearest poisha, halves away from zero."""
+    numerator, denominator = rate_ratio(rate)
+    product = poisha * numerator
+    if product >= 0:
+        return (2 * product + denominator) // (2 * denominator)
+    return -((-2 * product + denominator) // (2 * denominator))
+
+
+def apply_rate_array(poisha, rate):
+    """Vectorized apply_rate for an int64 array of non-negative poisha amounts."""
+    numerator, denominator = rate_ratio(rate)
+    return (2 * poisha * numerator + denominator) // (2 * denominator)
+
+
+def poisha_array(amounts):
+    """int64 array of poisha from an iterable of taka amounts."""
+    return np.fromiter((to_poisha(amount) for amount in amounts), dtype=np.int64)
+
+
+def round_poisha(value):
+    """Round a float poisha result (from a forecast) to whole poisha, halves away from zero."""
+    return int(np.sign(value) * np.floor(abs(value) + 0.5))
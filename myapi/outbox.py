@@ -0,0 +1,158 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .history import HistoryBuffer
+
+
+# Events turned into history rows per transaction by the consumer
+BATCH_SIZE = 500
+
+# Drained events deleted per statement by purge()
+PURGE_BATCH_SIZE = 5000
+
+
+def publish(topic, instance, changes, updated_by=None):
+    """
+    Write the changes of a deposit save to the outbox, in the caller's
+    transaction. `changes` maps field names to (previous_value, new_value).
+    """
+    from .models import OutboxEvent
+
+    OutboxEvent.objects.create(
+        topic=topic,
+        object_id=instance.pk,
+        payload={
+            'updated_by': updated_by.pk if updated_by else None,
+            'changes': {field: [previous, new] for field, (previous, new) in changes.items()},
+        },
+    )
+
+
+def history_rows(event):
+    """History rows recorded for one outbox event."""
+    from .models import CashupDepositHistory, CashupOwingProfitHistory, CashupProfitHistory
+
+    updated_by_id = event.payload.get('updated_by')
+    rows = []
+    for field, (previous, new) in event.payload['changes'].items():
+        previous, new = Decimal(previous), Decimal(new)
+        if event.topic == 'cashup_owing_deposit':
+            rows.append(CashupOwingProfitHistory(
+                cashup_owing_deposit_id=event.object_id, field_name=field,
+                previous_value=previous, new_value=new,
+                updated_by_id=updated_by_id, change_timestamp=event.created_at, outbox_event_id=event.id,
+            ))
+        elif field == 'cashup_main_balance':
+            rows.append(CashupDepositHistory(
+                cashup_deposit_id=event.object_id,
+                old_balance=previous, new_balance=new, change_amount=new - previous,
+                updated_by_id=updated_by_id, changed_at=event.created_at, outbox_event_id=event.id,
+            ))
+        else:
+            rows.append(CashupProfitHistory(
+                cashup_deposit_id=event.object_id, field_name=field,
+                previous_value=previous, new_value=new,
+                updated_by_id=updated_by_id, change_timestamp=event.created_at, outbox_event_id=event.id,
+            ))
+    return rows
+
+
+def drain_batch(batch_size=BATCH_SIZE):
+    """
+    Move one batch of pending outbox events into the history tables.
+
+    The history rows and the processed marks commit together, and locked
+    events are skipped, so several consumers can drain the outbox at once.
+    Returns the number of events processed.
+    """
+    from .models import CashupDeposit, CashupOwingDeposit, OutboxEvent
+
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.filter(processed_at__isnull=True)
+            .order_by('id')
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        if not events:
+            return 0
+
+        # Deposits deleted since the event was written have no history to keep
+        existing = {
+            'cashup_deposit': set(CashupDeposit.objects.filter(
+                id__in=[e.object_id for e in events if e.topic == 'cashup_deposit'],
+            ).values_list('id', flat=True)),
+            'cashup_owing_deposit': set(CashupOwingDeposit.objects.filter(
+                id__in=[e.object_id for e in events if e.topic == 'cashup_owing_deposit'],
+            ).values_list('id', flat=True)),
+        }
+
+        buffer = HistoryBuffer()
+        for event in events:
+            if event.object_id in existing[event.topic]:
+                for row in history_rows(event):
+                    buffer.add(row)
+        buffer.flush()
+
+        OutboxEvent.objects.filter(id__in=[e.id for e in events]).update(processed_at=timezone.now())
+    return len(events)
+
+
+def drain(batch_size=BATCH_SIZE):
+    """Drain the outbox until no pending events are left. Returns the number processed."""
+    processed = 0
+    while True:
+        count = drain_batch(batch_size)
+        if not count:
+            return processed
+        processed += count
+
+
+def replay(since):
+    """
+    Rebuild the deposit history from the outbox, starting at `since`.
+
+    History rows drained from the events created from `since` on are deleted
+    and those events are marked pending again, so the next drain writes them
+    back. Rows written before the outbox existed are kept. Raises ValueError
+    if `since` is before the oldest event the outbox still holds, since the
+    history before it cannot be rebuilt.
+    """
+    from .models import CashupDepositHistory, CashupOwingProfitHistory, CashupProfitHistory, OutboxEvent
+
+    with transaction.atomic():
+        oldest = OutboxEvent.objects.order_by('created_at').values_list('created_at', flat=True).first()
+        if oldest is None or since < oldest:
+            raise ValueError(f"Cannot replay from {since}: the outbox holds no events before {oldest}.")
+
+        events = OutboxEvent.objects.filter(created_at__gte=since)
+        for model in (CashupProfitHistory, CashupOwingProfitHistory, CashupDepositHistory):
+            model.objects.filter(outbox_event_id__in=events.values('id')).delete()
+        return events.update(processed_at=None)
+
+
+def retention():
+    """How long drained events are kept for replay (OUTBOX_RETENTION, 30 days by default)."""
+    return getattr(settings, 'OUTBOX_RETENTION', timedelta(days=30))
+
+
+def purge(before=None, batch_size=PURGE_BATCH_SIZE):
+    """
+    Delete the events drained before `before` (the retention period ago by
+    default), a batch at a time. Pending events are never deleted. The
+    history drained from them stays, but can no longer be replayed.
+    Returns the number of events deleted.
+    """
+    from .models import OutboxEvent
+
+    before = before or timezone.now() - retention()
+    drained = OutboxEvent.objects.filter(processed_at__lt=before)
+    deleted = 0
+    while True:
+        ids = list(drained.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += OutboxEvent.objects.filter(id__in=ids).delete()[0]
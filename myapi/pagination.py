@@ -0,0 +1,175 @@
+import base64
+import json
+
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Newest-first pages over (date, id), continued with an opaque cursor.
+
+    Each page is one indexed range query that starts right after the last
+    row of the previous page, so a page costs the same however long the
+    history is, and rows added meanwhile never shift or repeat a page.
+    Responses look like {"next": <url or null>, "results": [...]}; pass
+    ?page_size= to change the page length.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 200
+    ordering = ('date', 'id')
+
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_cursor(self, row):
+        date_field, id_field = self.ordering
+        position = [getattr(row, date_field).isoformat(), getattr(row, id_field)]
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            date, pk = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            date = parse_datetime(date)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return date, pk
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        date_field, id_field = self.ordering
+        queryset = queryset.order_by(f'-{date_field}', f'-{id_field}')
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            date, pk = position
+            queryset = queryset.filter(
+                Q(**{f'{date_field}__lt': date}) | Q(**{date_field: date, f'{id_field}__lt': pk})
+            )
+
+        # One extra row tells whether there is a next page
+        page_size = self.get_page_size(request)
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+
+class PurchaseKeysetPagination(KeysetPagination):
+    """
+    KeysetPagination over purchases, newest first by id alone: created_at is
+    null on old purchases, and ids already follow the order they were made.
+    """
+
+    def encode_cursor(self, row):
+        return base64.urlsafe_b64encode(json.dumps([row.id]).encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            (pk,) = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            return int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        queryset = queryset.order_by('-id')
+
+        pk = self.decode_cursor(request)
+        if pk is not None:
+            queryset = queryset.filter(id__lt=pk)
+
+        page_size = self.get_page_size(request)
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+
+class LedgerKeysetPagination(KeysetPagination):
+    """KeysetPagination over ledger postings, which are dated by created_at."""
+    ordering = ('created_at', 'id')
+
+
+class ItemKeysetPagination(KeysetPagination):
+    """
+    KeysetPagination over purchase rows (dicts) in (item_id, id) order,
+    oldest item first and rows without an item last, for reports grouped by
+    item. An item with more rows than a page continues on the next page.
+    """
+    page_size = 500
+    max_page_size = 5000
+
+    def encode_cursor(self, row):
+        return base64.urlsafe_b64encode(json.dumps([row['item_id'], row['id']]).encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            item_id, pk = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            return (None if item_id is None else int(item_id)), int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        queryset = queryset.order_by(F('item_id').asc(nulls_last=True), 'id')
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            item_id, pk = position
+            if item_id is None:
+                queryset = queryset.filter(item_id__isnull=True, id__gt=pk)
+            else:
+                queryset = queryset.filter(
+                    Q(item_id__gt=item_id) | Q(item_id=item_id, id__gt=pk) | Q(item_id__isnull=True)
+                )
+
+        page_size = self.get_page_size(request)
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
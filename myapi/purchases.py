@@ -0,0 +1,91 @@
+from itertools import groupby
+
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+
+
+# Columns of a confirmed purchase row, its item and its buyer, read in one
+# joined query
+CONFIRMED_BUYER_COLUMNS = (
+    'id', 'item_id', 'quantity', 'total_price', 'discount_total_price', 'total_membership_price', 'paid', 'created_at',
+    'item__name', 'item__price', 'item__discount_price', 'item__members_price', 'item__category__name',
+    'buyer_id', 'buyer__name', 'buyer__phone_number', 'buyer__membership_status', 'buyer__address',
+)
+
+
+def confirmed_purchase_rows():
+    """
+    Confirmed purchases with their item, category and buyer as plain dicts,
+    in (item, purchase id) order so the rows of an item come together.
+    Purchases without an item come last.
+    """
+    from .models import Purchase
+
+    return (
+        Purchase.objects.filter(confirmed=True)
+        .values(*CONFIRMED_BUYER_COLUMNS)
+        .order_by(F('item_id').asc(nulls_last=True), 'id')
+    )
+
+
+def group_by_item(rows):
+    """
+    Fold rows of confirmed_purchase_rows() into one entry per item:
+    {"item": {...}, "buyers": [...]}, with "item": None for purchases that
+    have no item. Rows must be in item order.
+    """
+    groups = []
+    for item_id, item_rows in groupby(rows, key=lambda row: row['item_id']):
+        item_rows = list(item_rows)
+        first = item_rows[0]
+        groups.append({
+            'item': None if item_id is None else {
+                'id': item_id,
+                'name': first['item__name'],
+                'category': first['item__category__name'],
+                'price': first['item__price'],
+                'discount_price': first['item__discount_price'],
+                'members_price': first['item__members_price'],
+            },
+            'buyers': [
+                {
+                    'purchase_id': row['id'],
+                    'buyer_id': row['buyer_id'],
+                    'name': row['buyer__name'],
+                    'phone_number': row['buyer__phone_number'],
+                    'membership_status': row['buyer__membership_status'],
+                    'address': row['buyer__address'],
+                    'quantity': row['quantity'],
+                    'total_price': row['total_price'],
+                    'discount_total_price': row['discount_total_price'],
+                    'total_membership_price': row['total_membership_price'],
+                    'paid': row['paid'],
+                    'created_at': row['created_at'],
+                }
+                for row in item_rows
+            ],
+        })
+    return groups
+
+
+def paid_purchases(buyer):
+    """
+    Confirmed and paid purchases of `buyer` with their item and category,
+    annotated in the query with `discount_price` (total_price less
+    discount_rate percent) and `line_total` (discount_price * quantity).
+    """
+    from .models import Purchase
+
+    money = DecimalField(max_digits=14, decimal_places=4)
+    return (
+        Purchase.objects.filter(buyer=buyer, confirmed=True, paid=True)
+        .select_related('item__category')
+        .annotate(discount_price=ExpressionWrapper(
+            F('total_price') - F('discount_rate') * F('total_price') / 100, output_field=money,
+        ))
+        .annotate(line_total=ExpressionWrapper(F('discount_price') * F('quantity'), output_field=money))
+    )
+
+
+def total_cost(purchases):
+    """Sum of line_total over a paid_purchases() queryset, computed by the database."""
+    return purchases.aggregate(total=Sum('line_total'))['total'] or 0
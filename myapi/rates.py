@@ -0,0 +1,133 @@
+import threading
+from bisect import bisect_right
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .business_days import CALENDAR_TTL, bump_version, get_calendar, shared_version
+
+
+# Rates used when no ProfitRateSchedule row is effective yet
+DEFAULT_RATES = {
+    'daily_profit': Decimal('0.002'),  # 0.2% of cashup_main_balance per accrual day
+    'compounding_profit': Decimal('0.002'),  # 0.2% of balance + daily profit per accrual day
+    'affiliate_profit': Decimal('0.05'),  # 5% of the referred buyer's deposit
+    'owing_daily_profit': Decimal('0.002'),  # Same rules on cashup_owing_main_balance
+    'owing_compounding_profit': Decimal('0.002'),
+}
+
+# Shared cache key of the rate table version, bumped on every schedule change
+RATE_TABLE_VERSION_KEY = 'rate-table-version'
+
+
+class RateTable:
+    """
+    Effective rate of every kind for every day of the business calendar.
+
+    `runs()` splits the accrual days of a range into runs at one rate, so a
+    balance's profit over the range is one rounded daily amount per run
+    times the number of days in it, the same as crediting it day by day.
+    """
+
+    def __init__(self, calendar, schedule, version=None):
+        self.calendar = calendar
+        self.version = version
+        self.built_at = timezone.now()
+        self._schedule = schedule
+
+        self._rates = {}
+        for kind in DEFAULT_RATES:
+            rates = []
+            day = calendar.first_day
+            while day <= calendar.last_day:
+                rates.append(self._scheduled_rate(kind, day))
+                day += timedelta(days=1)
+            self._rates[kind] = rates
+
+    def _scheduled_rate(self, kind, day):
+        dates, rates = self._schedule.get(kind, ((), ()))
+        i = bisect_right(dates, day)
+        return rates[i - 1] if i else DEFAULT_RATES[kind]
+
+    def covers(self, first, last):
+        return self.calendar.covers(first, last)
+
+    def rate(self, kind, day):
+        """Rate of the given kind in effect on `day`."""
+        if not self.calendar.covers(day, day):
+            return self._scheduled_rate(kind, day)
+        return self._rates[kind][(day - self.calendar.first_day).days]
+
+    def runs(self, kind, first, last):
+        """
+        The accrual days from `first` to `last`, both inclusive, as
+        [(rate, days)] runs of consecutive accrual days at the same rate.
+        """
+        runs = []
+        for day in self.calendar.days(first, last):
+            rate = self.rate(kind, day)
+            if runs and runs[-1][0] == rate:
+                runs[-1][1].append(day)
+            else:
+                runs.append((rate, [day]))
+        return runs
+
+
+_table = None
+_lock = threading.Lock()
+
+
+def load_schedule():
+    from .models import ProfitRateSchedule
+
+    schedule = {}
+    for kind, effective_from, rate in ProfitRateSchedule.objects.order_by(
+        'kind', 'effective_from',
+    ).values_list('kind', 'effective_from', 'rate'):
+        dates, rates = schedule.setdefault(kind, ([], []))
+        dates.append(effective_from)
+        rates.append(rate)
+    return schedule
+
+
+def get_rate_table(first=None, last=None):
+    """
+    Return the process's rate table, rebuilding it when the rate schedule
+    changed in any process, when the business calendar changed, or when it
+    does not cover the requested dates.
+    """
+    global _table
+
+    first = first or timezone.localdate()
+    last = last or first
+    calendar = get_calendar(first, last)
+    version = shared_version(RATE_TABLE_VERSION_KEY)
+    table = _table
+    if (
+        table is not None
+        and table.version == version
+        and table.calendar is calendar
+        and timezone.now() - table.built_at < CALENDAR_TTL
+    ):
+        return table
+
+    with _lock:
+        _table = RateTable(calendar, load_schedule(), version)
+        return _table
+
+
+def clear_rate_table():
+    """
+    Drop this process's rate table, and every other process's once the
+    current transaction commits, so the next lookup sees schedule changes.
+    """
+    global _table
+    _table = None
+    bump_version(RATE_TABLE_VERSION_KEY)
+
+
+def rate_on(kind, day=None):
+    """Rate of the given kind in effect on `day` (today by default)."""
+    day = day or timezone.localdate()
+    return get_rate_table(day).rate(kind, day)
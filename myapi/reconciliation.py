@@ -0,0 +1,163 @@
+import csv
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+
+# Statement rows looked up (and verified) per query
+CHUNK_SIZE = 2000
+
+# Column headers of the transaction id and amount in each provider's statement
+# export, first match wins
+STATEMENT_COLUMNS = {
+    'Bkash': {
+        'transaction_id': ('TrxID', 'Transaction ID', 'transaction_id'),
+        'amount': ('Amount', 'amount'),
+    },
+    'Nagad': {
+        'transaction_id': ('TxnID', 'Transaction ID', 'transaction_id'),
+        'amount': ('Amount', 'Transaction Amount', 'amount'),
+    },
+    'Rocket': {
+        'transaction_id': ('TxnId', 'Transaction ID', 'transaction_id'),
+        'amount': ('Amount', 'amount'),
+    },
+}
+
+# Row outcomes, in report order
+MATCHED = 'matched'
+AMOUNT_MISMATCH = 'amount_mismatch'
+METHOD_MISMATCH = 'method_mismatch'
+ALREADY_VERIFIED = 'already_verified'
+NOT_FOUND = 'not_found'
+DUPLICATE = 'duplicate'
+INVALID = 'invalid'
+OUTCOMES = (MATCHED, AMOUNT_MISMATCH, METHOD_MISMATCH, ALREADY_VERIFIED, NOT_FOUND, DUPLICATE, INVALID)
+
+REPORT_FIELDS = ['line', 'transaction_id', 'statement_amount', 'outcome', 'buyer_transaction', 'recorded_amount']
+
+
+def pick_column(fieldnames, candidates, override=None):
+    """The header among `fieldnames` to read, preferring `override`."""
+    fieldnames = fieldnames or []
+    for name in ([override] if override else candidates):
+        if name in fieldnames:
+            return name
+    return None
+
+
+def parse_amount(value):
+    # Statements print amounts like "1,500.00" or "৳1500"
+    try:
+        return Decimal((value or '').replace(',', '').replace('৳', '').strip()).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+
+
+def read_statement(lines, provider, id_column=None, amount_column=None):
+    """
+    Yield (line, transaction_id, amount) for each row of a statement CSV,
+    one row at a time. `amount` is None when it cannot be parsed.
+    """
+    reader = csv.DictReader(lines)
+    columns = STATEMENT_COLUMNS[provider]
+    id_field = pick_column(reader.fieldnames, columns['transaction_id'], id_column)
+    amount_field = pick_column(reader.fieldnames, columns['amount'], amount_column)
+    if id_field is None or amount_field is None:
+        raise ValueError(
+            f"Statement has no transaction id or amount column (headers: {', '.join(reader.fieldnames or [])})."
+        )
+
+    for row in reader:
+        # Line numbers count the header as line 1
+        yield reader.line_num, (row.get(id_field) or '').strip(), parse_amount(row.get(amount_field))
+
+
+def match_chunk(rows, provider, seen=None):
+    """
+    Match a chunk of statement rows against BuyerTransaction by transaction
+    id with one indexed lookup. Returns a report row per statement row.
+
+    `seen` holds the ids of the transactions earlier rows matched, so a row
+    repeated further down the statement is reported as a duplicate.
+    """
+    from .models import BuyerTransaction
+
+    ids = {transaction_id for line, transaction_id, amount in rows if transaction_id}
+    # Buyers type the id in by hand, so also try it upper-cased as printed
+    ids |= {transaction_id.upper() for transaction_id in ids}
+    recorded = {
+        t['transaction_id']: t
+        for t in BuyerTransaction.objects.filter(transaction_id__in=ids).values(
+            'id', 'transaction_id', 'amount', 'method', 'verified',
+        )
+    }
+
+    seen = set() if seen is None else seen
+    report = []
+    for line, transaction_id, amount in rows:
+        record = recorded.get(transaction_id) or recorded.get(transaction_id.upper())
+        if not transaction_id or amount is None:
+            outcome = INVALID
+        elif record is None:
+            outcome = NOT_FOUND
+        elif record['id'] in seen:
+            outcome = DUPLICATE
+        elif record['verified']:
+            outcome = ALREADY_VERIFIED
+        elif record['amount'] != amount:
+            outcome = AMOUNT_MISMATCH
+        elif record['method'] != provider:
+            outcome = METHOD_MISMATCH
+        else:
+            outcome = MATCHED
+        if record is not None:
+            seen.add(record['id'])
+
+        report.append({
+            'line': line,
+            'transaction_id': transaction_id,
+            'statement_amount': amount,
+            'outcome': outcome,
+            'buyer_transaction': record['id'] if record else None,
+            'recorded_amount': record['amount'] if record else None,
+        })
+    return report
+
+
+def reconcile(lines, provider, verify=False, report=None, chunk_size=CHUNK_SIZE, id_column=None, amount_column=None):
+    """
+    Reconcile a provider statement against the pending BuyerTransactions.
+
+    The statement is read and matched `chunk_size` rows at a time, so memory
+    stays bounded however long it is. Each report row is handed to
+    `report` (a callable, e.g. csv.DictWriter.writerow) as soon as its chunk
+    is matched. With `verify`, the matched transactions of each chunk are
+    verified in bulk right away.
+
+    Returns a Counter of outcomes, plus 'verified' with `verify`.
+    """
+    from .verification import verify_transactions
+
+    totals = Counter({outcome: 0 for outcome in OUTCOMES})
+    seen = set()
+
+    def flush(rows):
+        matched = []
+        for row in match_chunk(rows, provider, seen):
+            totals[row['outcome']] += 1
+            if row['outcome'] == MATCHED:
+                matched.append(row['buyer_transaction'])
+            if report:
+                report(row)
+        if verify and matched:
+            totals['verified'] += verify_transactions(matched)
+
+    rows = []
+    for row in read_statement(lines, provider, id_column, amount_column):
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            flush(rows)
+            rows = []
+    if rows:
+        flush(rows)
+    return totals
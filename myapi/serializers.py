@@ -1,6 +1,6 @@
 import re  # Import the re module for regular expressions
 from rest_framework import serializers
-from .models import Purchase, Buyer, CashupOwingDeposit, Item,WithdrawalFromCashupBalance, CashupDeposit ,BuyerTransaction ,CheckoutDetail
+from .models import Purchase, Buyer, CashupOwingDeposit, Item, CashupDeposit ,BuyerTransaction ,CheckoutDetail
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from rest_framework_simplejwt.tokens import RefreshToken
@@ -55,6 +55,36 @@ class PurchaseSerializer(serializers.ModelSerializer):
         model = Purchase
         fields = ['id', 'item', 'quantity', 'total_price', 'discount_total_price','created_at', 'total_membership_price','confirmed', 'paid']
 
+
+# Confirmed buyers report, from the plain rows of purchases.group_by_item()
+class ReportItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    category = serializers.CharField(allow_null=True)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    discount_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    members_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+class ConfirmedBuyerSerializer(serializers.Serializer):
+    purchase_id = serializers.IntegerField()
+    buyer_id = serializers.IntegerField()
+    name = serializers.CharField()
+    phone_number = serializers.CharField()
+    membership_status = serializers.BooleanField()
+    address = serializers.CharField(allow_null=True)
+    quantity = serializers.IntegerField()
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    discount_total_price = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    total_membership_price = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    paid = serializers.BooleanField()
+    created_at = serializers.DateTimeField(allow_null=True)
+
+
+class ItemBuyersSerializer(serializers.Serializer):
+    item = ReportItemSerializer(allow_null=True)  # None for purchases without an item
+    buyers = ConfirmedBuyerSerializer(many=True)
+
 from rest_framework import serializers
 from .models import TransferHistory , TransferHistoryofCashup 
 
@@ -194,6 +224,15 @@ class CashupDepositSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['created_at']  # Automatically set by the model
 
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+
+        # Show the profit accrued up to now when the view annotated it
+        accrued_daily_profit = getattr(instance, 'accrued_daily_profit', None)
+        if accrued_daily_profit is not None:
+            representation['daily_profit'] = self.fields['daily_profit'].to_representation(accrued_daily_profit)
+        return representation
+
 # Password Validation
 def validate_password(value):
     """
@@ -429,47 +468,45 @@ class TransferSerializer(serializers.Serializer):
     
 
 from rest_framework import serializers
-from .models import WithdrawalFromCashupBalance
+from .models import Withdrawal
 
-class WithdrawalRequestSerializer(serializers.ModelSerializer):
+class WithdrawalRecordSerializer(serializers.ModelSerializer):
+    # The per-source endpoints pass their source in the context; /api/withdrawals/ takes it from the request
     class Meta:
-        model = WithdrawalFromCashupBalance
-        fields = '__all__'
-        read_only_fields = ('buyer',)  # Make the buyer field read-only
+        model = Withdrawal
+        fields = ['id', 'source', 'amount', 'status', 'method', 'withdraw_number', 'date']
+        read_only_fields = ('status', 'date')  # Only staff approve or reject withdrawals
+
+    def get_fields(self):
+        fields = super().get_fields()
+        source = self.context.get('source')
+        if source:
+            fields.pop('source')
+            # Only main balance withdrawals are paid out to a mobile wallet
+            if source != 'main_balance':
+                fields.pop('method')
+                fields.pop('withdraw_number')
+        return fields
 
-    def to_representation(self, instance):
-        """Override to exclude 'buyer' from API response."""
-        representation = super().to_representation(instance)
-        representation.pop('buyer', None)  # Remove the 'buyer' field from the response
-        return representation
-
-    def create(self, validated_data):
-        # Set the buyer to the currently logged-in user
-        validated_data['buyer'] = self.context['request'].user
-        return super().create(validated_data)
-    
-from .models import WithdrawalFromMainBalance
-
-class WithdrawalFromMainBalanceSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = WithdrawalFromMainBalance
-        fields = '__all__'
-        read_only_fields = ('buyer',)  # Make the buyer field read-only
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Amount must be greater than zero.")
+        return value
 
-    
-    def to_representation(self, instance):
-        """Override to exclude 'buyer' from API response."""
-        representation = super().to_representation(instance)
-        representation.pop('buyer', None)  # Remove the 'buyer' field from the response
-        return representation
+    def validate(self, attrs):
+        source = self.context.get('source') or attrs['source']
+        if source != 'main_balance' and (attrs.get('method') or attrs.get('withdraw_number')):
+            raise serializers.ValidationError("Only main balance withdrawals take a method and withdraw number.")
+        return attrs
 
     def create(self, validated_data):
         # Set the buyer to the currently logged-in user
         validated_data['buyer'] = self.context['request'].user
+        validated_data.setdefault('source', self.context.get('source'))
         return super().create(validated_data)
+    
 
-
-from .models import Slider , CashupProfitHistory ,CashupOwingProfitHistory
+from .models import Slider , CashupProfitHistory ,CashupOwingProfitHistory, ProfitAccrual, OwingProfitAccrual
 
 class CashupProfitHistorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -485,6 +522,29 @@ class CashupProfitHistorySerializer(serializers.ModelSerializer):
         return representation
     
 
+class ProfitAccrualSerializer(serializers.ModelSerializer):
+    # Keep the keys the profit history endpoints have always returned
+    field_name = serializers.CharField(source='kind', read_only=True)
+    change_timestamp = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProfitAccrual
+        fields = ['field_name', 'previous_value', 'new_value', 'change_timestamp', 'amount', 'accrual_date']
+
+    def get_change_timestamp(self, instance):
+        # Same format as CashupProfitHistorySerializer; rows booked before
+        # credited_at was kept fall back to the start of the accrual day
+        from .accrual import day_start
+
+        timestamp = instance.credited_at or day_start(instance.accrual_date)
+        return timestamp.strftime('%Y-%m-%d %H:%M')
+
+
+class OwingProfitAccrualSerializer(ProfitAccrualSerializer):
+    class Meta(ProfitAccrualSerializer.Meta):
+        model = OwingProfitAccrual
+
+
 class CashupOwingProfitHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = CashupOwingProfitHistory
@@ -531,67 +591,6 @@ class CashupDepositHistorySerializer(serializers.ModelSerializer):
 
 
 
-from .models import WithdrawalFromCompoundingProfit
-class WithdrawalFromCompoundingProfitSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = WithdrawalFromCompoundingProfit
-        fields = '__all__'
-        read_only_fields = ('buyer',)  # Make the buyer field read-only
-
-    def to_representation(self, instance):
-        """Override to exclude 'buyer' from API response."""
-        representation = super().to_representation(instance)
-        representation.pop('buyer', None)  # Remove the 'buyer' field from the response
-        return representation
-
-    def create(self, validated_data):
-        # Set the buyer to the currently logged-in user
-        validated_data['buyer'] = self.context['request'].user
-        return super().create(validated_data)
-    
-from rest_framework import serializers
-from .models import WithdrawalFromDailyProfit
-
-class WithdrawalFromDailyProfitSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = WithdrawalFromDailyProfit
-        fields = '__all__'  # Include all fields in the model
-        read_only_fields = ('buyer',)  # Make the buyer field read-only
-
-    def to_representation(self, instance):
-        """Override to exclude 'buyer' from API response."""
-        representation = super().to_representation(instance)
-        representation.pop('buyer', None)  # Remove the 'buyer' field from the response
-        return representation
-
-    def create(self, validated_data):
-        # Set the buyer to the currently logged-in user
-        validated_data['buyer'] = self.context['request'].user
-        return super().create(validated_data)
-    
-from rest_framework import serializers
-from .models import WithdrawalFromAffiliateProfit
-
-class WithdrawalFromAffiliateProfitSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = WithdrawalFromAffiliateProfit
-        fields = '__all__'
-        read_only_fields = ('buyer',)  # Make the buyer field read-only to prevent external modification
-
-    def to_representation(self, instance):
-        """Override to exclude 'buyer' from API response."""
-        representation = super().to_representation(instance)
-        representation.pop('buyer', None)  # Remove the 'buyer' field from the response
-        return representation
-
-    def create(self, validated_data):
-        # Set the buyer to the currently logged-in user
-        validated_data['buyer'] = self.context['request'].user
-        return super().create(validated_data)
-
-
-
-
 from django.core.exceptions import ValidationError
 from .models import BuyerOTP
 
@@ -641,59 +640,13 @@ class ResetPasswordSerializer(serializers.Serializer):
 
 
 
-from rest_framework import serializers
-from .models import (
-    WithdrawalFromCompoundingProfit,
-    WithdrawalFromMainBalance,
-    WithdrawalFromCashupBalance,
-    WithdrawalFromDailyProfit,
-    WithdrawalFromAffiliateProfit
-)
-from rest_framework import serializers
-from .models import (
-    WithdrawalFromCompoundingProfit,
-    WithdrawalFromMainBalance,
-    WithdrawalFromCashupBalance,
-    WithdrawalFromDailyProfit,
-    WithdrawalFromAffiliateProfit
-)
-
-from rest_framework import serializers
-from .models import (
-    WithdrawalFromCompoundingProfit,
-    WithdrawalFromMainBalance,
-    WithdrawalFromCashupBalance,
-    WithdrawalFromDailyProfit,
-    WithdrawalFromAffiliateProfit
-)
-
-
-class WithdrawalSerializer(serializers.ModelSerializer):
-    buyer_name = serializers.CharField(source='buyer.name')
-    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
-    status = serializers.CharField()
-    date = serializers.DateTimeField()
-    method = serializers.CharField(required=False)  # Not all withdrawals have a method
-    withdraw_number = serializers.CharField(required=False)  # Not all withdrawals have a withdraw_number
-    withdrawal_type = serializers.SerializerMethodField()
-
-    def get_withdrawal_type(self, instance):
-        # Dynamically add withdrawal type based on the model instance
-        if isinstance(instance, WithdrawalFromCompoundingProfit):
-            return 'Compounding Profit'
-        elif isinstance(instance, WithdrawalFromMainBalance):
-            return 'Main Balance'
-        elif isinstance(instance, WithdrawalFromCashupBalance):
-            return 'Cashup Balance'
-        elif isinstance(instance, WithdrawalFromDailyProfit):
-            return 'Daily Profit'
-        elif isinstance(instance, WithdrawalFromAffiliateProfit):
-            return 'Affiliate Profit'
-        return None  # In case something goes wrong
+class WithdrawalHistorySerializer(serializers.ModelSerializer):
+    withdrawal_type = serializers.CharField(source='get_source_display', read_only=True)
+    buyer_name = serializers.CharField(source='buyer.name', read_only=True)
 
     class Meta:
-        model = WithdrawalFromCompoundingProfit  # Set any model here, it's not directly used for serialization
-        fields = ['buyer_name', 'amount', 'status', 'date', 'method', 'withdraw_number', 'withdrawal_type']
+        model = Withdrawal
+        fields = ['id', 'source', 'withdrawal_type', 'buyer_name', 'amount', 'status', 'date', 'method', 'withdraw_number']
 
 
 
@@ -742,4 +695,28 @@ class ChangePasswordSerializer(serializers.Serializer):
         return {"success": "Password updated successfully."}
 
 
+from .models import LedgerPosting
 
+class LedgerPostingSerializer(serializers.ModelSerializer):
+    bucket = serializers.CharField(source='account.bucket', read_only=True)
+    kind = serializers.CharField(source='transfer.kind', read_only=True)
+    memo = serializers.CharField(source='transfer.memo', read_only=True)
+
+    class Meta:
+        model = LedgerPosting
+        fields = ['bucket', 'amount', 'kind', 'memo', 'created_at']
+
+
+class BalanceSummarySerializer(serializers.Serializer):
+    buyer_id = serializers.IntegerField()
+    main_balance = serializers.DecimalField(max_digits=12, decimal_places=2)
+    membership_status = serializers.BooleanField()
+    cashup_main_balance = serializers.DecimalField(max_digits=12, decimal_places=2)
+    daily_profit = serializers.DecimalField(max_digits=12, decimal_places=2)
+    compounding_profit = serializers.DecimalField(max_digits=12, decimal_places=2)
+    affiliate_profit = serializers.DecimalField(max_digits=12, decimal_places=2)
+    cashup_owing_main_balance = serializers.DecimalField(max_digits=12, decimal_places=2)
+    cashup_owing_dps = serializers.DecimalField(max_digits=12, decimal_places=2)
+    requested_cashup_owing_main_balance = serializers.DecimalField(max_digits=12, decimal_places=2)
+    owing_daily_profit = serializers.DecimalField(max_digits=12, decimal_places=2)
+    owing_compounding_profit = serializers.DecimalField(max_digits=12, decimal_places=2)
@@ -0,0 +1,119 @@
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+# Cache keys: the summary is stored under the buyer's current version, so
+# bumping the version on a write makes every older summary unreachable
+SUMMARY_KEY = 'balance-summary:{buyer_id}:{generation}:{version}:{day}'
+VERSION_KEY = 'balance-summary-version:{buyer_id}'
+
+# Bumped when a write touches every buyer at once (accrual, rate changes)
+GENERATION_KEY = 'balance-summary-generation'
+
+ZERO = Decimal('0.00')
+
+
+def get_cache():
+    """The cache backend summaries live in (BALANCE_SUMMARY_CACHE, 'default' by default)."""
+    return caches[getattr(settings, 'BALANCE_SUMMARY_CACHE', 'default')]
+
+
+def summary_timeout():
+    return getattr(settings, 'BALANCE_SUMMARY_TIMEOUT', 60 * 60)
+
+
+def _counter(cache, key):
+    # A missing counter starts from the clock rather than 1, so an evicted
+    # counter never comes back to a version that still has a summary cached
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, time.time_ns(), None)
+        value = cache.get(key)
+    return value
+
+
+def _bump(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def invalidate(*buyer_ids):
+    """
+    Drop the cached summaries of the given buyers once the current
+    transaction commits (right away outside of one). Readers that loaded the
+    old balances before the commit cached them under the old version, which
+    nobody asks for again.
+    """
+    buyer_ids = {buyer_id for buyer_id in buyer_ids if buyer_id is not None}
+    if not buyer_ids:
+        return
+
+    def bump():
+        for buyer_id in buyer_ids:
+            _bump(VERSION_KEY.format(buyer_id=buyer_id))
+
+    transaction.on_commit(bump)
+
+
+def invalidate_all():
+    """Drop every cached summary once the current transaction commits."""
+    transaction.on_commit(lambda: _bump(GENERATION_KEY))
+
+
+def build_summary(buyer_id, today=None):
+    """Balances of one buyer, read from Buyer and the summed deposit rows."""
+    from .accrual import with_accrued_profit
+    from .models import Buyer, CashupDeposit, CashupOwingDeposit
+
+    buyer = Buyer.objects.filter(pk=buyer_id).values('main_balance', 'membership_status').first()
+    if buyer is None:
+        return None
+
+    def total(field):
+        return Coalesce(Sum(field), Value(ZERO))
+
+    cashup = with_accrued_profit(CashupDeposit.objects.filter(buyer_id=buyer_id), today).aggregate(
+        cashup_main_balance=total('cashup_main_balance'),
+        daily_profit=total('accrued_daily_profit'),
+        compounding_profit=total('compounding_profit'),
+        affiliate_profit=total('affiliate_profit'),
+    )
+    owing = CashupOwingDeposit.objects.filter(buyer_id=buyer_id).aggregate(
+        cashup_owing_main_balance=total('cashup_owing_main_balance'),
+        cashup_owing_dps=total('cashup_owing_dps'),
+        requested_cashup_owing_main_balance=total('requested_cashup_owing_main_balance'),
+        owing_daily_profit=total('daily_profit'),
+        owing_compounding_profit=total('compounding_profit'),
+    )
+    return {'buyer_id': buyer_id, **buyer, **cashup, **owing}
+
+
+def get_summary(buyer_id):
+    """
+    The cached balance summary of a buyer, built on a miss. The key carries
+    the date as well, since the accrued daily profit grows with it.
+    """
+    cache = get_cache()
+    today = timezone.localdate()
+    key = SUMMARY_KEY.format(
+        buyer_id=buyer_id,
+        generation=_counter(cache, GENERATION_KEY),
+        version=_counter(cache, VERSION_KEY.format(buyer_id=buyer_id)),
+        day=today.isoformat(),
+    )
+    summary = cache.get(key)
+    if summary is None:
+        summary = build_summary(buyer_id, today)
+        if summary is not None:
+            cache.set(key, summary, summary_timeout())
+    return summary
@@ -1,3 +1,1049 @@
-from django.test import TestCase
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import QuerySet, Sum
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .accrual import accrue_profit, accrue_shard, backfill_profit, day_start, with_accrued_profit
+from .business_days import (
+    CALENDAR_VERSION_KEY, bump_version, business_days, clear_calendar, get_calendar, is_business_day,
+    previous_business_day,
+)
+from .history import HistoryBuffer
+from .ledger import balance as ledger_balance, record_many
+from .models import (
+    AccrualCheckpoint, Buyer, BuyerTransaction, CashupDeposit, CashupDepositHistory, CashupOwingDeposit,
+    CashupProfitHistory, Item, LedgerPosting, OutboxEvent, ProfitAccrual, ProfitRateSchedule, PublicHoliday, Purchase,
+    Withdrawal,
+)
+from .money import apply_rate, apply_rate_array, from_poisha, poisha_array, to_poisha
+from .outbox import drain, purge, replay
+from .reconciliation import reconcile
+from .summary import get_summary, invalidate_all
+from .verification import verify_batch
+from .versioning import StaleVersion, VersionedMixin, retry_on_conflict
+from .rates import clear_rate_table, rate_on
+
+
+def make_buyer(username, main_balance='0.00'):
+    buyer = Buyer.objects.create(username=username, name=username, phone_number='01712345678')
+    Buyer.objects.filter(pk=buyer.pk).update(main_balance=Decimal(main_balance))
+    buyer.refresh_from_db()
+    return buyer
+
+
+def make_deposit(balance='1000.00', last_updated=None, created_at=None):
+    # Set the dates with an UPDATE, since created_at is auto_now_add
+    deposit = CashupDeposit.objects.create(cashup_main_balance=Decimal(balance))
+    CashupDeposit.objects.filter(pk=deposit.pk).update(last_updated=last_updated, created_at=created_at)
+    return deposit.pk
+
+
+def page_through(client, url, **params):
+    """Follow the `next` cursors of a keyset-paginated endpoint; returns (rows, page count)."""
+    rows, pages = [], 0
+    while True:
+        response = client.get(url, params)
+        assert response.status_code == 200, response.data
+        rows += response.data['results']
+        pages += 1
+        if not response.data['next']:
+            return rows, pages
+        params['cursor'] = parse_qs(urlparse(response.data['next']).query)['cursor'][0]
+
+
+class AccrualTests(TestCase):
+    # 2026-09-01 is a Tuesday; Friday 4th and Saturday 5th are off days and
+    # the 8th is a holiday, so seven accrual days fall in 1st-10th
+    FIRST = date(2026, 9, 1)
+    LAST = date(2026, 9, 10)
+    ACCRUAL_DAYS = [date(2026, 9, day) for day in (1, 2, 3, 6, 7, 9, 10)]
+
+    def setUp(self):
+        clear_calendar()
+        clear_rate_table()
+        PublicHoliday.objects.create(date=date(2026, 9, 8), name="Holiday")
+        # Credited up to Monday 31st, and too young for compounding in the range
+        self.deposit = make_deposit(last_updated=day_start(date(2026, 8, 31)), created_at=day_start(date(2026, 8, 25)))
+
+    def test_credits_one_day_of_profit_to_due_deposits(self):
+        current = make_deposit(balance='500.00', last_updated=day_start(date(2026, 9, 9)))
+        credited = make_deposit(last_updated=day_start(self.LAST))
+
+        accrue_profit(self.LAST)
+
+        self.assertEqual(CashupDeposit.objects.get(pk=current).daily_profit, Decimal('1.00'))  # 0.2% of 500
+        self.assertEqual(CashupDeposit.objects.get(pk=current).last_updated, day_start(self.LAST))
+        self.assertEqual(CashupDeposit.objects.get(pk=credited).daily_profit, Decimal('0.00'))
+
+    def test_running_twice_for_a_date_credits_once(self):
+        current = make_deposit(last_updated=day_start(date(2026, 9, 9)))
+
+        accrue_profit(self.LAST)
+        accrue_profit(self.LAST)
+
+        self.assertEqual(CashupDeposit.objects.get(pk=current).daily_profit, Decimal('2.00'))
+
+    def test_each_credit_is_booked_in_the_ledger(self):
+        current = make_deposit(last_updated=day_start(date(2026, 9, 9)))
+        CashupDeposit.objects.filter(pk=current).update(daily_profit=Decimal('10.00'))
+
+        accrue_profit(self.LAST)
+
+        row = ProfitAccrual.objects.get(cashup_deposit_id=current)
+        self.assertEqual(
+            (row.accrual_date, row.kind, row.amount, row.previous_value, row.new_value),
+            (self.LAST, 'daily_profit', Decimal('2.00'), Decimal('10.00'), Decimal('12.00')),
+        )
+
+    def test_day_already_in_the_ledger_is_not_credited_again(self):
+        current = make_deposit(last_updated=day_start(date(2026, 9, 9)))
+        ProfitAccrual.objects.create(
+            cashup_deposit_id=current, accrual_date=self.LAST, kind='daily_profit', amount=Decimal('99.00'),
+        )
+
+        accrue_profit(self.LAST)
+
+        deposit = CashupDeposit.objects.get(pk=current)
+        self.assertEqual(deposit.daily_profit, Decimal('0.00'))
+        self.assertEqual(deposit.last_updated, day_start(self.LAST))
+
+    def test_profit_history_keeps_its_keys(self):
+        buyer = make_buyer('history')
+        deposit = CashupDeposit.objects.create(buyer=buyer, cashup_main_balance=Decimal('1000.00'))
+        CashupDeposit.objects.filter(pk=deposit.pk).update(last_updated=day_start(date(2026, 9, 9)), created_at=None)
+        accrue_profit(self.LAST)
+        client = APIClient()
+        client.force_authenticate(buyer)
+
+        response = client.get('/cashup-profit-history/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(response.data[0]),
+            {'field_name', 'previous_value', 'new_value', 'change_timestamp', 'amount', 'accrual_date'},
+        )
+        self.assertEqual(response.data[0]['field_name'], 'daily_profit')
+
+    def test_deposit_earns_from_the_day_after_creation(self):
+        new = make_deposit(created_at=day_start(date(2026, 9, 9)) + timedelta(hours=13))
+
+        accrue_profit(self.LAST)
+
+        self.assertEqual(
+            list(ProfitAccrual.objects.filter(cashup_deposit_id=new).values_list('accrual_date', flat=True)),
+            [self.LAST],
+        )
+        self.assertEqual(CashupDeposit.objects.get(pk=new).daily_profit, Decimal('2.00'))
+
+    def credited_days(self, pk):
+        return list(ProfitAccrual.objects.filter(
+            cashup_deposit_id=pk, kind='daily_profit',
+        ).order_by('accrual_date').values_list('accrual_date', flat=True))
+
+    def test_backfill_credits_each_accrual_day_once(self):
+        result = backfill_profit(self.FIRST, self.LAST)
+
+        deposit = CashupDeposit.objects.get(pk=self.deposit)
+        self.assertEqual(result['cashup']['deposits'], 1)
+        self.assertEqual(deposit.daily_profit, Decimal('14.00'))  # 0.2% of 1000 for seven days
+        self.assertEqual(deposit.last_updated, day_start(self.LAST))
+        self.assertEqual(self.credited_days(self.deposit), self.ACCRUAL_DAYS)
+
+        self.assertEqual(backfill_profit(self.FIRST, self.LAST)['cashup']['deposits'], 0)
+        self.assertEqual(CashupDeposit.objects.get(pk=self.deposit).daily_profit, Decimal('14.00'))
+
+    def test_daily_job_catches_up_missed_days(self):
+        self.assertEqual(accrue_profit(self.LAST)['cashup'], 7)
+
+        deposit = CashupDeposit.objects.get(pk=self.deposit)
+        self.assertEqual(deposit.daily_profit, Decimal('14.00'))
+        self.assertEqual(self.credited_days(self.deposit), self.ACCRUAL_DAYS)
+        self.assertTrue(AccrualCheckpoint.objects.filter(book='cashup', accrual_date=self.LAST).exists())
+
+        # A second run for the same date finds every shard checkpointed
+        self.assertEqual(accrue_profit(self.LAST)['cashup'], 0)
+        self.assertEqual(CashupDeposit.objects.get(pk=self.deposit).daily_profit, Decimal('14.00'))
+
+    def test_job_and_backfill_credit_the_same_amounts(self):
+        old = make_deposit(last_updated=day_start(date(2026, 8, 31)), created_at=day_start(date(2026, 6, 1)))
+        accrue_profit(self.LAST)
+        by_job = CashupDeposit.objects.filter(pk__in=[self.deposit, old]).order_by('pk')
+        by_job = list(by_job.values_list('daily_profit', 'compounding_profit'))
+
+        CashupDeposit.objects.filter(pk__in=[self.deposit, old]).update(
+            daily_profit=0, compounding_profit=0, last_updated=day_start(date(2026, 8, 31)),
+        )
+        ProfitAccrual.objects.all().delete()
+        backfill_profit(self.FIRST, self.LAST)
+        by_backfill = CashupDeposit.objects.filter(pk__in=[self.deposit, old]).order_by('pk')
+        self.assertEqual(list(by_backfill.values_list('daily_profit', 'compounding_profit')), by_job)
+        self.assertGreater(by_job[1][1], 0)  # The old deposit compounds
+
+    def test_daily_job_leaves_long_gaps_to_backfill(self):
+        stale = make_deposit(last_updated=day_start(date(2026, 6, 1)), created_at=day_start(date(2026, 5, 1)))
+
+        accrue_profit(self.LAST)
+
+        deposit = CashupDeposit.objects.get(pk=stale)
+        self.assertEqual(deposit.daily_profit, Decimal('0.00'))
+        self.assertEqual(deposit.last_updated, day_start(date(2026, 6, 1)))
+
+    def assertProjectionMatchesJob(self, pks):
+        projected = dict(
+            with_accrued_profit(CashupDeposit.objects.filter(pk__in=pks), self.LAST)
+            .values_list('pk', 'accrued_daily_profit')
+        )
+
+        accrue_profit(self.LAST)
+
+        credited = dict(CashupDeposit.objects.filter(pk__in=pks).values_list('pk', 'daily_profit'))
+        self.assertEqual(projected, credited)
+        return credited
+
+    def test_projection_matches_what_the_job_credits(self):
+        self.assertProjectionMatchesJob([
+            self.deposit,
+            make_deposit(created_at=day_start(date(2026, 9, 2)) + timedelta(hours=20)),
+            make_deposit(created_at=day_start(self.LAST) + timedelta(hours=1)),
+            make_deposit(last_updated=day_start(date(2026, 6, 1)), created_at=day_start(date(2026, 5, 1))),
+        ])
+
+    def test_projection_rounds_each_day_like_the_job(self):
+        # 0.2% of 1002.50 is 2.005, credited as 2.01 on each of the 7 days
+        uneven = make_deposit(balance='1002.50', last_updated=day_start(date(2026, 8, 31)))
+
+        credited = self.assertProjectionMatchesJob([uneven])
+
+        self.assertEqual(credited[uneven], Decimal('14.07'))
+
+    def test_projection_follows_rate_changes(self):
+        ProfitRateSchedule.objects.create(kind='daily_profit', effective_from=date(2026, 9, 7), rate=Decimal('0.0025'))
+        uneven = make_deposit(balance='1002.50', last_updated=day_start(date(2026, 8, 31)))
+
+        credited = self.assertProjectionMatchesJob([uneven])
+
+        # Four days at 2.01 and three at 2.51 (0.25% of 1002.50 is 2.50625)
+        self.assertEqual(credited[uneven], Decimal('15.57'))
+
+    def test_shards_credit_the_same_as_one_pass(self):
+        pks = [self.deposit] + [
+            make_deposit(balance='500.00', last_updated=day_start(date(2026, 8, 31))) for _ in range(3)
+        ]
+
+        accrue_profit(self.LAST, shard_size=1)
+
+        totals = CashupDeposit.objects.filter(pk__in=pks).aggregate(total=Sum('daily_profit'))
+        self.assertEqual(totals['total'], Decimal('14.00') + 3 * Decimal('7.00'))
+        self.assertEqual(AccrualCheckpoint.objects.filter(book='cashup', accrual_date=self.LAST).count(), 4)
+
+    def test_interrupted_run_resumes_with_unfinished_shards(self):
+        current = [make_deposit(last_updated=day_start(date(2026, 9, 9))) for _ in range(2)]
+        CashupDeposit.objects.filter(pk=self.deposit).delete()
+
+        # The first shard finished before the run stopped
+        self.assertEqual(accrue_shard('cashup', self.LAST, current[0], current[0]), 1)
+        credited = accrue_profit(self.LAST, shard_size=1)
+
+        self.assertEqual(credited['cashup'], 1)
+        profits = CashupDeposit.objects.filter(pk__in=current).values_list('daily_profit', flat=True)
+        self.assertEqual(list(profits), [Decimal('2.00'), Decimal('2.00')])
+
+
+class CalendarTests(TestCase):
+    def setUp(self):
+        clear_calendar()
+        clear_rate_table()
+        PublicHoliday.objects.create(date=date(2026, 9, 8), name="Holiday")
+
+    def test_index_matches_a_day_by_day_walk(self):
+        first, last = date(2026, 8, 25), date(2026, 9, 15)
+        days = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+        walked = [day for day in days if day.weekday() not in (4, 5) and day != date(2026, 9, 8)]
+
+        self.assertEqual(business_days(first, last), walked)
+        self.assertEqual(previous_business_day(date(2026, 9, 9)), date(2026, 9, 7))
+        self.assertEqual(previous_business_day(date(2026, 9, 6)), date(2026, 9, 3))
+
+    def test_dates_before_the_calendar_start_are_rejected(self):
+        with self.assertRaises(ValueError):
+            is_business_day(date(2023, 12, 31))
+        with self.assertRaises(ValueError):
+            get_calendar().days(date(2023, 12, 30), date(2024, 1, 2))
+
+    def test_holiday_added_by_another_process_is_seen_after_the_version_bump(self):
+        self.assertTrue(is_business_day(date(2026, 9, 9)))
+        # Another process adds a holiday: no signal runs here, only the
+        # shared version is bumped when its transaction commits
+        PublicHoliday.objects.bulk_create([PublicHoliday(date=date(2026, 9, 9), name="Holiday")])
+        self.assertTrue(is_business_day(date(2026, 9, 9)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_version(CALENDAR_VERSION_KEY)
+
+        self.assertFalse(is_business_day(date(2026, 9, 9)))
+
+    def test_rate_change_bumps_the_shared_version_on_commit(self):
+        self.assertEqual(rate_on('daily_profit', date(2026, 9, 9)), Decimal('0.002'))
+        version = cache.get('rate-table-version')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProfitRateSchedule.objects.create(kind='daily_profit', effective_from=date(2026, 9, 1), rate=Decimal('0.003'))
+
+        self.assertEqual(cache.get('rate-table-version'), version + 1)
+        self.assertEqual(rate_on('daily_profit', date(2026, 9, 9)), Decimal('0.003'))
+
+
+class ForecastTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(Buyer.objects.create(username='staff', is_staff=True, is_superuser=True))
+        make_deposit(last_updated=day_start(date(2026, 9, 1)))
+
+    def test_what_if_rate_outside_zero_to_one_is_rejected(self):
+        for value in ('NaN', 'Infinity', '-0.001', '1.5', '1e400', 'abc'):
+            with self.subTest(value=value):
+                response = self.client.get('/api/reports/profit-liability/', {'days': '30', 'daily_rate': value})
+                self.assertEqual(response.status_code, 400)
+
+    def test_what_if_rates_at_the_bounds_are_forecast(self):
+        response = self.client.get(
+            '/api/reports/profit-liability/', {'days': '3650', 'daily_rate': '1', 'compounding_rate': '0'},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['cashup']['compounding_profit'], Decimal('0.00'))
+        self.assertGreater(response.data[0]['cashup']['daily_profit'], Decimal('1000000.00'))
+
+
+class MoneyTests(TestCase):
+    def test_taka_converts_to_poisha_and_back(self):
+        self.assertEqual(to_poisha(Decimal('1002.50')), 100250)
+        self.assertEqual(to_poisha('0.07'), 7)
+        self.assertEqual(to_poisha(None), 0)
+        self.assertEqual(from_poisha(100250), Decimal('1002.50'))
+
+    def test_fractions_of_a_poisha_are_rejected(self):
+        with self.assertRaises(ValueError):
+            to_poisha(Decimal('0.005'))
+
+    def test_applying_a_rate_rounds_halves_away_from_zero(self):
+        # 0.2% of 1002.50 is 2.005 and of 1002.49 is 2.00498
+        self.assertEqual(apply_rate(100250, Decimal('0.002')), 201)
+        self.assertEqual(apply_rate(100249, Decimal('0.002')), 200)
+        self.assertEqual(apply_rate(-100250, Decimal('0.002')), -201)
+        self.assertEqual(
+            list(apply_rate_array(poisha_array(['1002.50', '1002.49']), Decimal('0.002'))), [201, 200],
+        )
+
+
+class TrackingTests(TestCase):
+    def setUp(self):
+        self.buyer = make_buyer('tracked')
+        self.deposit = CashupDeposit.objects.get(
+            pk=CashupDeposit.objects.create(buyer=self.buyer, cashup_main_balance=Decimal('1000.00')).pk,
+        )
+
+    def test_changes_are_diffed_against_the_loaded_values(self):
+        self.deposit.daily_profit = Decimal('2.00')
+        self.deposit.cashup_main_balance = Decimal('1500.00')
+
+        self.assertEqual(self.deposit.changed_fields(), {
+            'daily_profit': (Decimal('0.00'), Decimal('2.00')),
+            'cashup_main_balance': (Decimal('1000.00'), Decimal('1500.00')),
+        })
+        self.deposit.save()
+        self.assertEqual(self.deposit.changed_fields(), {})
+
+    def test_save_publishes_its_changes_without_reading_the_row_again(self):
+        self.deposit.daily_profit = Decimal('2.00')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.deposit.save()
+
+        rereads = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and 'myapi_cashupdeposit' in q['sql']]
+        self.assertEqual(rereads, [])
+        event = OutboxEvent.objects.get(object_id=self.deposit.pk)
+        self.assertEqual(event.payload['changes'], {'daily_profit': ['0.00', '2.00']})
+        self.assertEqual(event.payload['updated_by'], self.buyer.pk)
+
+    def test_new_deposit_reports_no_changes(self):
+        CashupDeposit.objects.create(buyer=self.buyer, cashup_main_balance=Decimal('10.00'))
+
+        self.assertFalse(OutboxEvent.objects.exists())
+
+
+class HistoryBufferTests(TestCase):
+    def test_flush_inserts_each_model_once_with_the_save_defaults(self):
+        buyer = make_buyer('buffered')
+        deposit = CashupDeposit.objects.create(buyer=buyer, cashup_main_balance=Decimal('1000.00'))
+        moment = datetime(2026, 9, 1, 6, 30, 45, 123, tzinfo=dt_timezone.utc)
+        buffer = HistoryBuffer()
+        for field in ('daily_profit', 'compounding_profit', 'monthly_profit'):
+            buffer.add(CashupProfitHistory(
+                cashup_deposit=deposit, field_name=field, previous_value=0, new_value=1, change_timestamp=moment,
+            ))
+        buffer.add(CashupDepositHistory(cashup_deposit=deposit, old_balance=0, new_balance=1000, change_amount=1000))
+
+        with self.assertNumQueries(2):
+            self.assertEqual(buffer.flush(), 4)
+
+        rows = CashupProfitHistory.objects.filter(cashup_deposit=deposit).values_list('change_timestamp', 'updated_by')
+        self.assertEqual(set(rows), {(moment.replace(second=0, microsecond=0), buyer.pk)})
+        self.assertEqual(buffer.flush(), 0)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.deposit = CashupDeposit.objects.get(
+            pk=CashupDeposit.objects.create(buyer=make_buyer('outbox'), cashup_main_balance=Decimal('1000.00')).pk,
+        )
+        self.deposit.daily_profit = Decimal('2.00')
+        self.deposit.cashup_main_balance = Decimal('1500.00')
+        self.deposit.save()
+        self.event = OutboxEvent.objects.get()
+
+    def test_drain_writes_the_history_of_each_event(self):
+        self.assertEqual(drain(), 1)
+
+        profit = CashupProfitHistory.objects.get(cashup_deposit_id=self.deposit.pk)
+        self.assertEqual(
+            (profit.field_name, profit.new_value, profit.outbox_event_id), ('daily_profit', 2, self.event.pk),
+        )
+        balance = CashupDepositHistory.objects.get(cashup_deposit_id=self.deposit.pk)
+        self.assertEqual((balance.change_amount, balance.outbox_event_id), (Decimal('500.00'), self.event.pk))
+        self.assertEqual(drain(), 0)
+
+    def test_replay_rebuilds_only_the_history_drained_from_the_outbox(self):
+        drain()
+        # Written before the outbox existed, but timestamped after the event
+        CashupProfitHistory.objects.create(
+            cashup_deposit_id=self.deposit.pk, field_name='monthly_profit', previous_value=0, new_value=5,
+            change_timestamp=self.event.created_at + timedelta(minutes=5),
+        )
+
+        self.assertEqual(replay(self.event.created_at), 1)
+        self.assertEqual(
+            list(CashupProfitHistory.objects.values_list('field_name', flat=True)), ['monthly_profit'],
+        )
+        self.assertFalse(CashupDepositHistory.objects.exists())
+
+        drain()
+        self.assertEqual(CashupProfitHistory.objects.count(), 2)
+        self.assertEqual(CashupDepositHistory.objects.count(), 1)
+
+    def test_replay_before_the_oldest_event_is_refused(self):
+        drain()
+
+        with self.assertRaises(ValueError):
+            replay(self.event.created_at - timedelta(seconds=1))
+        self.assertEqual(CashupProfitHistory.objects.count(), 1)
+
+    def test_purge_deletes_only_events_drained_before_the_cutoff(self):
+        pending = OutboxEvent.objects.create(topic='cashup_deposit', object_id=self.deposit.pk, payload={'changes': {}})
+        drain_time = self.event.created_at + timedelta(hours=1)
+        OutboxEvent.objects.filter(pk=self.event.pk).update(processed_at=drain_time)
+        OutboxEvent.objects.filter(pk=pending.pk).update(processed_at=None)
+
+        self.assertEqual(purge(drain_time), 0)
+        self.assertEqual(purge(drain_time + timedelta(seconds=1), batch_size=1), 1)
+        self.assertEqual(list(OutboxEvent.objects.values_list('pk', flat=True)), [pending.pk])
+
+
+class CheckoutTests(TestCase):
+
+    def setUp(self):
+        self.buyer = make_buyer('checkout', main_balance='500.00')
+        CashupDeposit.objects.create(buyer=self.buyer, cashup_main_balance=Decimal('0.00'))
+        item = Item.objects.create(name="Rice", price=100, discount_price=80, members_price=70)
+        self.purchases = [Purchase.objects.create(buyer=self.buyer, item=item, quantity=1) for _ in range(2)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def main_balance(self):
+        self.buyer.refresh_from_db()
+        return self.buyer.main_balance
+
+    def test_second_checkout_charges_nothing(self):
+        self.assertEqual(self.client.post('/api/checkout-details/').status_code, 201)
+        self.assertEqual(self.main_balance(), Decimal('340.00'))
+
+        self.assertEqual(self.client.post('/api/checkout-details/').status_code, 400)
+        self.assertEqual(self.main_balance(), Decimal('340.00'))
+
+    def test_checkout_racing_another_checkout_charges_nothing(self):
+        # Another checkout confirms the purchases after this one read them
+        original = QuerySet.first
+
+        def first(queryset):
+            Purchase.objects.filter(buyer=self.buyer).update(confirmed=True)
+            return original(queryset)
+
+        with mock.patch.object(QuerySet, 'first', autospec=True, side_effect=first):
+            response = self.client.post('/api/checkout-details/')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.main_balance(), Decimal('500.00'))
+        self.assertFalse(LedgerPosting.objects.filter(transfer__kind='purchase').exists())
+
+    def test_place_order_racing_another_order_charges_once(self):
+        purchase = self.purchases[0]
+        Purchase.objects.filter(pk=purchase.pk).update(discount_total_price=Decimal('80.00'))
+        original = QuerySet.first
+        racing = iter([True])
+
+        def first(queryset):
+            # The other request confirms and pays right after this one loaded the purchase
+            row = original(queryset)
+            if next(racing, False):
+                self.assertEqual(self.client.get(f'/api/place-order/{purchase.pk}').status_code, 200)
+            return row
+
+        with mock.patch.object(QuerySet, 'first', autospec=True, side_effect=first):
+            response = self.client.get(f'/api/place-order/{purchase.pk}')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.main_balance(), Decimal('420.00'))
+
+
+class IdempotencyTests(TestCase):
+
+    def setUp(self):
+        self.buyer = make_buyer('idempotent', main_balance='100.00')
+        CashupDeposit.objects.create(buyer=self.buyer, cashup_main_balance=Decimal('0.00'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def transfer(self, amount='40.00', key='key-1'):
+        return self.client.post(
+            '/api/transfer-to-cashup-deposit/', {'amount': amount}, format='json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_the_first_response(self):
+        first = self.transfer()
+        second = self.transfer()
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.main_balance, Decimal('60.00'))
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.transfer()
+        self.assertEqual(self.transfer(amount='10.00').status_code, 422)
+
+    def test_conflict_is_not_replayed(self):
+        with mock.patch.object(VersionedMixin, '_do_update', autospec=True, side_effect=StaleVersion):
+            self.assertEqual(self.transfer().status_code, 409)
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.main_balance, Decimal('100.00'))
+
+        retry = self.transfer()
+        self.assertEqual(retry.status_code, 200)
+        self.assertFalse(retry.has_header('Idempotent-Replayed'))
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.main_balance, Decimal('60.00'))
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.buyer = make_buyer('ledger')
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def test_statement_pages_through_postings_made_at_the_same_time(self):
+        # One batch: every posting has the same created_at
+        record_many('deposit', [
+            ([(self.buyer, 'main_balance', Decimal(n))], f'deposit {n}') for n in range(1, 6)
+        ], contra='external')
+
+        memos, params, pages = [], {'page_size': 2}, 0
+        while True:
+            response = self.client.get('/api/ledger/statement/', params)
+            self.assertEqual(response.status_code, 200)
+            memos += [posting['memo'] for posting in response.data['results']]
+            pages += 1
+            if not response.data['next']:
+                break
+            params['cursor'] = parse_qs(urlparse(response.data['next']).query)['cursor'][0]
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(memos, [f'deposit {n}' for n in range(5, 0, -1)])
+
+    def test_deposits_keep_the_ledger_balanced(self):
+        for amount in ('100.00', '25.50'):
+            self.assertEqual(self.client.post('/api/deposit/', {'amount': amount}, format='json').status_code, 200)
+
+        self.assertEqual(ledger_balance(self.buyer, 'main_balance'), Decimal('125.50'))
+        out = StringIO()
+        call_command('check_ledger', stdout=out)
+        self.assertNotIn("do not sum to zero", out.getvalue())
+        self.assertIn("Ledger balances match the balance columns.", out.getvalue())
+
+
+class SummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.buyer = make_buyer('summary', main_balance='100.00')
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def main_balance(self):
+        response = self.client.get('/api/balance-summary/')
+        self.assertEqual(response.status_code, 200)
+        return Decimal(response.data['main_balance'])
+
+    def test_summary_is_served_from_the_cache_until_a_write_commits(self):
+        self.assertEqual(self.main_balance(), Decimal('100.00'))
+        # A write that bypasses the balance service is not seen
+        Buyer.objects.filter(pk=self.buyer.pk).update(main_balance=Decimal('999.00'))
+        self.assertEqual(self.main_balance(), Decimal('100.00'))
+        Buyer.objects.filter(pk=self.buyer.pk).update(main_balance=Decimal('100.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/deposit/', {'amount': '50.00'}, format='json')
+
+        self.assertEqual(self.main_balance(), Decimal('150.00'))
+
+    def test_invalidate_all_drops_every_buyer_summary(self):
+        other = make_buyer('other-summary', main_balance='10.00')
+        self.assertEqual(get_summary(other.pk)['main_balance'], Decimal('10.00'))
+        self.assertEqual(self.main_balance(), Decimal('100.00'))
+        Buyer.objects.update(main_balance=Decimal('1.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_all()
+
+        self.assertEqual(get_summary(other.pk)['main_balance'], Decimal('1.00'))
+        self.assertEqual(self.main_balance(), Decimal('1.00'))
+
+
+class VerificationTests(TestCase):
+
+    def make_transactions(self, username):
+        buyer = make_buyer(username)
+        CashupOwingDeposit.objects.create(
+            buyer=buyer, cashup_owing_main_balance=Decimal('100.00'), cashup_owing_dps=Decimal('30.00'),
+            requested_cashup_owing_main_balance=Decimal('0.00'),
+        )
+        return buyer, [
+            BuyerTransaction.objects.create(buyer=buyer, transaction_id=f'{username}-{n}', amount=Decimal(amount))
+            for n, amount in enumerate(['50.00', '200.00'])
+        ]
+
+    def balances(self, buyer):
+        buyer.refresh_from_db()
+        owing = CashupOwingDeposit.objects.get(buyer=buyer)
+        cashup = CashupDeposit.objects.get(buyer=buyer)
+        return buyer.main_balance, owing.cashup_owing_main_balance, owing.cashup_owing_dps, cashup.cashup_main_balance
+
+    def test_bulk_verification_matches_saving_each_transaction(self):
+        one_by_one, transactions = self.make_transactions('saved')
+        for t in transactions:
+            t.verified = True
+            t.save()
+        bulk, transactions = self.make_transactions('bulk')
+        verify_batch([t.id for t in transactions])
+
+        self.assertEqual(self.balances(bulk), self.balances(one_by_one))
+        self.assertEqual(self.balances(bulk), (Decimal('140.00'), Decimal('0.00'), Decimal('0.00'), Decimal('30.00')))
+        self.assertEqual(verify_batch([t.id for t in transactions]), [])
+
+    def test_verified_payments_keep_the_ledger_balanced(self):
+        buyer, transactions = self.make_transactions('ledger')
+        verify_batch([t.id for t in transactions])
+
+        self.assertEqual(LedgerPosting.objects.aggregate(total=Sum('amount'))['total'], 0)
+        main_balance, owing, dps, cashup = self.balances(buyer)
+        self.assertEqual(ledger_balance(buyer, 'main_balance'), main_balance)
+        self.assertEqual(ledger_balance(buyer, 'cashup_main_balance'), cashup)
+        self.assertEqual(ledger_balance(buyer, 'cashup_owing_main_balance'), owing - Decimal('100.00'))
+        self.assertEqual(ledger_balance(buyer, 'cashup_owing_dps'), dps - Decimal('30.00'))
+
+        out = StringIO()
+        call_command('check_ledger', stdout=out)
+        self.assertNotIn("do not sum to zero", out.getvalue())
+
+
+class ReconciliationTests(TestCase):
+    STATEMENT = [
+        'TrxID,Amount',
+        'TRX1,100.00',
+        'trx2,60.00',
+        'TRX3,70.00',
+        'TRX4,10.00',
+        'TRX9,5.00',
+        'TRX1,100.00',
+        ',abc',
+    ]
+
+    def setUp(self):
+        buyer = make_buyer('reconciled')
+        CashupOwingDeposit.objects.create(
+            buyer=buyer, cashup_owing_main_balance=Decimal('0.00'), requested_cashup_owing_main_balance=Decimal('0.00'),
+        )
+        for transaction_id, amount, method, verified in [
+            ('TRX1', '100.00', 'Bkash', False),
+            ('TRX2', '50.00', 'Bkash', False),
+            ('TRX3', '70.00', 'Nagad', False),
+            ('TRX4', '10.00', 'Bkash', True),
+        ]:
+            BuyerTransaction.objects.create(
+                buyer=buyer, transaction_id=transaction_id, amount=Decimal(amount), method=method, verified=verified,
+            )
+
+    def test_each_row_is_matched_across_chunks(self):
+        report = []
+        totals = reconcile(self.STATEMENT, 'Bkash', report=report.append, chunk_size=2)
+
+        self.assertEqual(
+            [(row['line'], row['outcome']) for row in report],
+            [
+                (2, 'matched'), (3, 'amount_mismatch'), (4, 'method_mismatch'), (5, 'already_verified'),
+                (6, 'not_found'), (7, 'duplicate'), (8, 'invalid'),
+            ],
+        )
+        self.assertEqual(totals['matched'], 1)
+        self.assertFalse(BuyerTransaction.objects.get(transaction_id='TRX1').verified)
+
+    def test_verify_verifies_only_the_matched_transactions(self):
+        totals = reconcile(self.STATEMENT, 'Bkash', verify=True, chunk_size=2)
+
+        self.assertEqual(totals['verified'], 1)
+        self.assertEqual(
+            set(BuyerTransaction.objects.filter(verified=True).values_list('transaction_id', flat=True)),
+            {'TRX1', 'TRX4'},
+        )
+
+
+class VersionTests(TestCase):
+
+    def test_saving_a_stale_row_raises(self):
+        pk = make_deposit()
+        first = CashupDeposit.objects.get(pk=pk)
+        second = CashupDeposit.objects.get(pk=pk)
+        first.cashup_main_balance += 10
+        first.save()
+
+        second.cashup_main_balance += 20
+        with self.assertRaises(StaleVersion), transaction.atomic():
+            second.save()
+        self.assertEqual(CashupDeposit.objects.get(pk=pk).cashup_main_balance, Decimal('1010.00'))
+
+    def test_retry_on_conflict_runs_again_until_it_succeeds(self):
+        calls = []
+
+        @retry_on_conflict
+        def write():
+            calls.append(1)
+            if len(calls) < 3:
+                raise StaleVersion()
+            return 'done'
+
+        self.assertEqual(write(), 'done')
+        self.assertEqual(len(calls), 3)
+
+    def test_transfer_retried_after_a_conflict_debits_once(self):
+        buyer = make_buyer('transfer', main_balance='100.00')
+        CashupDeposit.objects.create(buyer=buyer, cashup_main_balance=Decimal('0.00'))
+        client = APIClient()
+        client.force_authenticate(buyer)
+
+        # The first deposit write loses a race, the retry goes through
+        original = VersionedMixin._do_update
+        conflicts = iter([True])
+
+        def update(instance, *args):
+            if next(conflicts, False):
+                raise StaleVersion()
+            return original(instance, *args)
+
+        with mock.patch.object(VersionedMixin, '_do_update', autospec=True, side_effect=update):
+            response = client.post('/api/transfer-to-cashup-deposit/', {'amount': '40.00'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        buyer.refresh_from_db()
+        self.assertEqual(buyer.main_balance, Decimal('60.00'))
+        self.assertEqual(CashupDeposit.objects.get(buyer=buyer).cashup_main_balance, Decimal('40.00'))
+
+
+class HistoryPagingTests(TestCase):
+    def setUp(self):
+        self.buyer = make_buyer('paged')
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def test_pages_of_rows_with_the_same_date_neither_repeat_nor_skip(self):
+        moment = datetime(2026, 9, 1, 6, tzinfo=dt_timezone.utc)
+        for n in range(5):
+            BuyerTransaction.objects.create(buyer=self.buyer, transaction_id=f'T{n}', amount=10, date=moment)
+        BuyerTransaction.objects.create(buyer=make_buyer('someone-else'), transaction_id='OTHER', amount=10)
+
+        rows, pages = page_through(self.client, '/buyer_transactions/', page_size=2)
+
+        self.assertEqual(pages, 3)
+        self.assertEqual([row['transaction_id'] for row in rows], [f'T{n}' for n in range(4, -1, -1)])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get('/buyer_transactions/', {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(response.status_code, 404)
+
+
+class WithdrawalHistoryTests(TestCase):
+    def setUp(self):
+        self.buyer = make_buyer('withdrawing')
+        self.other = make_buyer('other-withdrawing')
+        moment = datetime(2026, 9, 1, 6, tzinfo=dt_timezone.utc)
+        for source in ('main_balance', 'daily_profit', 'compounding_profit', 'affiliate_profit', 'cashup_balance'):
+            Withdrawal.objects.create(buyer=self.buyer, source=source, amount=10, date=moment)
+        Withdrawal.objects.create(buyer=self.other, source='main_balance', amount=99)
+        self.client = APIClient()
+
+    def test_buyer_pages_through_own_withdrawals_from_every_source(self):
+        self.client.force_authenticate(self.buyer)
+
+        rows, pages = page_through(self.client, '/withdrawal-history/', page_size=2)
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(len({row['source'] for row in rows}), 5)
+        self.assertEqual([row['id'] for row in rows], sorted((row['id'] for row in rows), reverse=True))
+        self.assertEqual({row['buyer_name'] for row in rows}, {'withdrawing'})
+
+    def test_staff_can_look_at_one_buyer(self):
+        self.client.force_authenticate(Buyer.objects.create(username='staff', is_staff=True))
+
+        rows, _ = page_through(self.client, '/withdrawal-history/', buyer=self.other.pk)
+        self.assertEqual([row['amount'] for row in rows], ['99.00'])
+        self.assertEqual(self.client.get('/withdrawal-history/', {'buyer': 'me'}).status_code, 400)
+
+
+class ConfirmedBuyersTests(TestCase):
+    def setUp(self):
+        self.buyer = make_buyer('confirmed')
+        rice = Item.objects.create(name="Rice", price=100, discount_price=80, members_price=70)
+        oil = Item.objects.create(name="Oil", price=200, discount_price=180, members_price=170)
+        self.purchases = [
+            Purchase.objects.create(buyer=self.buyer, item=item, quantity=1, confirmed=True).pk
+            for item in (oil, rice, rice, oil, rice)
+        ]
+        # save() needs an item, so clear it afterwards
+        Purchase.objects.filter(pk__in=[self.purchases[2], self.purchases[4]]).update(item=None)
+        Purchase.objects.create(buyer=self.buyer, item=rice, quantity=1)  # Not confirmed
+        self.items = (rice.pk, oil.pk)
+        self.client = APIClient()
+
+    def test_existing_endpoint_keeps_its_flat_shape(self):
+        self.client.force_authenticate(self.buyer)
+
+        response = self.client.get('/api/confirmed-buyersforproduct/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(set(response.data[0]), {'product', 'confirmed_buyer'})
+        self.assertNotIn('gender', response.data[0]['confirmed_buyer'])
+
+    def test_report_groups_every_confirmed_purchase_by_item(self):
+        self.client.force_authenticate(Buyer.objects.create(username='staff', is_staff=True))
+
+        groups, pages = page_through(self.client, '/api/reports/confirmed-buyers/', page_size=2)
+
+        self.assertEqual(pages, 3)
+        # Items in id order, split where a page ends, and item-less purchases last
+        rice, oil = self.items
+        self.assertEqual(
+            [(group['item'] and group['item']['id'], [b['purchase_id'] for b in group['buyers']]) for group in groups],
+            [
+                (rice, [self.purchases[1]]),
+                (oil, [self.purchases[0]]),
+                (oil, [self.purchases[3]]),
+                (None, [self.purchases[2]]),
+                (None, [self.purchases[4]]),
+            ],
+        )
+
+    def test_report_is_for_staff(self):
+        self.client.force_authenticate(self.buyer)
+
+        self.assertEqual(self.client.get('/api/reports/confirmed-buyers/').status_code, 403)
+
+
+class BuyerPurchasesTests(TestCase):
+    def setUp(self):
+        self.buyer = make_buyer('purchasing')
+        item = Item.objects.create(name="Rice", price=100, discount_price=80, members_price=70)
+        self.purchases = [
+            Purchase.objects.create(buyer=self.buyer, item=item, quantity=2, confirmed=True, paid=True).pk
+            for _ in range(3)
+        ]
+        # save() prices the purchase from the item, so set the prices afterwards
+        Purchase.objects.filter(pk__in=self.purchases).update(total_price=100, discount_rate=10)
+        # Purchases made before created_at was recorded
+        Purchase.objects.filter(pk__in=self.purchases[:2]).update(created_at=None)
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def test_pages_run_newest_first_through_purchases_without_a_date(self):
+        ids, params = [], {'page_size': 1}
+        while True:
+            response = self.client.get('/api/buyer-purchases/', params)
+            self.assertEqual(response.status_code, 200)
+            ids += [product['product']['id'] for product in response.data['products']]
+            # Every page totals all the paid purchases: 3 x 2 x (100 less 10%)
+            self.assertEqual(response.data['total_cost'], Decimal('540'))
+            if not response.data['next']:
+                break
+            params['cursor'] = parse_qs(urlparse(response.data['next']).query)['cursor'][0]
+
+        self.assertEqual(ids, self.purchases[::-1])
+
+    def test_without_paging_every_purchase_is_listed(self):
+        response = self.client.get('/api/buyer-purchases/')
+
+        self.assertEqual([product['product']['id'] for product in response.data['products']], self.purchases)
+        self.assertNotIn('next', response.data)
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Runs each test with the schema at `before`; migrate_to(`after`) applies the migration under test."""
+    before = None
+    after = None
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        self.apps = executor.loader.project_state(self.before).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate_to(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(target)
+        return executor.loader.project_state(target).apps
+
+
+class LegacyWithdrawalMigrationTests(MigrationTestCase):
+    before = [('myapi', '0058_withdrawal')]
+    after = [('myapi', '0059_copy_legacy_withdrawals')]
+
+    def test_every_legacy_row_is_copied(self):
+        buyer = self.apps.get_model('myapi', 'Buyer').objects.create(
+            username='legacy', name='legacy', phone_number='01712345678', password='',
+        )
+        legacy = {
+            'WithdrawalFromMainBalance': ('main_balance', {'method': 'Nagad', 'withdraw_number': '01712345678'}),
+            'WithdrawalFromCashupBalance': ('cashup_balance', {}),
+            'WithdrawalFromDailyProfit': ('daily_profit', {}),
+            'WithdrawalFromCompoundingProfit': ('compounding_profit', {}),
+            'WithdrawalFromAffiliateProfit': ('affiliate_profit', {}),
+        }
+        ids = {}
+        for model_name, (source, extra) in legacy.items():
+            model = self.apps.get_model('myapi', model_name)
+            # Identical rows, and ids that repeat across the tables, are all kept
+            rows = [
+                model.objects.create(buyer=buyer, amount=Decimal('25.00'), status=status, **extra)
+                for status in ('Pending', 'Approved', 'Approved')
+            ]
+            ids[source] = sorted(row.id for row in rows)
+
+        apps = self.migrate_to(self.after)
+
+        Withdrawal = apps.get_model('myapi', 'Withdrawal')
+        self.assertEqual(Withdrawal.objects.count(), 15)
+        for source, legacy_ids in ids.items():
+            copied = Withdrawal.objects.filter(source=source)
+            self.assertEqual(sorted(copied.values_list('legacy_id', flat=True)), legacy_ids)
+            self.assertEqual(copied.filter(status='Approved').count(), 2)
+        main = Withdrawal.objects.filter(source='main_balance').first()
+        self.assertEqual((main.method, main.withdraw_number), ('Nagad', '01712345678'))
+        # Copying does not pay the approved withdrawals out again
+        self.assertEqual(apps.get_model('myapi', 'Buyer').objects.get(username='legacy').main_balance, Decimal('0.00'))
+
+
+class ProfitHistoryMigrationTests(MigrationTestCase):
+    before = [('myapi', '0061_profit_accrual_values')]
+    after = [('myapi', '0062_copy_profit_history')]
+
+    def log(self, deposit, field_name, previous_value, new_value, when):
+        self.apps.get_model('myapi', 'CashupProfitHistory').objects.create(
+            cashup_deposit=deposit, field_name=field_name, previous_value=Decimal(previous_value),
+            new_value=Decimal(new_value), change_timestamp=when,
+        )
+
+    def test_only_legacy_accruals_up_to_last_updated_are_copied(self):
+        # 1000.00 at 0.2% a day; noon in Dhaka, 06:00 UTC
+        deposit = self.apps.get_model('myapi', 'CashupDeposit').objects.create(
+            cashup_main_balance=Decimal('1000.00'),
+            last_updated=datetime(2026, 9, 2, 6, tzinfo=dt_timezone.utc),
+        )
+        tuesday = datetime(2026, 9, 1, 6, tzinfo=dt_timezone.utc)
+        self.log(deposit, 'daily_profit', '10.00', '12.00', tuesday)
+        self.log(deposit, 'compounding_profit', '5.00', '7.02', tuesday)  # 0.2% of 1000 + 12
+        self.log(deposit, 'daily_profit', '12.00', '62.00', datetime(2026, 9, 2, 6, tzinfo=dt_timezone.utc))  # An edit
+        self.log(deposit, 'daily_profit', '62.00', '64.00', datetime(2026, 9, 4, 6, tzinfo=dt_timezone.utc))  # Friday
+        self.log(deposit, 'daily_profit', '64.00', '66.00', datetime(2026, 9, 6, 6, tzinfo=dt_timezone.utc))  # Not credited yet
+
+        apps = self.migrate_to(self.after)
+
+        copied = apps.get_model('myapi', 'ProfitAccrual').objects.order_by('kind')
+        self.assertEqual(
+            list(copied.values_list('accrual_date', 'kind', 'amount', 'new_value')),
+            [
+                (date(2026, 9, 1), 'compounding_profit', Decimal('2.02'), Decimal('7.02')),
+                (date(2026, 9, 1), 'daily_profit', Decimal('2.00'), Decimal('12.00')),
+            ],
+        )
+
+
+class LinkDrainedHistoryMigrationTests(MigrationTestCase):
+    before = [('myapi', '0062_copy_profit_history')]
+    after = [('myapi', '0063_history_outbox_event')]
+
+    def test_drained_rows_are_linked_to_their_events(self):
+        deposit = self.apps.get_model('myapi', 'CashupDeposit').objects.create(cashup_main_balance=Decimal('1500.00'))
+        created_at = datetime(2026, 9, 1, 6, 30, 45, tzinfo=dt_timezone.utc)
+        event = self.apps.get_model('myapi', 'OutboxEvent').objects.create(
+            topic='cashup_deposit', object_id=deposit.pk, created_at=created_at, processed_at=created_at,
+            payload={'updated_by': None, 'changes': {
+                'daily_profit': ['0.00', '2.00'], 'cashup_main_balance': ['1000.00', '1500.00'],
+            }},
+        )
+        profit_history = self.apps.get_model('myapi', 'CashupProfitHistory').objects
+        profit_history.create(
+            cashup_deposit=deposit, field_name='daily_profit', previous_value=0, new_value=2,
+            change_timestamp=created_at.replace(second=0),
+        )
+        profit_history.create(  # Written before the outbox
+            cashup_deposit=deposit, field_name='daily_profit', previous_value=2, new_value=4,
+            change_timestamp=created_at.replace(second=0),
+        )
+        self.apps.get_model('myapi', 'CashupDepositHistory').objects.create(
+            cashup_deposit=deposit, old_balance=1000, new_balance=1500, change_amount=500, changed_at=created_at,
+        )
+
+        apps = self.migrate_to(self.after)
+
+        self.assertEqual(
+            sorted(apps.get_model('myapi', 'CashupProfitHistory').objects.values_list('new_value', 'outbox_event_id')),
+            [(Decimal('2.00'), event.pk), (Decimal('4.00'), None)],
+        )
+        self.assertEqual(
+            list(apps.get_model('myapi', 'CashupDepositHistory').objects.values_list('outbox_event_id', flat=True)),
+            [event.pk],
+        )
@@ -0,0 +1,54 @@
+class TrackedFieldsMixin:
+    """
+    Model mixin that remembers the values of `tracked_fields` as they were
+    loaded from the database, so signal receivers can diff a save in memory
+    instead of fetching the row again.
+
+    The snapshot is taken in `from_db` and moved forward after every save and
+    refresh. Instances built in memory have no snapshot until their first
+    save, so creating a row reports no changes.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {}
+        instance._take_snapshot()
+        return instance
+
+    def _take_snapshot(self, fields=None):
+        # Deferred fields are not in __dict__ and are snapshotted when loaded
+        if not hasattr(self, '_loaded_values'):
+            self._loaded_values = {}
+        for field in fields or self.tracked_fields:
+            if field in self.tracked_fields and field in self.__dict__:
+                self._loaded_values[field] = self.__dict__[field]
+
+    def loaded_value(self, field, default=None):
+        """Value of a tracked field when the instance was loaded or last saved."""
+        return getattr(self, '_loaded_values', {}).get(field, default)
+
+    def changed_fields(self, fields=None):
+        """
+        Map each tracked field whose value differs from the snapshot to its
+        (previous_value, new_value).
+        """
+        loaded = getattr(self, '_loaded_values', {})
+        changes = {}
+        for field in fields or self.tracked_fields:
+            if field not in loaded or field not in self.__dict__:
+                continue
+            previous_value, new_value = loaded[field], self.__dict__[field]
+            if previous_value != new_value:
+                changes[field] = (previous_value, new_value)
+        return changes
+
+    def save(self, *args, **kwargs):
+        # post_save receivers still see the snapshot from before this save
+        super().save(*args, **kwargs)
+        self._take_snapshot(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._take_snapshot(fields)
@@ -0,0 +1,172 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+
+from . import ledger, outbox
+from .summary import invalidate
+
+
+ZERO = Decimal('0.00')
+
+# Transactions verified per batch; each batch is one transaction
+BATCH_SIZE = 1000
+
+
+def split_payment(amount, owing_main_balance, owing_dps):
+    """
+    Split a verified payment between the buyer's balances.
+
+    While the buyer owes (cashup_owing_main_balance > 0), the payment first
+    clears the DPS, which moves to the cashup main balance; what is left pays
+    off the owing balance and is credited to the main balance, together with
+    anything beyond what is owed. A buyer who owes nothing gets the whole
+    amount on the main balance.
+
+    Returns (owing_main_balance, owing_dps, cashup_credit, main_credit) after
+    the payment.
+    """
+    if owing_main_balance <= 0:
+        return owing_main_balance, owing_dps, ZERO, amount
+
+    if amount <= owing_dps:
+        return owing_main_balance, owing_dps - amount, amount, ZERO
+
+    remaining = amount - owing_dps
+    if remaining <= owing_main_balance:
+        return owing_main_balance - remaining, ZERO, owing_dps, remaining
+    return ZERO, ZERO, owing_dps, remaining - owing_main_balance
+
+
+def _awards_referral(buyer):
+    # CashupDeposit.save() pays the referrer's affiliate profit the first time
+    # the referred buyer's deposit is saved; such deposits go through save()
+    code = buyer.referral_code_used
+    return bool(code and code.is_valid and code.is_used and not code.affiliate_profit_awarded)
+
+
+def verify_batch(transaction_ids):
+    """
+    Verify the given pending BuyerTransactions with the same effect as
+    saving each of them with verified=True, in one transaction.
+
+    The transactions, their buyers and deposits are loaded with a few
+    queries, the DPS/owing/main balance split is applied in memory in date
+    order, and everything is written back with bulk updates. Transactions
+    that are already verified are skipped. Returns the verified transactions.
+    """
+    from .models import Buyer, BuyerTransaction, CashupDeposit, CashupOwingDeposit, TransferHistory
+
+    with transaction.atomic():
+        pending = list(
+            BuyerTransaction.objects.filter(id__in=list(transaction_ids), verified=False)
+            .select_related('buyer__referral_code_used')
+            .select_for_update(of=('self',))
+            .order_by('date', 'id')
+        )
+        if not pending:
+            return []
+        buyers = {t.buyer_id: t.buyer for t in pending}
+
+        # Like BuyerTransaction.save(): the buyer's first owing and cashup
+        # deposit, created at a zero balance when missing
+        owing = {}
+        for deposit in CashupOwingDeposit.objects.filter(buyer_id__in=buyers).order_by('-id').select_for_update():
+            owing[deposit.buyer_id] = deposit
+        missing = [buyer_id for buyer_id in buyers if buyer_id not in owing]
+        if missing:
+            CashupOwingDeposit.objects.bulk_create([
+                CashupOwingDeposit(
+                    buyer_id=buyer_id, updated_by_id=buyer_id, cashup_owing_main_balance=ZERO,
+                    requested_cashup_owing_main_balance=ZERO, verified=False,
+                )
+                for buyer_id in missing
+            ])
+            for deposit in CashupOwingDeposit.objects.filter(buyer_id__in=missing).order_by('-id'):
+                owing[deposit.buyer_id] = deposit
+
+        cashup = {}
+        for deposit in CashupDeposit.objects.filter(buyer_id__in=buyers).order_by('-id').select_for_update():
+            cashup[deposit.buyer_id] = deposit
+        missing = [buyer_id for buyer_id in buyers if buyer_id not in cashup]
+        if missing:
+            CashupDeposit.objects.bulk_create([
+                CashupDeposit(buyer_id=buyer_id, updated_by_id=buyer_id, cashup_main_balance=ZERO)
+                for buyer_id in missing
+            ])
+            for deposit in CashupDeposit.objects.filter(buyer_id__in=missing).order_by('-id'):
+                cashup[deposit.buyer_id] = deposit
+
+        main_credits = defaultdict(Decimal)
+        transfers = []
+        for t in pending:
+            owing_deposit = owing[t.buyer_id]
+            cashup_deposit = cashup[t.buyer_id]
+            owing_main_balance, owing_dps, cashup_credit, main_credit = split_payment(
+                t.amount, owing_deposit.cashup_owing_main_balance, owing_deposit.cashup_owing_dps,
+            )
+            changes = [
+                (t.buyer, 'cashup_owing_dps', owing_dps - owing_deposit.cashup_owing_dps),
+                (t.buyer, 'cashup_owing_main_balance', owing_main_balance - owing_deposit.cashup_owing_main_balance),
+                (t.buyer, 'cashup_main_balance', cashup_credit),
+                (t.buyer, 'main_balance', main_credit),
+            ]
+            owing_deposit.cashup_owing_main_balance = owing_main_balance
+            owing_deposit.cashup_owing_dps = owing_dps
+            cashup_deposit.cashup_main_balance += cashup_credit
+            main_credits[t.buyer_id] += main_credit
+            transfers.append((changes, t.transaction_id))
+            t.verified = True
+
+        # The deposits are locked, so the versions are bumped without a compare
+        for deposit in owing.values():
+            deposit.version += 1
+        CashupOwingDeposit.objects.bulk_update(
+            list(owing.values()), ['cashup_owing_main_balance', 'cashup_owing_dps', 'version'], batch_size=BATCH_SIZE,
+        )
+        TransferHistory.objects.filter(
+            cashup_owing_deposit__in=[d for d in owing.values() if d.requested_cashup_owing_main_balance == 0],
+            verified=False,
+        ).update(verified=True)
+
+        saved = [d for d in cashup.values() if _awards_referral(buyers[d.buyer_id])]
+        bulk = [d for d in cashup.values() if not _awards_referral(buyers[d.buyer_id])]
+        for deposit in saved:
+            deposit.buyer = buyers[deposit.buyer_id]
+            deposit.save()
+        for deposit in bulk:
+            deposit.version += 1
+        CashupDeposit.objects.bulk_update(bulk, ['cashup_main_balance', 'version'], batch_size=BATCH_SIZE)
+        for deposit in bulk:
+            # The history the post_save receiver would have written
+            changes = deposit.changed_fields(['cashup_main_balance'])
+            if changes:
+                outbox.publish('cashup_deposit', deposit, changes, updated_by=buyers[deposit.buyer_id])
+
+        members = {d.buyer_id for d in bulk if d.cashup_main_balance > 0}
+        Buyer.objects.filter(id__in=members).update(membership_status=True)
+        Buyer.objects.filter(id__in=[d.buyer_id for d in bulk if d.buyer_id not in members]).update(
+            membership_status=False,
+        )
+
+        credits = {buyer_id: amount for buyer_id, amount in main_credits.items() if amount}
+        if credits:
+            Buyer.objects.filter(id__in=credits).update(main_balance=F('main_balance') + Case(
+                *[When(id=buyer_id, then=Value(amount)) for buyer_id, amount in credits.items()],
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            ))
+
+        BuyerTransaction.objects.bulk_update(pending, ['verified'], batch_size=BATCH_SIZE)
+        ledger.record_many('verification', transfers, contra='external')
+        invalidate(*buyers)
+    return pending
+
+
+def verify_transactions(transaction_ids, batch_size=BATCH_SIZE):
+    """Run verify_batch over any number of ids, batch_size at a time. Returns the number verified."""
+    transaction_ids = list(transaction_ids)
+    verified = 0
+    for start in range(0, len(transaction_ids), batch_size):
+        verified += len(verify_batch(transaction_ids[start:start + batch_size]))
+    return verified
@@ -0,0 +1,62 @@
+import functools
+
+from django.db import transaction
+
+
+# Times a conflicting write is attempted before giving up
+MAX_ATTEMPTS = 3
+
+
+class StaleVersion(Exception):
+    """Raised when a row was changed by someone else since it was loaded."""
+
+
+class VersionedMixin:
+    """
+    Model mixin for optimistic concurrency on an integer `version` field.
+
+    save() of a loaded row only updates it if its version is still the one
+    that was loaded, and moves the version forward in the same UPDATE. If
+    another request wrote the row in between, nothing is written and
+    StaleVersion is raised, instead of the last writer silently undoing the
+    other write. Queryset updates of these models should bump `version`
+    as well (version=F('version') + 1).
+    """
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        field = self._meta.get_field('version')
+        loaded = self.version
+        values = [value for value in values if value[0] is not field] + [(field, None, loaded + 1)]
+
+        updated = super()._do_update(base_qs.filter(version=loaded), using, pk_val, values, update_fields, forced_update)
+        if updated:
+            self.version = loaded + 1
+        elif base_qs.filter(pk=pk_val).exists():
+            raise StaleVersion(f"{self._meta.object_name} {pk_val} was changed since version {loaded}.")
+        return updated
+
+
+def retry_on_conflict(func=None, *, attempts=MAX_ATTEMPTS, on_conflict=None):
+    """
+    Run `func` in a transaction, and again from the start (up to `attempts`
+    times) when it raises StaleVersion, so it reloads and re-checks the rows
+    it changes. `func` must load the rows it changes itself.
+
+    When every attempt conflicts, the result of `on_conflict()` is returned
+    if given, otherwise StaleVersion is raised.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(attempts):
+                try:
+                    with transaction.atomic():
+                        return func(*args, **kwargs)
+                except StaleVersion:
+                    if attempt == attempts - 1:
+                        if on_conflict is not None:
+                            return on_conflict()
+                        raise
+        return wrapper
+
+    return decorator(func) if func is not None else decorator
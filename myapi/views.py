@@ -1,5 +1,7 @@
 from rest_framework import viewsets , generics , mixins
 from .models import Purchase, Buyer ,Item , CashupOwingDeposit ,CashupDeposit
+from .idempotency import idempotent
+from .pagination import KeysetPagination
 from .serializers import PurchaseSerializer,ItemSerializer,RegisterSerializer, LoginSerializer,BuyerTransactionSerializer,TransferSerializer,CashupDepositSerializer,DepositSerializer ,BuyerSerializer , CashupOwingDepositSerializer ,DepositSerializer
 from django.db.models import Prefetch
 from rest_framework.response import Response
@@ -129,35 +131,39 @@ class BuyerDetail(generics.RetrieveUpdateDestroyAPIView,mixins.RetrieveModelMixi
     
 
 from rest_framework import generics
-from .models import CashupProfitHistory ,CashupOwingProfitHistory
-from .serializers import CashupProfitHistorySerializer , CashupOwingProfitHistorySerializer
+from .models import CashupProfitHistory ,CashupOwingProfitHistory, ProfitAccrual, OwingProfitAccrual
+from .serializers import CashupProfitHistorySerializer , CashupOwingProfitHistorySerializer, ProfitAccrualSerializer, OwingProfitAccrualSerializer
 
 class CashupProfitHistoryListView(generics.ListAPIView):
     permission_classes=[IsAuthenticated]
-    serializer_class = CashupProfitHistorySerializer
+    serializer_class = ProfitAccrualSerializer
 
     def get_queryset(self):
-        # Filter only by the logged-in user (updated_by = request.user)
-        return CashupProfitHistory.objects.filter(updated_by=self.request.user)
+        # Read the accrual ledger of the logged-in user's deposits, newest day first
+        return ProfitAccrual.objects.filter(
+            cashup_deposit__buyer=self.request.user
+        ).order_by('-accrual_date', 'kind')
 
 class CompoundingProfitHistoryListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
-    serializer_class = CashupProfitHistorySerializer
+    serializer_class = ProfitAccrualSerializer
 
     def get_queryset(self):
-        # Filter by the logged-in user and the specific field_name
-        return CashupProfitHistory.objects.filter(
-            updated_by=self.request.user, field_name="compounding_profit"
-        )
+        # Only the compounding profit credited to the logged-in user's deposits
+        return ProfitAccrual.objects.filter(
+            cashup_deposit__buyer=self.request.user, kind="compounding_profit"
+        ).order_by('-accrual_date')
 
 
 class CashupOwingProfitHistoryListView(generics.ListAPIView):
     permission_classes=[IsAuthenticated]
-    serializer_class = CashupOwingProfitHistorySerializer
+    serializer_class = OwingProfitAccrualSerializer
 
     def get_queryset(self):
-        # Filter only by the logged-in user (updated_by = request.user)
-        return CashupOwingProfitHistory.objects.filter(updated_by=self.request.user)
+        # Read the accrual ledger of the logged-in user's owing deposits, newest day first
+        return OwingProfitAccrual.objects.filter(
+            cashup_owing_deposit__buyer=self.request.user
+        ).order_by('-accrual_date', 'kind')
 
 
 class ConfirmedBuyerView(generics.ListAPIView):
@@ -174,10 +180,11 @@ class ConfirmedBuyersForProducts(APIView):
     permission_classes=[IsAuthenticated]
     """
     This view provides a list of all products with their confirmed buyers.
+    See ConfirmedBuyersReportView for the same purchases grouped by item, a page at a time.
     """
     def get(self, request):
-        # Fetch confirmed purchases and prefetch related buyers
-        purchases = Purchase.objects.filter(confirmed=True).select_related('buyer')
+        # Fetch confirmed purchases with their buyer, item and category in one query
+        purchases = Purchase.objects.filter(confirmed=True).select_related('buyer', 'item__category')
 
         data = []
         for purchase in purchases:
@@ -202,44 +209,73 @@ class ConfirmedBuyersForProducts(APIView):
 
         return Response(data)
 
+
+from rest_framework.permissions import IsAdminUser
+from .pagination import ItemKeysetPagination
+from .purchases import confirmed_purchase_rows, group_by_item
+from .serializers import ItemBuyersSerializer
+
+class ConfirmedBuyersReportView(APIView):
+    """
+    Staff report of the confirmed buyers grouped by product:
+    {"next": ..., "results": [{"item": {...}, "buyers": [...]}]}, with the
+    purchases that have no item last, under "item": null.
+    Each page is one joined query over purchases, items, categories and
+    buyers in (item, purchase) order; an item with more buyers than fit on a
+    page continues on the next one. Pass ?page_size= (up to 5000) to change
+    the number of purchases per page.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        paginator = ItemKeysetPagination()
+        rows = paginator.paginate_queryset(confirmed_purchase_rows(), request, view=self)
+        serializer = ItemBuyersSerializer(group_by_item(rows), many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+from .pagination import PurchaseKeysetPagination
+from .purchases import paid_purchases, total_cost
+
 class BuyerPurchasesAPIView(APIView):
     permission_classes=[IsAuthenticated]
 
     """
     This view provides the purchased products for a specific buyer and calculates the discount prices and total cost.
+    The discount math and the grand total are computed by the database. Pass
+    ?page_size= (or a ?cursor=) to get the products a page at a time, newest
+    first, with a "next" link; total_cost always covers every purchase.
     """
     def get(self, request, *args, **kwargs):
-        buyer_id = kwargs.get('buyer_id')
         buyer = get_object_or_404(Buyer, id=request.user.id)
-        products = Purchase.objects.filter(buyer=buyer, confirmed=True,paid=True)
-        
-        total_cost = 0
-        product_list = []
-        
-        for product in products:
-            original_price = product.total_price
-            discount_rate = product.discount_rate
-            quantity = product.quantity
-            
-            discount_price = original_price - (discount_rate * original_price / 100)
-            total_cost += discount_price * quantity
-            
-            product_data = {
-                'quantity': quantity,
+        products = paid_purchases(buyer)
+
+        paginator = None
+        if {'page_size', 'cursor'} & set(request.query_params):
+            paginator = PurchaseKeysetPagination()
+            page = paginator.paginate_queryset(products, request, view=self)
+        else:
+            page = products.order_by('id')
+
+        product_list = [
+            {
+                'quantity': product.quantity,
                 'product': PurchaseSerializer(product).data,
-                'original_price': original_price,
-                'discount_rate': discount_rate,
-                'discount_price': discount_price,
-                'total_cost': discount_price * quantity
+                'original_price': product.total_price,
+                'discount_rate': product.discount_rate,
+                'discount_price': product.discount_price,
+                'total_cost': product.line_total,
             }
-            product_list.append(product_data)
-        
+            for product in page
+        ]
+
         response_data = {
             'buyer': BuyerSerializer(buyer).data,
             'products': product_list,
-            'total_cost': total_cost
+            'total_cost': total_cost(products)
         }
-        
+        if paginator is not None:
+            response_data['next'] = paginator.get_next_link()
+
         return Response(response_data)
 from django.db.models import Prefetch
 from rest_framework import generics
@@ -264,6 +300,7 @@ from .serializers import BuyerTransactionSerializer
 class BuyerTransactionCreateView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request, *args, **kwargs):
         # Get the authenticated user
         user = request.user  # The logged-in user (assuming the buyer is the authenticated user)
@@ -297,14 +334,15 @@ class BuyerTransactionCreateView(APIView):
         except Buyer.DoesNotExist:
             return Response({"detail": "Buyer instance not found for this user."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Fetch all transactions for this buyer
-        transactions = BuyerTransaction.objects.filter(buyer=buyer).order_by('-date')  # Adjust field name if needed
+        # Fetch one page of this buyer's transactions, newest first
+        paginator = KeysetPagination()
+        transactions = paginator.paginate_queryset(BuyerTransaction.objects.filter(buyer=buyer), request, view=self)
         
         # Serialize the data
         serializer = BuyerTransactionSerializer(transactions, many=True)
         
-        # Return the list of transactions
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # Return the page of transactions
+        return paginator.get_paginated_response(serializer.data)
 
 
 
@@ -329,6 +367,7 @@ class CashupOwingDepositByBuyerAPIView(generics.ListAPIView):
         return CashupOwingDeposit.objects.filter(buyer=buyer)
     
 from rest_framework.permissions import AllowAny
+from .accrual import with_accrued_profit
 
 class CashupDepositByBuyerAPIView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]  # Ensure only authenticated users can access this view
@@ -346,8 +385,8 @@ class CashupDepositByBuyerAPIView(generics.ListAPIView):
         if not buyer:
             raise NotFound("Buyer not found.")
         
-        # Retrieve the cashup deposits for this buyer
-        return CashupDeposit.objects.filter(buyer=buyer)
+        # Retrieve the cashup deposits for this buyer, with profit accrued up to today
+        return with_accrued_profit(CashupDeposit.objects.filter(buyer=buyer))
 
 class RegisterView(APIView):
     permission_classes = [AllowAny]
@@ -658,6 +697,7 @@ class CompanyNumberListView(APIView):
 class DepositToMainBalance(APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request):
         # Get the buyer instance associated with the authenticated user
         buyer = request.user  # Since request.user is already the Buyer (custom User model)
@@ -676,12 +716,12 @@ class DepositToMainBalance(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Update the buyer's main balance
-            buyer.main_balance += amount
-            buyer.save()
+            # Update the buyer's main balance in a single UPDATE and post it to the ledger
+            with transaction.atomic():
+                credit(buyer, amount)
+                ledger.record('deposit', [(buyer, 'main_balance', amount)], contra='external')
 
-            # Print the updated main balance for debugging
-            print(f"New main balance: {buyer.main_balance}")
+            logger.debug("Buyer %s deposited %s, new main balance %s", buyer.id, amount, buyer.main_balance)
 
             # Return a success response
             return Response(
@@ -699,44 +739,46 @@ from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from django.db import transaction
 from .models import CashupDeposit , TransferHistoryofCashup ,TransferHistoryofCashupOwingDPS
+from .balances import InsufficientBalance, credit, debit
+from . import ledger
+from .versioning import retry_on_conflict
+
+
+def conflict_response():
+    # A deposit kept changing under the request, even after retrying
+    return Response(
+        {"error": "Your balance was updated by another request, please try again."},
+        status=status.HTTP_409_CONFLICT
+    )
 
 class TransferToCashupDeposit(APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent
+    @retry_on_conflict(on_conflict=conflict_response)
     def post(self, request):
         # Use request.user directly since it's already the authenticated Buyer
         buyer = request.user
 
-        # Refresh the buyer to ensure we get the latest data from the database
-        buyer.refresh_from_db()
-
         # Serialize incoming data
         serializer = TransferSerializer(data=request.data)
 
         if serializer.is_valid():
             amount = serializer.validated_data['amount']
 
-            # Log buyer's balance before transfer
-            print(f"Buyer {buyer.id} initial balance: {buyer.main_balance}")
-
-            # Check if buyer has enough funds in the main_balance
-            if buyer.main_balance < amount:
-                return Response(
-                    {"error": "Insufficient funds"}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
             # Start a transaction to ensure atomicity
             with transaction.atomic():
-                # Deduct the amount from the buyer's main_balance
-                buyer.main_balance -= amount
-                buyer.save()
-
-                # Refresh the buyer again after saving to get updated balance
-                buyer.refresh_from_db()
+                # Check the funds and deduct the amount from the buyer's main_balance
+                # in one statement, so concurrent transfers cannot overdraw it
+                try:
+                    debit(buyer, amount)
+                except InsufficientBalance:
+                    return Response(
+                        {"error": "Insufficient funds"}, 
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
 
-                # Log buyer's balance after deduction
-                print(f"Buyer {buyer.id} updated balance: {buyer.main_balance}")
+                logger.debug("Buyer %s moved %s to cashup, new main balance %s", buyer.id, amount, buyer.main_balance)
 
                 # Try to retrieve the CashupDeposit entry for the buyer, handling multiple objects
                 cashup_deposits = CashupDeposit.objects.filter(buyer=buyer)
@@ -759,6 +801,10 @@ class TransferToCashupDeposit(APIView):
                     amount=amount,
                       # Assuming the 'method' is included in the serializer
                 )
+                ledger.record('transfer', [
+                    (buyer, 'main_balance', -amount),
+                    (buyer, 'cashup_main_balance', amount),
+                ])
 
             # Return success response
             return Response(
@@ -776,7 +822,9 @@ class TransferToCashupDeposit(APIView):
         buyer = request.user
 
                 # Fetch all transfer history for the buyer
-        transfers = TransferHistoryofCashup.objects.filter(buyer=buyer).order_by('-date')
+        # One page at a time, newest first (see KeysetPagination)
+        paginator = KeysetPagination()
+        transfers = paginator.paginate_queryset(TransferHistoryofCashup.objects.filter(buyer=buyer), request, view=self)
 
                 # Serialize the data
         transfer_data = [
@@ -788,7 +836,7 @@ class TransferToCashupDeposit(APIView):
                 for transfer in transfers
             ]
 
-        return Response(transfer_data, status=status.HTTP_200_OK)
+        return paginator.get_paginated_response(transfer_data)
 
 
 from .models import CashupOwingDeposit
@@ -816,6 +864,8 @@ from .serializers import TransferSerializer
 class TransferToCashupOwingDeposit(APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent
+    @retry_on_conflict(on_conflict=conflict_response)
     def post(self, request):
         buyer = get_object_or_404(Buyer, id=request.user.id)
         serializer = TransferSerializer(data=request.data)
@@ -873,7 +923,9 @@ class TransferToCashupOwingDeposit(APIView):
         buyer = request.user
 
                 # Fetch all transfer history for the buyer
-        transfers = TransferHistory.objects.filter(buyer=buyer).order_by('-date')
+        # One page at a time, newest first (see KeysetPagination)
+        paginator = KeysetPagination()
+        transfers = paginator.paginate_queryset(TransferHistory.objects.filter(buyer=buyer), request, view=self)
 
                 # Serialize the data
         transfer_data = [
@@ -888,7 +940,7 @@ class TransferToCashupOwingDeposit(APIView):
                 for transfer in transfers
             ]
 
-        return Response(transfer_data, status=status.HTTP_200_OK)
+        return paginator.get_paginated_response(transfer_data)
 from decimal import Decimal
 
 
@@ -897,6 +949,8 @@ class TransferToCashupOwingDPSView(APIView):
     permission_classes = [IsAuthenticated]
       # Ensure the user is authenticated
 
+    @idempotent
+    @retry_on_conflict(on_conflict=conflict_response)
     def post(self, request):
         buyer = request.user
         # Get the logged-in user
@@ -927,15 +981,20 @@ class TransferToCashupOwingDPSView(APIView):
             return Response({"error": "Amount exceeds available balance."}, status=status.HTTP_400_BAD_REQUEST)
 
         # Perform the transfer
-        cashup_owing_deposit.cashup_owing_main_balance -= amount
-        cashup_owing_deposit.cashup_owing_dps += amount
-        cashup_owing_deposit.save()
+        with transaction.atomic():
+            cashup_owing_deposit.cashup_owing_main_balance -= amount
+            cashup_owing_deposit.cashup_owing_dps += amount
+            cashup_owing_deposit.save()
 
-        TransferHistoryofCashupOwingDPS.objects.create(
-                    buyer=buyer,
-                    amount=amount,
-                      # Assuming the 'method' is included in the serializer
-                )
+            TransferHistoryofCashupOwingDPS.objects.create(
+                        buyer=buyer,
+                        amount=amount,
+                          # Assuming the 'method' is included in the serializer
+                    )
+            ledger.record('transfer', [
+                (buyer, 'cashup_owing_main_balance', -amount),
+                (buyer, 'cashup_owing_dps', amount),
+            ])
         
 
         # Serialize the updated data and return response
@@ -946,7 +1005,9 @@ class TransferToCashupOwingDPSView(APIView):
         buyer = request.user
 
                 # Fetch all transfer history for the buyer
-        transfers = TransferHistoryofCashupOwingDPS.objects.filter(buyer=buyer).order_by('-date')
+        # One page at a time, newest first (see KeysetPagination)
+        paginator = KeysetPagination()
+        transfers = paginator.paginate_queryset(TransferHistoryofCashupOwingDPS.objects.filter(buyer=buyer), request, view=self)
 
                 # Serialize the data
         transfer_data = [
@@ -958,7 +1019,7 @@ class TransferToCashupOwingDPSView(APIView):
                 for transfer in transfers
             ]
 
-        return Response(transfer_data, status=status.HTTP_200_OK)
+        return paginator.get_paginated_response(transfer_data)
 
 
 
@@ -1131,62 +1192,54 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
 class CheckoutDetailsView(APIView):
+    @idempotent
     def post(self, request, *args, **kwargs):
-        # Retrieve all the unconfirmed purchases for the logged-in user
-        user_purchases = Purchase.objects.filter(buyer=request.user, confirmed=False)
-
-        # Handle the case where no unconfirmed purchases are found
-        if not user_purchases:
-            return Response({"detail": "No active unconfirmed purchases found."},
-                             status=status.HTTP_400_BAD_REQUEST)
-
-        # Calculate the total price of all unconfirmed purchases
-        total_price = sum([purchase.total_price for purchase in user_purchases])
-
-        # Retrieve the user's cashup balance
-        cashup_balance = request.user.cashup_deposits.first().cashup_main_balance  # Fetching the user's main cashup balance
-
-        # Retrieve the user's main balance
-        main_balance = request.user.main_balance
+        with transaction.atomic():
+            # Lock the logged-in user's unconfirmed purchases, so a concurrent
+            # checkout waits here and then finds them confirmed
+            user_purchases = list(
+                Purchase.objects.filter(buyer=request.user, confirmed=False).select_for_update().order_by('id')
+            )
 
-        # Determine the price to charge the buyer
-        if cashup_balance > 0:
-            # If the total price is less than or equal to the cashup balance
-            if total_price <= cashup_balance:
-                # Apply the member price (total_price) to the purchase
-                total_member_price = sum([purchase.membership_price * purchase.quantity for purchase in user_purchases])
+            # Handle the case where no unconfirmed purchases are found
+            if not user_purchases:
+                return Response({"detail": "No active unconfirmed purchases found."},
+                                 status=status.HTTP_400_BAD_REQUEST)
 
-                # Deduct the total member price from the main balance (buyer pays the member price)
-                if total_member_price > main_balance:
-                    return Response({"detail": "Insufficient balance to complete the purchase."},
-                                    status=status.HTTP_400_BAD_REQUEST)
+            # Calculate the total price of all unconfirmed purchases
+            total_price = sum([purchase.total_price for purchase in user_purchases])
 
-                # Deduct full member price from the main balance
-                request.user.main_balance -= total_member_price
-                request.user.save()
+            # Retrieve the user's cashup balance
+            cashup_balance = request.user.cashup_deposits.first().cashup_main_balance  # Fetching the user's main cashup balance
 
+            # Determine the price to charge the buyer
+            if cashup_balance > 0 and total_price <= cashup_balance:
+                # If the total price is less than or equal to the cashup balance,
+                # the buyer pays the member price
+                charge = sum([purchase.membership_price * purchase.quantity for purchase in user_purchases])
             else:
-                # If the total price is greater than the cashup balance, use the full original price
-                if total_price > main_balance:
-                    return Response({"detail": "Insufficient balance to complete the purchase."},
-                                    status=status.HTTP_400_BAD_REQUEST)
-
-                # Deduct full original price (total price) from the main balance
-                request.user.main_balance -= total_price
-                request.user.save()
-
-        else:
-            # No cashup balance, deduct full price from the main balance
-            if total_price > main_balance:
+                # Otherwise (or with no cashup balance) use the full original price
+                charge = total_price
+
+            # Mark the purchases as confirmed first; if another request got to
+            # any of them, nothing is charged
+            confirmed = Purchase.objects.filter(
+                pk__in=[purchase.pk for purchase in user_purchases], confirmed=False,
+            ).update(confirmed=True)
+            if confirmed != len(user_purchases):
+                transaction.set_rollback(True)
+                return Response({"detail": "These purchases are already being checked out."},
+                                status=status.HTTP_409_CONFLICT)
+
+            # Check and deduct the price from the main balance in one statement
+            try:
+                debit(request.user, charge)
+            except InsufficientBalance:
+                transaction.set_rollback(True)
                 return Response({"detail": "Insufficient balance to complete the purchase."},
-                                 status=status.HTTP_400_BAD_REQUEST)
-
-            # Deduct full price from main balance
-            request.user.main_balance -= total_price
-            request.user.save()
+                                status=status.HTTP_400_BAD_REQUEST)
 
-        # Mark all the unconfirmed purchases as confirmed
-        user_purchases.update(confirmed=True)
+            ledger.record('purchase', [(request.user, 'main_balance', -charge)], contra='sales')
 
         # Return a success message
         return Response({
@@ -1279,7 +1332,7 @@ class PlaceOrderView(APIView):
 
     def get(self, request, pk, *args, **kwargs):
         # Try to fetch the unconfirmed purchase based on 'pk' (the purchase ID)
-        user_purchase = Purchase.objects.filter(buyer=request.user, confirmed=False, id=pk)
+        user_purchase = Purchase.objects.filter(buyer=request.user, confirmed=False, id=pk).first()
 
         if not user_purchase:
             # No unconfirmed purchase found, create a new purchase for the user
@@ -1347,238 +1400,168 @@ class PlaceOrderView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Check if the user has sufficient balance
-        if user_purchase.buyer.main_balance >= user_purchase.discount_total_price:
-            # Deduct the balance from the user's account
-            user_purchase.buyer.main_balance -= user_purchase.discount_total_price
-            user_purchase.buyer.save()  # Save the updated balance
-
-            # Confirm the purchase (set 'confirmed' and 'paid' to True)
-            user_purchase.confirmed = True
-            user_purchase.paid = True
-            user_purchase.save()  # Save the updated purchase
-
-            # Optionally, handle removing the item from the cart here, if applicable
-            # (e.g., delete from cart or mark as purchased in another model)
-
-            return Response(
-                {
-                    "detail": "Purchase confirmed and processed successfully.",
-                    "updated_balance": str(user_purchase.buyer.main_balance),  # Show updated balance
-                },
-                status=status.HTTP_200_OK
-            )
-        else:
-            # If the buyer does not have sufficient funds
-            return Response(
-                {"detail": "Insufficient balance to confirm purchase."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        with transaction.atomic():
+            # Confirm the purchase (set 'confirmed' and 'paid' to True) before
+            # charging, and only if it is still unconfirmed, so two concurrent
+            # requests cannot both pay for it. This is an UPDATE rather than
+            # save(), since Purchase.save() charges paid purchases
+            confirmed = Purchase.objects.filter(pk=user_purchase.pk, confirmed=False).update(confirmed=True, paid=True)
+            if not confirmed:
+                return Response(
+                    {"detail": "This purchase is already confirmed."},
+                    status=status.HTTP_409_CONFLICT
+                )
 
+            # Check the balance and deduct it from the user's account in one statement
+            try:
+                updated_balance = debit(user_purchase.buyer, user_purchase.discount_total_price)
+            except InsufficientBalance:
+                # If the buyer does not have sufficient funds, leave the purchase unconfirmed
+                transaction.set_rollback(True)
+                return Response(
+                    {"detail": "Insufficient balance to confirm purchase."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
 
+            ledger.record('purchase', [(user_purchase.buyer, 'main_balance', -user_purchase.discount_total_price)], contra='sales')
 
+        # Optionally, handle removing the item from the cart here, if applicable
+        # (e.g., delete from cart or mark as purchased in another model)
 
-from .serializers import WithdrawalRequestSerializer
-from .models import WithdrawalFromCashupBalance
+        return Response(
+            {
+                "detail": "Purchase confirmed and processed successfully.",
+                "updated_balance": str(updated_balance),  # Show updated balance
+            },
+            status=status.HTTP_200_OK
+        )
 
 
-class WithdrawalRequestAPIView(APIView):
-    permission_classes = [IsAuthenticated]
 
-    def get(self, request, *args, **kwargs):
-        """
-        List all withdrawal requests for the logged-in user.
-        """
-        withdrawal_requests = WithdrawalFromCashupBalance.objects.filter(buyer=request.user).order_by('-id')
-        serializer = WithdrawalRequestSerializer(withdrawal_requests, many=True)
-        return Response(serializer.data)
 
-    def post(self, request, *args, **kwargs):
-        """
-        Create a new withdrawal request for the logged-in user.
-        """
-        serializer = WithdrawalRequestSerializer(data=request.data, context={'request': request})
-        
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    
+from .serializers import WithdrawalRecordSerializer
+from .models import Withdrawal
 
-from .models import CashupDepositHistory
-from .serializers import CashupDepositHistorySerializer
-    
-class CashupDepositHistoryView(generics.ListAPIView):
-    serializer_class = CashupDepositHistorySerializer
-    permission_classes = [IsAuthenticated]
 
-    def get_queryset(self):
-        # Get the logged-in user's cashup deposit history
-        return CashupDepositHistory.objects.filter(updated_by=self.request.user)
-    
-from .models import WithdrawalFromMainBalance
-from .serializers import WithdrawalFromMainBalanceSerializer
-    
-class WithdrawalRequestFromMianBalanceAPIView(APIView):
+class SourceWithdrawalView(APIView):
+    """
+    The logged-in user's withdrawal requests from one `source` (see
+    Withdrawal.SOURCE_CHOICES). GET lists them a page at a time, POST
+    creates a pending request; staff approve it in the admin.
+    """
     permission_classes = [IsAuthenticated]
+    source = None
 
     def get(self, request, *args, **kwargs):
-        """
-        List all withdrawal requests for the logged-in user.
-        """
-        withdrawal_requests = WithdrawalFromMainBalance.objects.filter(buyer=request.user).order_by('-id')
-        serializer = WithdrawalFromMainBalanceSerializer(withdrawal_requests, many=True)
-        return Response(serializer.data)
+        paginator = KeysetPagination()
+        withdrawal_requests = paginator.paginate_queryset(
+            Withdrawal.objects.filter(buyer=request.user, source=self.source), request, view=self,
+        )
+        serializer = WithdrawalRecordSerializer(withdrawal_requests, many=True, context={'source': self.source})
+        return paginator.get_paginated_response(serializer.data)
 
+    @idempotent
     def post(self, request, *args, **kwargs):
-        """
-        Create a new withdrawal request for the logged-in user.
-        """
-        serializer = WithdrawalFromMainBalanceSerializer(data=request.data, context={'request': request})
+        serializer = WithdrawalRecordSerializer(data=request.data, context={'request': request, 'source': self.source})
         
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-from .models import WithdrawalFromCompoundingProfit
-from .serializers import WithdrawalFromCompoundingProfitSerializer
-    
-class WithdrawalRequestFromCompoundingProfitAPIView(APIView):
-    permission_classes = [IsAuthenticated]
 
-    def get(self, request, *args, **kwargs):
-        """
-        List all withdrawal requests for the logged-in user.
-        """
-        withdrawal_requests = WithdrawalFromCompoundingProfit.objects.filter(buyer=request.user).order_by('-id')
-        serializer = WithdrawalFromCompoundingProfitSerializer(withdrawal_requests, many=True)
-        return Response(serializer.data)
 
-    def post(self, request, *args, **kwargs):
-        """
-        Create a new withdrawal request for the logged-in user.
-        """
-        serializer = WithdrawalFromCompoundingProfitSerializer(data=request.data, context={'request': request})
-        
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+class WithdrawalRequestAPIView(SourceWithdrawalView):
+    source = 'cashup_balance'
 
-from .models import WithdrawalFromDailyProfit
-from .serializers import WithdrawalFromDailyProfitSerializer
 
-class WithdrawalRequestFromDailyProfitAPIView(APIView):
-    permission_classes = [IsAuthenticated]
+class WithdrawalRequestFromMianBalanceAPIView(SourceWithdrawalView):
+    source = 'main_balance'
 
-    def get(self, request, *args, **kwargs):
-        """
-        List all withdrawal requests for the logged-in user from daily profit.
-        """
-        # Get all withdrawal requests for the logged-in user, ordered by most recent
-        withdrawal_requests = WithdrawalFromDailyProfit.objects.filter(buyer=request.user).order_by('-date')
-        
-        # Serialize the data
-        serializer = WithdrawalFromDailyProfitSerializer(withdrawal_requests, many=True)
-        
-        # Return the serialized data in the response
-        return Response(serializer.data)
 
-    def post(self, request, *args, **kwargs):
-        """
-        Create a new withdrawal request for the logged-in user from daily profit.
-        """
-        # Pass request context for the serializer (which can be used to reference the logged-in user)
-        serializer = WithdrawalFromDailyProfitSerializer(data=request.data, context={'request': request})
+class WithdrawalRequestFromCompoundingProfitAPIView(SourceWithdrawalView):
+    source = 'compounding_profit'
 
-        if serializer.is_valid():
-            # Save the withdrawal request
-            serializer.save()
 
-            # Return the created withdrawal request in the response with a 201 status code
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        
-        # If serializer is invalid, return errors with a 400 status code
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+class WithdrawalRequestFromDailyProfitAPIView(SourceWithdrawalView):
+    source = 'daily_profit'
 
-from .models import WithdrawalFromAffiliateProfit
-from .serializers import WithdrawalFromAffiliateProfitSerializer
 
+class WithdrawalRequestFromAffiliateProfitAPIView(SourceWithdrawalView):
+    source = 'affiliate_profit'
 
-class WithdrawalRequestFromAffiliateProfitAPIView(APIView):
+
+class WithdrawalListCreateView(APIView):
+    """
+    The logged-in user's withdrawal requests from every source, newest
+    first, optionally filtered with ?source= and ?status=. POST creates a
+    request from the `source` given in the body.
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
-        """
-        List all withdrawal requests for the logged-in user from affiliate profit.
-        """
-        # Get all withdrawal requests for the logged-in user, ordered by most recent
-        withdrawal_requests = WithdrawalFromAffiliateProfit.objects.filter(buyer=request.user).order_by('-date')
-        
-        # Serialize the data
-        serializer = WithdrawalFromAffiliateProfitSerializer(withdrawal_requests, many=True)
-        
-        # Return the serialized data in the response
-        return Response(serializer.data)
+        withdrawals = Withdrawal.objects.filter(buyer=request.user)
+        for name in ('source', 'status'):
+            value = request.query_params.get(name)
+            if value:
+                withdrawals = withdrawals.filter(**{name: value})
 
-    def post(self, request, *args, **kwargs):
-        """
-        Create a new withdrawal request for the logged-in user from affiliate profit.
-        """
-        # Pass request context for the serializer (which can be used to reference the logged-in user)
-        serializer = WithdrawalFromAffiliateProfitSerializer(data=request.data, context={'request': request})
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(withdrawals, request, view=self)
+        return paginator.get_paginated_response(WithdrawalRecordSerializer(page, many=True).data)
 
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        serializer = WithdrawalRecordSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            # Save the withdrawal request
             serializer.save()
-
-            # Return the created withdrawal request in the response with a 201 status code
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        
-        # If serializer is invalid, return errors with a 400 status code
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+
+from .models import CashupDepositHistory
+from .serializers import CashupDepositHistorySerializer
+    
+class CashupDepositHistoryView(generics.ListAPIView):
+    serializer_class = CashupDepositHistorySerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        # Get the logged-in user's cashup deposit history
+        return CashupDepositHistory.objects.filter(updated_by=self.request.user)
+    
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from itertools import chain
-from .models import (
-    WithdrawalFromCompoundingProfit,
-    WithdrawalFromMainBalance,
-    WithdrawalFromCashupBalance,
-    WithdrawalFromDailyProfit,
-    WithdrawalFromAffiliateProfit
-)
-from .serializers import WithdrawalSerializer
+from .serializers import WithdrawalHistorySerializer
 
 class WithdrawalHistoryView(APIView):
+    """
+    Withdrawals from all five sources, newest first, a page at a time.
+    Buyers see their own withdrawals; staff see everyone's, or one buyer's
+    with ?buyer=<id>.
+    """
     def get(self, request, *args, **kwargs):
-        # Fetch all withdrawal records from different models
-        compounding_withdrawals = WithdrawalFromCompoundingProfit.objects.all()
-        main_balance_withdrawals = WithdrawalFromMainBalance.objects.all()
-        cashup_withdrawals = WithdrawalFromCashupBalance.objects.all()
-        daily_profit_withdrawals = WithdrawalFromDailyProfit.objects.all()
-        affiliate_profit_withdrawals = WithdrawalFromAffiliateProfit.objects.all()
-
-        # Merge all the withdrawal querysets
-        all_withdrawals = list(chain(
-            compounding_withdrawals,
-            main_balance_withdrawals,
-            cashup_withdrawals,
-            daily_profit_withdrawals,
-            affiliate_profit_withdrawals
-        ))
-
-        # Sort all withdrawals by date in descending order
-        sorted_withdrawals = sorted(all_withdrawals, key=lambda x: x.date, reverse=True)
+        withdrawals = Withdrawal.objects.select_related('buyer')
+
+        # Staff may look at any buyer, everyone else only at themselves
+        if request.user.is_staff:
+            buyer_id = request.query_params.get('buyer')
+            if buyer_id is not None and not buyer_id.isdigit():
+                return Response({"detail": "buyer must be a buyer id."}, status=status.HTTP_400_BAD_REQUEST)
+            if buyer_id:
+                withdrawals = withdrawals.filter(buyer_id=buyer_id)
+        else:
+            withdrawals = withdrawals.filter(buyer_id=request.user.id)
+
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(withdrawals, request, view=self)
 
         # Serialize the withdrawals
-        serializer = WithdrawalSerializer(sorted_withdrawals, many=True)
+        serializer = WithdrawalHistorySerializer(page, many=True)
 
-        # Return the serialized data
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # Return the serialized page
+        return paginator.get_paginated_response(serializer.data)
 
 from rest_framework import status
 from rest_framework.response import Response
@@ -1669,3 +1652,126 @@ class ItemSearchAPIView(APIView):
         # Serialize the items
         serializer = ItemSerializer(items, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+from decimal import InvalidOperation
+from rest_framework.permissions import IsAdminUser
+from .forecast import DEFAULT_HORIZONS, forecast_liability
+
+class ProfitLiabilityForecastView(APIView):
+    """
+    Staff report of the profit owed across all cashup and cashup owing deposits
+    over the coming days, e.g. ?days=30,90,365&daily_rate=0.0025
+    """
+    permission_classes = [IsAdminUser]
+
+    WHAT_IF_RATES = ['daily_rate', 'compounding_rate', 'owing_daily_rate', 'owing_compounding_rate']
+
+    def get(self, request, *args, **kwargs):
+        days = request.query_params.get('days')
+        try:
+            horizons = [int(value) for value in days.split(',')] if days else list(DEFAULT_HORIZONS)
+        except ValueError:
+            return Response({"detail": "days must be a comma separated list of integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if any(horizon < 1 or horizon > 3650 for horizon in horizons):
+            return Response({"detail": "Each horizon must be between 1 and 3650 days."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Optional what-if rates replace the scheduled rates for the whole horizon
+        what_if = {}
+        for name in self.WHAT_IF_RATES:
+            value = request.query_params.get(name)
+            if value is None:
+                continue
+            try:
+                what_if[name] = Decimal(value)
+            except InvalidOperation:
+                return Response({"detail": f"{name} must be a decimal rate."}, status=status.HTTP_400_BAD_REQUEST)
+            # A rate is the fraction of the balance credited per day; this also
+            # rejects NaN, infinities and huge values the forecast cannot hold
+            if not (what_if[name].is_finite() and 0 <= what_if[name] <= 1):
+                return Response({"detail": f"{name} must be between 0 and 1."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(forecast_liability(horizons, what_if), status=status.HTTP_200_OK)
+
+
+from .serializers import LedgerPostingSerializer
+from .pagination import LedgerKeysetPagination
+
+class LedgerStatementView(generics.ListAPIView):
+    """
+    Ledger postings of the logged-in buyer, newest first, a page at a time.
+    Filter a single balance with ?bucket=main_balance (or cashup_main_balance, ...).
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = LedgerPostingSerializer
+    pagination_class = LedgerKeysetPagination
+
+    def get_queryset(self):
+        return ledger.statement(self.request.user, self.request.query_params.get('bucket'))
+
+
+from .serializers import BalanceSummarySerializer
+from .summary import get_summary
+
+class BalanceSummaryView(APIView):
+    """
+    Main, cashup and cashup owing balances of the logged-in buyer in one
+    response. Served from the balance summary cache, which every balance
+    change invalidates, so repeated dashboard loads do not query the deposits.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        summary = get_summary(request.user.pk)
+        if summary is None:
+            return Response({"detail": "Buyer profile not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(BalanceSummarySerializer(summary).data, status=status.HTTP_200_OK)
+
+
+from .verification import verify_transactions
+
+class BuyerTransactionVerifyView(APIView):
+    """
+    Staff endpoint verifying many pending BuyerTransactions at once:
+    POST {"ids": [1, 2, ...]}. Already verified ids are skipped.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+            return Response({"detail": "ids must be a list of transaction ids."}, status=status.HTTP_400_BAD_REQUEST)
+
+        verified = verify_transactions(ids)
+        return Response({"verified": verified, "skipped": len(set(ids)) - verified}, status=status.HTTP_200_OK)
+
+
+from django.utils.dateparse import parse_date
+from .withdrawals import report as withdrawal_report
+
+class WithdrawalReportView(APIView):
+    """
+    Staff report of the withdrawals per source and status: how many and how
+    much. Narrow it with ?status=, ?buyer= and a ?date_from=/?date_to= range
+    (YYYY-MM-DD, inclusive).
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        queryset = Withdrawal.objects.all()
+        params = request.query_params
+        if params.get('status'):
+            queryset = queryset.filter(status=params['status'])
+        if params.get('buyer'):
+            if not params['buyer'].isdigit():
+                return Response({"detail": "buyer must be a buyer id."}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(buyer_id=params['buyer'])
+        for name, lookup in (('date_from', 'date__date__gte'), ('date_to', 'date__date__lte')):
+            if not params.get(name):
+                continue
+            day = parse_date(params[name])
+            if day is None:
+                return Response({"detail": f"{name} must be a date (YYYY-MM-DD)."}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(**{lookup: day})
+
+        return Response(withdrawal_report(queryset), status=status.HTTP_200_OK)
@@ -0,0 +1,78 @@
+from django.db.models import Count, Sum
+
+from . import ledger
+from .balances import InsufficientBalance, credit, debit
+from .versioning import retry_on_conflict
+
+
+# CashupDeposit field each deposit source is paid from, and the field that
+# adds up what was withdrawn from it (None when nothing is kept)
+DEPOSIT_FIELDS = {
+    'cashup_balance': ('cashup_main_balance', 'withdraw'),
+    'daily_profit': ('daily_profit', 'compounding_withdraw'),
+    'compounding_profit': ('compounding_profit', 'compounding_withdraw'),
+    'affiliate_profit': ('affiliate_profit', None),
+}
+
+
+def _reject(withdrawal, reason):
+    from .models import Withdrawal
+
+    # A queryset update, so the approval receiver does not run again
+    Withdrawal.objects.filter(pk=withdrawal.pk).update(status='Rejected')
+    withdrawal.status = 'Rejected'
+    withdrawal.rejection_reason = reason
+    return reason
+
+
+@retry_on_conflict
+def approve(withdrawal):
+    """
+    Pay out an approved withdrawal.
+
+    Main balance withdrawals leave the main balance. Cashup balance and
+    profit withdrawals are taken from the buyer's cashup deposit and
+    credited to the main balance. When the balance is too low the
+    withdrawal is marked Rejected instead; the reason is returned (and kept
+    on `withdrawal.rejection_reason`), None when it was paid.
+    """
+    buyer = withdrawal.buyer
+    amount = withdrawal.amount
+
+    if withdrawal.source == 'main_balance':
+        try:
+            debit(buyer, amount)
+        except InsufficientBalance:
+            return _reject(withdrawal, "Insufficient funds in the main balance.")
+        ledger.record('withdrawal', [(buyer, 'main_balance', -amount)], contra='external')
+        return None
+
+    deposit = buyer.cashup_deposits.first()
+    if deposit is None:
+        return _reject(withdrawal, "No cashup deposit found for the buyer.")
+
+    field, withdrawn_field = DEPOSIT_FIELDS[withdrawal.source]
+    if getattr(deposit, field) < amount:
+        return _reject(withdrawal, f"Insufficient funds in {withdrawal.get_source_display().lower()}.")
+
+    setattr(deposit, field, getattr(deposit, field) - amount)
+    if withdrawn_field:
+        setattr(deposit, withdrawn_field, getattr(deposit, withdrawn_field) + amount)
+    deposit.save()
+    credit(buyer, amount)
+
+    if withdrawal.source == 'cashup_balance':
+        ledger.record('withdrawal', [(buyer, 'cashup_main_balance', -amount), (buyer, 'main_balance', amount)])
+    else:
+        # Profit is kept in the accrual ledgers and enters the main balance from there
+        ledger.record('withdrawal', [(buyer, 'main_balance', amount)], contra='profit')
+    return None
+
+
+def report(queryset):
+    """Count and total of the given withdrawals per source and status, in one grouped query."""
+    return list(
+        queryset.values('source', 'status')
+        .annotate(count=Count('id'), total=Sum('amount'))
+        .order_by('source', 'status')
+    )
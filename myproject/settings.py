@@ -43,6 +43,32 @@ SIMPLE_JWT = {
 }
 DATE_FORMAT = 'Y-m-d H:i'
 
+# Weekdays on which no profit is credited (Monday is 0): Friday and Saturday
+ACCRUAL_OFF_DAYS = (4, 5)
+
+# How long a stored response is replayed for a repeated Idempotency-Key
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+# How long drained outbox events are kept so the history can be replayed
+OUTBOX_RETENTION = timedelta(days=30)
+
+# Per-process memory cache by default; set REDIS_URL to share the cache
+# between workers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
+# Cache alias and lifetime (seconds) of the per-buyer balance summaries
+BALANCE_SUMMARY_CACHE = 'default'
+BALANCE_SUMMARY_TIMEOUT = 60 * 60
+
 
 # Application definition
 
@@ -2,7 +2,7 @@
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from myapi.views import ProductView, ItemView,ResetPasswordView,SponsoredByCreateView,ProductAdSliderView,ReferralGetCodeView,CompoundingProfitHistoryListView,ChangePasswordView,CompanyNumberListView,WithdrawalHistoryView,WithdrawalRequestFromDailyProfitAPIView,WithdrawalRequestFromAffiliateProfitAPIView, ProfileView,ReferralCodeView,ForgotPasswordView,CashupDepositHistoryView,PlaceOrderView,CashupOwingProfitHistoryListView,WithdrawalRequestAPIView,CashupProfitHistoryListView,SliderCreateView,TransferToCashupOwingDPSView,WithdrawalRequestFromCompoundingProfitAPIView,WithdrawalRequestFromMianBalanceAPIView,CheckoutDetailsView, CartedProductDelete,BuyerView,RegisterView,LoginAPIView,SendOTPToBuyer,VerifyBuyerOTP,BuyerDetail,BuyerTransactionCreateView, UpdateBuyerProfileAPIView, DepositToMainBalance, TransferToCashupDeposit, TransferToCashupOwingDeposit, PurchaseProduct,ConfirmedProductsList,CashupOwingDepositByBuyerAPIView,CashupDepositByBuyerAPIView,ConfirmedBuyersForProducts,BuyerPurchasesAPIView , ConfirmedBuyerView,ProductDetail, CartedProductsList
+from myapi.views import ProductView, ItemView,ResetPasswordView,SponsoredByCreateView,ProductAdSliderView,ReferralGetCodeView,CompoundingProfitHistoryListView,ChangePasswordView,CompanyNumberListView,WithdrawalHistoryView,WithdrawalRequestFromDailyProfitAPIView,WithdrawalRequestFromAffiliateProfitAPIView, ProfileView,ReferralCodeView,ForgotPasswordView,CashupDepositHistoryView,PlaceOrderView,CashupOwingProfitHistoryListView,WithdrawalRequestAPIView,CashupProfitHistoryListView,SliderCreateView,TransferToCashupOwingDPSView,WithdrawalRequestFromCompoundingProfitAPIView,WithdrawalRequestFromMianBalanceAPIView,CheckoutDetailsView, CartedProductDelete,BuyerView,RegisterView,LoginAPIView,SendOTPToBuyer,VerifyBuyerOTP,BuyerDetail,BuyerTransactionCreateView, UpdateBuyerProfileAPIView, DepositToMainBalance, TransferToCashupDeposit, TransferToCashupOwingDeposit, PurchaseProduct,ConfirmedProductsList,CashupOwingDepositByBuyerAPIView,CashupDepositByBuyerAPIView,ConfirmedBuyersForProducts,BuyerPurchasesAPIView , ConfirmedBuyerView,ProductDetail, CartedProductsList, ProfitLiabilityForecastView, LedgerStatementView, BalanceSummaryView, BuyerTransactionVerifyView, WithdrawalListCreateView, WithdrawalReportView, ConfirmedBuyersReportView
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView 
 from django.contrib.auth.models import User
 from django.conf import settings
@@ -45,6 +45,7 @@ urlpatterns = [
     path('api/cashup-owing-deposit/', CashupOwingDepositByBuyerAPIView.as_view(), name='cashup-owing-deposits-by-buyer'),
     path('api/buyer/', BuyerDetail.as_view(), name='buyer-detail'),
     path('buyer_transactions/', BuyerTransactionCreateView.as_view(), name='buyer_transaction_create'),
+    path('buyer_transactions/verify/', BuyerTransactionVerifyView.as_view(), name='buyer_transaction_verify'),
     path('send-otp/', SendOTPToBuyer.as_view(), name='send-otp'),
     path('verify-otp/', VerifyBuyerOTP.as_view(), name='verify-otp'),
     path('api/me/', ProfileView.as_view(), name='profile'),
@@ -70,6 +71,12 @@ urlpatterns = [
     path('refer-code/',ReferralGetCodeView.as_view(),name='refer-code'),
     path('product-ad-slider/',ProductAdSliderView.as_view(),name='refer-code'),
     path('sponsored-by/', SponsoredByCreateView.as_view(), name='sponsored-by'),
+    path('api/reports/profit-liability/', ProfitLiabilityForecastView.as_view(), name='profit-liability'),
+    path('api/ledger/statement/', LedgerStatementView.as_view(), name='ledger-statement'),
+    path('api/balance-summary/', BalanceSummaryView.as_view(), name='balance-summary'),
+    path('api/withdrawals/', WithdrawalListCreateView.as_view(), name='withdrawals'),
+    path('api/reports/withdrawals/', WithdrawalReportView.as_view(), name='withdrawal-report'),
+    path('api/reports/confirmed-buyers/', ConfirmedBuyersReportView.as_view(), name='confirmed-buyers-report'),
 
     
     